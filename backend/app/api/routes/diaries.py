@@ -1,10 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from typing import Literal, Optional
 from pydantic import BaseModel
-from app.models.diary import DiaryCreate, DiaryUpdate, DiaryResponse, AIInsightResponse
+from app.models.diary import DiaryCreate, DiaryUpdate, DiaryResponse, DiaryPage, AIInsightResponse
 from app.api.dependencies import get_current_user
-from app.services.diary_service import DiaryService
+from app.api.sse import sse_response
+from app.core.admission import AdmissionRejected
+from app.core.coalescer import RequestSuperseded, get_recommendation_coalescer
+from app.core.embedding_cache import text_fingerprint
+from app.services.diary_service import DiaryService, decode_cursor
 from app.services.llama_rag_service import LlamaRAGService
+from app.services.indexing_queue import get_indexing_queue
 
 router = APIRouter()
 diary_service = DiaryService()
@@ -14,13 +19,33 @@ class RecommendationRequest(BaseModel):
     title: str = ""
     content: str
 
-@router.get("", response_model=List[DiaryResponse])
+@router.get("", response_model=DiaryPage)
 async def get_all_diaries(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    view: Literal["full", "summary"] = "full",
     current_user: dict = Depends(get_current_user)
 ):
-    """Get all diaries for the current user"""
+    """List the current user's diaries, newest first, one page at a time"""
     user_id = current_user["uid"]
-    return await diary_service.get_all_diaries(user_id)
+    
+    try:
+        decoded_cursor = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    items, next_cursor = await diary_service.list_diaries(user_id, limit, decoded_cursor, view)
+    return DiaryPage(items=items, nextCursor=next_cursor)
+
+@router.get("/indexing/status")
+async def get_indexing_queue_status(
+    current_user: dict = Depends(get_current_user)
+):
+    """Report background indexing queue depth and lag"""
+    return await get_indexing_queue().stats()
 
 @router.get("/{diary_id}", response_model=DiaryResponse)
 async def get_diary(
@@ -39,6 +64,23 @@ async def get_diary(
     
     return diary
 
+@router.get("/{diary_id}/indexing")
+async def get_diary_indexing_status(
+    diary_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get the vector indexing state of a diary"""
+    user_id = current_user["uid"]
+    indexing_status = await diary_service.get_indexing_status(diary_id, user_id)
+    
+    if not indexing_status:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Diary not found"
+        )
+    
+    return indexing_status
+
 @router.post("", response_model=DiaryResponse, status_code=status.HTTP_201_CREATED)
 async def create_diary(
     diary: DiaryCreate,
@@ -103,6 +145,24 @@ async def get_ai_insight(
             detail=f"Failed to generate AI insight: {str(e)}"
         )
 
+@router.post("/{diary_id}/ai-insight/stream")
+async def stream_ai_insight(
+    diary_id: str,
+    request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    """Stream an AI insight as Server-Sent Events; saved to the diary when complete"""
+    user_id = current_user["uid"]
+    diary = await diary_service.get_diary(diary_id, user_id)
+    
+    if not diary:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Diary not found"
+        )
+    
+    return sse_response(request, diary_service.stream_ai_insight(diary, user_id))
+
 @router.post("/recommend", response_model=AIInsightResponse)
 async def get_llama_recommendation(
     request: RecommendationRequest,
@@ -112,18 +172,59 @@ async def get_llama_recommendation(
     user_id = current_user["uid"]
     
     try:
-        recommendation = await llama_rag_service.generate_recommendation(
-            user_id=user_id,
-            current_content=request.content,
-            current_title=request.title
+        # One generation per user: identical drafts share it, newer drafts replace it
+        recommendation = await get_recommendation_coalescer().run(
+            user_id,
+            text_fingerprint(f"{request.title}\n\n{request.content}"),
+            lambda: llama_rag_service.generate_recommendation(
+                user_id=user_id,
+                current_content=request.content,
+                current_title=request.title
+            )
         )
         return {"insight": recommendation}
+    except RequestSuperseded as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+    except AdmissionRejected:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to generate recommendation: {str(e)}"
         )
 
+@router.post("/recommend/stream")
+async def stream_llama_recommendation(
+    body: RecommendationRequest,
+    request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    """以 Server-Sent Events 流式返回 Llama 写作推荐"""
+    user_id = current_user["uid"]
+    coalescer = get_recommendation_coalescer()
+    prepared = await llama_rag_service.prepare_recommendation(user_id, body.content, body.title)
+    # Admit before the response starts so a shed request still gets 429/503;
+    # cached responses need no generation slot. The stream itself stops
+    # this user's older draft when it starts.
+    ticket = None if prepared.cached is not None else await llama_rag_service.admit(user_id)
+    return sse_response(
+        request,
+        coalescer.stream(
+            user_id,
+            llama_rag_service.stream_recommendation(
+                user_id=user_id,
+                current_content=body.content,
+                current_title=body.title,
+                ticket=ticket,
+                prepared=prepared
+            )
+        ),
+        ticket=ticket
+    )
+
 @router.get("/ollama/status")
 async def check_ollama_status(
     current_user: dict = Depends(get_current_user)
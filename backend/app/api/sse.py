@@ -0,0 +1,52 @@
+import json
+from typing import AsyncIterator, Optional
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from app.core.admission import Ticket
+
+def format_sse(data: dict, event: Optional[str] = None) -> str:
+    """Encode one Server-Sent Event"""
+    message = f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+    if event:
+        message = f"event: {event}\n" + message
+    return message
+
+async def _relay(
+    request: Request,
+    tokens: AsyncIterator[str],
+    ticket: Optional[Ticket] = None
+) -> AsyncIterator[str]:
+    try:
+        async for token in tokens:
+            # Stop pulling from the provider as soon as the client goes away
+            if await request.is_disconnected():
+                return
+            yield format_sse({"token": token})
+        yield format_sse({"done": True}, event="done")
+    except Exception as e:
+        yield format_sse({"error": f"{type(e).__name__}: {str(e)}"}, event="error")
+    finally:
+        # Closing the token generator closes the upstream provider stream
+        await tokens.aclose()
+        if ticket is not None:
+            ticket.release()
+
+def sse_response(
+    request: Request,
+    tokens: AsyncIterator[str],
+    ticket: Optional[Ticket] = None
+) -> StreamingResponse:
+    """
+    Relay a stream of text tokens to the client as Server-Sent Events
+
+    ``ticket`` is an admission slot acquired before the response; the
+    relay releases it when the stream ends for any reason.
+    """
+    return StreamingResponse(
+        _relay(request, tokens, ticket),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
@@ -0,0 +1,199 @@
+"""
+Admission control for scarce model capacity
+
+An ``AdmissionController`` lets at most ``max_concurrent`` requests run,
+queues up to ``max_queue`` more for at most ``max_wait`` seconds, and
+sheds the rest immediately with ``AdmissionRejected`` (mapped to 429/503
+with Retry-After by the API). Waiting requests are served round-robin
+across users, and each user may hold at most ``per_user_limit`` running
+or queued requests, so one user cannot monopolize the model.
+"""
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional
+from app.core.config import settings
+from app.core.metrics import ADMISSION_ACTIVE, ADMISSION_QUEUED, ADMISSION_REJECTED, ADMISSION_WAIT
+from app.core.ollama_client import ollama_urls
+
+class AdmissionRejected(Exception):
+    """The request was shed; retry after ``retry_after`` seconds"""
+    def __init__(self, status_code: int, reason: str, retry_after: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+        self.detail = detail
+
+class Ticket:
+    """A granted slot; release it exactly once (``with ticket:`` does so)"""
+    def __init__(self, controller: "AdmissionController", user_id: str):
+        self._controller = controller
+        self.user_id = user_id
+        self.granted_at = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+class AdmissionController:
+    def __init__(
+        self,
+        name: str,
+        max_concurrent: int,
+        max_queue: int,
+        max_wait: float,
+        per_user_limit: int
+    ):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.per_user_limit = per_user_limit
+        self._active = 0
+        self._queued = 0
+        self._user_load: Dict[str, int] = {}
+        # user -> waiting futures; dict order is the round-robin order
+        self._waiting: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        # Smoothed slot hold time, used to estimate Retry-After
+        self._hold_seconds = 5.0
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {}
+
+    def _retry_after(self) -> int:
+        waves = (self._queued + 1) / max(1, self.max_concurrent)
+        return max(1, math.ceil(self._hold_seconds * waves))
+
+    def _reject(self, status_code: int, reason: str, detail: str) -> AdmissionRejected:
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        ADMISSION_REJECTED.labels(self.name, reason).inc()
+        return AdmissionRejected(status_code, reason, self._retry_after(), detail)
+
+    def _update_gauges(self):
+        ADMISSION_ACTIVE.labels(self.name).set(self._active)
+        ADMISSION_QUEUED.labels(self.name).set(self._queued)
+
+    async def acquire(self, user_id: str) -> Ticket:
+        """Wait for a slot, or raise AdmissionRejected"""
+        if self._user_load.get(user_id, 0) >= self.per_user_limit:
+            raise self._reject(429, "user_limit", "Too many concurrent requests for this user")
+
+        if self._active < self.max_concurrent and not self._waiting:
+            return self._grant(user_id, waited=0.0)
+
+        if self._queued >= self.max_queue:
+            raise self._reject(503, "queue_full", "Model is busy, please retry shortly")
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(user_id, deque()).append(future)
+        self._queued += 1
+        self._user_load[user_id] = self._user_load.get(user_id, 0) + 1
+        self._update_gauges()
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            if not self._abandon(user_id, future):
+                raise self._reject(503, "queue_timeout", "Model is busy, please retry shortly")
+        except asyncio.CancelledError:
+            # The client went away while queued
+            if not self._abandon(user_id, future):
+                raise
+            self._release_slot(user_id)
+            raise
+
+        ticket = Ticket(self, user_id)
+        ADMISSION_WAIT.labels(self.name).observe(time.monotonic() - start)
+        return ticket
+
+    def _abandon(self, user_id: str, future: asyncio.Future) -> bool:
+        """Drop a waiter; True if it had been granted a slot in the meantime"""
+        if future.done() and not future.cancelled():
+            return True
+        future.cancel()
+        queue = self._waiting.get(user_id)
+        if queue is not None and future in queue:
+            queue.remove(future)
+            if not queue:
+                del self._waiting[user_id]
+        self._queued -= 1
+        self._decrement_user(user_id)
+        self._update_gauges()
+        self._dispatch()
+        return False
+
+    def _grant(self, user_id: str, waited: float) -> Ticket:
+        self._active += 1
+        self.admitted += 1
+        self._user_load[user_id] = self._user_load.get(user_id, 0) + 1
+        self._update_gauges()
+        ADMISSION_WAIT.labels(self.name).observe(waited)
+        return Ticket(self, user_id)
+
+    def _decrement_user(self, user_id: str):
+        load = self._user_load.get(user_id, 0) - 1
+        if load > 0:
+            self._user_load[user_id] = load
+        else:
+            self._user_load.pop(user_id, None)
+
+    def _release(self, ticket: Ticket):
+        held = time.monotonic() - ticket.granted_at
+        self._hold_seconds = 0.8 * self._hold_seconds + 0.2 * held
+        self._release_slot(ticket.user_id)
+
+    def _release_slot(self, user_id: str):
+        self._active -= 1
+        self._decrement_user(user_id)
+        self._dispatch()
+        self._update_gauges()
+
+    def _dispatch(self):
+        """Hand free slots to waiters, one user at a time in round-robin order"""
+        while self._active < self.max_concurrent and self._waiting:
+            user_id, queue = self._waiting.popitem(last=False)
+            future = queue.popleft()
+            if queue:
+                # Back of the line for this user's next request
+                self._waiting[user_id] = queue
+            self._queued -= 1
+            # Waiters keep their per-user load; it now counts as running
+            self._active += 1
+            self.admitted += 1
+            future.set_result(True)
+
+    def stats(self) -> dict:
+        return {
+            "active": self._active,
+            "queued": self._queued,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "waiting_users": len(self._waiting),
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "avg_hold_seconds": round(self._hold_seconds, 3),
+        }
+
+_generation_admission: Optional[AdmissionController] = None
+
+def get_generation_admission() -> AdmissionController:
+    """Admission controller in front of Ollama generation (capacity scales with the pool)"""
+    global _generation_admission
+    if _generation_admission is None:
+        _generation_admission = AdmissionController(
+            "ollama_generate",
+            max_concurrent=settings.ollama_max_concurrent_generations * len(ollama_urls()),
+            max_queue=settings.ollama_generation_queue_size,
+            max_wait=settings.ollama_generation_queue_timeout,
+            per_user_limit=settings.ollama_generation_per_user_limit
+        )
+    return _generation_admission
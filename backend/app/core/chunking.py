@@ -0,0 +1,65 @@
+"""
+Split diary entries into overlapping passages for indexing
+
+Each passage is embedded and stored as its own object (linked to the
+diary by ``diaryId`` and ``chunkIndex``), so a long entry is found by its
+most relevant part and only that part goes into prompts. Passages end at
+a sentence or line boundary when one falls in the second half of the
+window, and the next passage starts ``overlap`` characters earlier so no
+sentence is only ever seen cut in half.
+"""
+import re
+from typing import List, NamedTuple
+from app.core.config import settings
+from app.core.embedding_cache import text_fingerprint
+
+# Sentence ends (Latin and CJK punctuation) and line breaks
+_BOUNDARY = re.compile(r"[.!?。！？…]+[\"'”’）)]*\s*|\n+")
+_SPACE = re.compile(r"\s")
+
+def split_passages(text: str, size: int, overlap: int) -> List[str]:
+    text = (text or "").strip()
+    if len(text) <= size:
+        return [text]
+    overlap = min(max(0, overlap), size // 2)
+
+    passages = []
+    start = 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            # Prefer the last sentence boundary in the second half of the window
+            boundaries = [m.end() for m in _BOUNDARY.finditer(text, start + size // 2, end)]
+            if boundaries:
+                end = boundaries[-1]
+        passage = text[start:end].strip()
+        if passage:
+            passages.append(passage)
+        if end >= len(text):
+            break
+        next_start = max(end - overlap, start + 1)
+        # Start the overlap on a word boundary when the text has spaces
+        space = _SPACE.search(text, next_start, end)
+        start = space.end() if space else next_start
+    return passages
+
+def diary_passages(content: str) -> List[str]:
+    """Passages of a diary's content with the configured size and overlap"""
+    return split_passages(content, settings.chunk_size, settings.chunk_overlap)
+
+class Passage(NamedTuple):
+    index: int
+    content: str
+    # Text that is embedded: the diary title plus the passage
+    text: str
+    # Stored with the passage; an unchanged fingerprint means the stored
+    # vector is still valid and the passage need not be re-embedded
+    fingerprint: str
+
+def index_passages(title: str, content: str) -> List[Passage]:
+    """The passages to index for a diary, with their embedding texts and fingerprints"""
+    passages = []
+    for index, passage in enumerate(diary_passages(content)):
+        text = f"{title}\n\n{passage}"
+        passages.append(Passage(index, passage, text, text_fingerprint(text)))
+    return passages
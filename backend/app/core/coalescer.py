@@ -0,0 +1,176 @@
+"""
+Per-user request coalescing
+
+Recommendation requests arrive in bursts while a user types, and only the
+answer to the latest draft is ever shown. A ``RequestCoalescer`` keeps at
+most one piece of work in flight per user:
+
+- identical requests (same fingerprint) join the flight already running
+  instead of starting their own (single-flight)
+- a request for a different draft cancels the older flight; callers still
+  waiting on it are handed the newer flight's result
+- work that replaced an older draft only starts after ``debounce`` seconds
+  without a newer one, so a burst collapses before any embedding, search or
+  generation happens (an isolated request starts at once)
+
+Streams take part in supersession too (a newer request stops an older
+stream), but are never shared between callers.
+"""
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, TypeVar
+from app.core.config import settings
+from app.core.metrics import COALESCER_REQUESTS
+
+T = TypeVar("T")
+
+class RequestSuperseded(Exception):
+    """A newer request from the same user replaced this one"""
+
+class _Flight:
+    __slots__ = ("fingerprint", "task", "waiters")
+
+    def __init__(self, fingerprint: Optional[str], task: asyncio.Task):
+        # None for streams, which are never joined
+        self.fingerprint = fingerprint
+        self.task = task
+        self.waiters = 0
+
+class RequestCoalescer:
+    def __init__(self, name: str, debounce: float = 0.0):
+        self.name = name
+        self.debounce = debounce
+        self._flights: Dict[str, _Flight] = {}
+        self.counts: Dict[str, int] = {}
+
+    def _count(self, outcome: str):
+        self.counts[outcome] = self.counts.get(outcome, 0) + 1
+        COALESCER_REQUESTS.labels(self.name, outcome).inc()
+
+    def supersede(self, user_id: str) -> bool:
+        """Cancel the user's in-flight work; True if there was any"""
+        flight = self._flights.pop(user_id, None)
+        if flight is None or flight.task.done():
+            return False
+        flight.task.cancel()
+        self._count("superseded")
+        return True
+
+    def _track(self, user_id: str, flight: _Flight):
+        self._flights[user_id] = flight
+
+        def forget(_):
+            if self._flights.get(user_id) is flight:
+                del self._flights[user_id]
+
+        flight.task.add_done_callback(forget)
+
+    @staticmethod
+    async def _after(delay: float, work: Callable[[], Awaitable[T]]) -> T:
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return await work()
+
+    async def run(self, user_id: str, fingerprint: str, work: Callable[[], Awaitable[T]]) -> T:
+        """Run ``work`` for this user's latest draft, sharing or replacing in-flight work"""
+        flight = self._flights.get(user_id)
+        if flight is not None and flight.fingerprint == fingerprint and not flight.task.done():
+            self._count("deduplicated")
+        else:
+            delay = self.debounce if self.supersede(user_id) else 0.0
+            flight = _Flight(fingerprint, asyncio.create_task(self._after(delay, work)))
+            self._track(user_id, flight)
+            self._count("started")
+
+        while True:
+            joined = flight
+            joined.waiters += 1
+            try:
+                return await asyncio.shield(joined.task)
+            except asyncio.CancelledError:
+                if not joined.task.cancelled():
+                    # This caller was cancelled, not the flight
+                    raise
+                newer = self._flights.get(user_id)
+                if newer is None or newer is joined or newer.fingerprint is None:
+                    raise RequestSuperseded("A newer draft replaced this request")
+                # Follow the newer flight; its answer is the one the user wants
+                flight = newer
+            finally:
+                joined.waiters -= 1
+                if joined.waiters == 0 and not joined.task.done():
+                    # Nobody is left to read the result
+                    joined.task.cancel()
+
+    async def stream(self, user_id: str, tokens: AsyncIterator[str]) -> AsyncIterator[str]:
+        """
+        Relay ``tokens`` unless a newer request from the user supersedes it
+
+        The stream is pumped by a task so that supersession can stop it at
+        once, even while it waits for the first token; the upstream
+        generator is closed either way.
+        """
+        self.supersede(user_id)
+        queue: asyncio.Queue = asyncio.Queue()
+        started = False
+
+        async def pump():
+            nonlocal started
+            started = True
+            try:
+                async for token in tokens:
+                    queue.put_nowait(("token", token))
+                queue.put_nowait(("done", None))
+            except asyncio.CancelledError:
+                queue.put_nowait(("superseded", None))
+                raise
+            except Exception as e:
+                queue.put_nowait(("error", e))
+            finally:
+                await tokens.aclose()
+
+        flight = _Flight(None, asyncio.create_task(pump()))
+
+        def stopped(task: asyncio.Task):
+            # Cancelled before its first step, the pump never reports it
+            if task.cancelled() and not started:
+                queue.put_nowait(("superseded", None))
+
+        flight.task.add_done_callback(stopped)
+        self._track(user_id, flight)
+        self._count("started")
+        try:
+            while True:
+                kind, value = await queue.get()
+                if kind == "token":
+                    yield value
+                elif kind == "done":
+                    return
+                elif kind == "error":
+                    raise value
+                else:
+                    raise RequestSuperseded("A newer draft replaced this request")
+        finally:
+            if not flight.task.done():
+                flight.task.cancel()
+            if not started:
+                # The pump never ran, so it cannot close the upstream stream
+                await tokens.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": sum(1 for flight in self._flights.values() if not flight.task.done()),
+            "debounce_ms": round(self.debounce * 1000, 1),
+            **self.counts,
+        }
+
+_recommendation_coalescer: Optional[RequestCoalescer] = None
+
+def get_recommendation_coalescer() -> RequestCoalescer:
+    """Coalescer for the recommend endpoints"""
+    global _recommendation_coalescer
+    if _recommendation_coalescer is None:
+        _recommendation_coalescer = RequestCoalescer(
+            "recommendation",
+            debounce=settings.recommend_debounce_ms / 1000
+        )
+    return _recommendation_coalescer
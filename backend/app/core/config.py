@@ -7,17 +7,137 @@ class Settings(BaseSettings):
     
     # OpenAI
     openai_api_key: str = "sk-mock-key-for-dev"
+    openai_embedding_model: str = "text-embedding-ada-002"
+    openai_chat_model: str = "gpt-3.5-turbo"
+    openai_max_connections: int = 100
+    openai_max_keepalive_connections: int = 20
+    openai_concurrency_limit: int = 16
+    openai_connect_timeout: float = 5.0
+    openai_embedding_timeout: float = 15.0
+    openai_chat_timeout: float = 60.0
+    openai_max_retries: int = 2
     
     # Firebase
     firebase_project_id: str = "mock-project"
     google_application_credentials: str = "/app/service-account.json"
+    firestore_max_workers: int = 16
     
     # Weaviate
     weaviate_url: str = "http://weaviate:8080"
+    weaviate_hnsw_ef: int = 128
+    weaviate_hnsw_ef_construction: int = 256
+    weaviate_hnsw_max_connections: int = 32
+    
+    # Vector store backend: "weaviate" or "local" (in-process NumPy index,
+    # persisted under VECTOR_STORE_PATH when set, every
+    # VECTOR_STORE_FLUSH_INTERVAL_SECONDS or VECTOR_STORE_FLUSH_WRITES writes)
+    vector_store: str = "weaviate"
+    vector_store_path: Optional[str] = None
+    vector_store_flush_interval_seconds: float = 5.0
+    vector_store_flush_writes: int = 500
     
     # Ollama
     ollama_url: str = "http://ollama:11434"
+    # Several instances (comma-separated) are load-balanced and health-checked;
+    # empty means just OLLAMA_URL
+    ollama_urls: str = ""
+    ollama_health_interval: float = 10.0
     ollama_model: str = "llama3.2:1b"
+    ollama_http2: bool = False
+    ollama_max_connections: int = 32
+    ollama_max_keepalive_connections: int = 16
+    ollama_keepalive_expiry: float = 30.0
+    ollama_connect_timeout: float = 5.0
+    ollama_embed_timeout: float = 30.0
+    ollama_generate_timeout: float = 60.0
+    ollama_status_timeout: float = 5.0
+    # Admission control for generation: requests beyond the concurrency
+    # limit (per Ollama instance) queue, bounded and with a deadline, or are
+    # shed with 429/503
+    ollama_max_concurrent_generations: int = 2
+    ollama_generation_queue_size: int = 16
+    ollama_generation_queue_timeout: float = 20.0
+    ollama_generation_per_user_limit: int = 2
+    # Recommend requests wait this long for a newer draft before starting;
+    # identical in-flight requests are shared and older drafts cancelled
+    recommend_debounce_ms: float = 150.0
+    
+    # Prompt assembly: prompts are filled up to PROMPT_MAX_TOKENS by
+    # priority (template, current entry up to PROMPT_ENTRY_MAX_TOKENS, then
+    # retrieved passages by score); PROMPT_TOKENIZER is auto, tiktoken or
+    # heuristic (auto uses tiktoken when installed)
+    prompt_max_tokens: int = 1200
+    prompt_entry_max_tokens: int = 500
+    prompt_min_passage_tokens: int = 32
+    prompt_tokenizer: str = "auto"
+    prompt_tiktoken_encoding: str = "cl100k_base"
+    prompt_tokenizer_cache_size: int = 4096
+    
+    # Chunking: diaries are indexed as overlapping passages of about
+    # CHUNK_SIZE characters; retrieval returns up to
+    # RETRIEVAL_PASSAGES_PER_DIARY best passages of each matching diary
+    chunk_size: int = 400
+    chunk_overlap: int = 80
+    retrieval_passages_per_diary: int = 1
+    
+    # Retrieval: "hybrid" fuses vector and BM25 keyword search ("rrf" or
+    # "weighted" by RETRIEVAL_HYBRID_ALPHA on the vector side), "vector" is
+    # vector only; RETRIEVAL_RERANKER=overlap reorders fused candidates
+    retrieval_mode: str = "hybrid"
+    retrieval_fusion: str = "rrf"
+    retrieval_hybrid_alpha: float = 0.6
+    retrieval_rrf_k: int = 60
+    retrieval_candidate_multiplier: int = 3
+    retrieval_reranker: str = "none"
+    retrieval_vector_budget_ms: float = 500.0
+    retrieval_keyword_budget_ms: float = 300.0
+    retrieval_rerank_budget_ms: float = 50.0
+    # Threads for searches against an out-of-process store (Weaviate); a
+    # search that misses its budget holds its thread until the store answers
+    retrieval_search_threads: int = 8
+    
+    # Model providers: "openai" / "ollama" for the live services, or "stub"
+    # for deterministic local backends with injected latency and failures
+    insight_provider: str = "openai"
+    recommendation_provider: str = "ollama"
+    stub_embedding_dim: int = 384
+    stub_embed_latency_ms: float = 0.0
+    stub_generate_latency_ms: float = 0.0
+    stub_token_latency_ms: float = 0.0
+    stub_latency_jitter_ms: float = 0.0
+    stub_embed_failure_rate: float = 0.0
+    stub_generate_failure_rate: float = 0.0
+    stub_seed: Optional[int] = None
+    
+    # Embedding cache (set EMBEDDING_CACHE_PATH to persist vectors across restarts)
+    embedding_cache_max_entries: int = 10000
+    embedding_cache_ttl_seconds: float = 7 * 24 * 3600
+    embedding_cache_path: Optional[str] = None
+    embedding_cache_mmap_bytes: int = 256 * 1024 * 1024
+    
+    # Semantic response cache: reuse a generated response when a new query is
+    # this similar (cosine) to a recent one and retrieves the same diaries
+    response_cache_max_entries: int = 2048
+    response_cache_per_user: int = 8
+    response_cache_ttl_seconds: float = 600.0
+    response_cache_similarity: float = 0.97
+    
+    # Embedding micro-batching
+    embedding_batch_max_size: int = 32
+    embedding_batch_max_wait_ms: float = 5.0
+    
+    # Background indexing queue (SQLite outbox)
+    indexing_queue_path: str = "data/indexing_queue.db"
+    indexing_workers: int = 4
+    indexing_max_attempts: int = 6
+    indexing_backoff_base_seconds: float = 1.0
+    indexing_backoff_max_seconds: float = 300.0
+    indexing_poll_interval_seconds: float = 1.0
+    
+    # Logging: JSON lines by default; INFO/DEBUG events are sampled
+    log_level: str = "INFO"
+    log_format: str = "json"
+    log_sample_rate: float = 0.1
     
     # API
     api_host: str = "0.0.0.0"
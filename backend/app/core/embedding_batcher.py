@@ -0,0 +1,111 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from app.core.config import settings
+
+EmbedBatchFn = Callable[[List[str]], Awaitable[List[List[float]]]]
+
+class EmbeddingBatcher:
+    """
+    Async micro-batcher in front of an embedding backend
+
+    Concurrent callers enqueue single texts; the queue is flushed as one
+    batched provider request once it holds ``max_batch_size`` texts or the
+    oldest text has waited ``max_wait_ms``. Vectors are then fanned back
+    to the waiting callers in order.
+    """
+    def __init__(
+        self,
+        name: str,
+        embed_batch: EmbedBatchFn,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0
+    ):
+        self.name = name
+        self.embed_batch = embed_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+        self.batches = 0
+        self.items = 0
+        self.failures = 0
+
+    async def embed(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    async def embed_many(self, texts: List[str]) -> List[List[float]]:
+        return list(await asyncio.gather(*(self.embed(text) for text in texts)))
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._pending:
+            batch = self._pending[:self.max_batch_size]
+            self._pending = self._pending[self.max_batch_size:]
+            task = asyncio.ensure_future(self._run(batch))
+            # Keep a reference so the task is not garbage collected mid-flight
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]):
+        # Identical texts in one window are sent once
+        unique_texts = list(dict.fromkeys(text for text, _ in batch))
+        self.batches += 1
+        self.items += len(unique_texts)
+
+        try:
+            vectors = await self.embed_batch(unique_texts)
+            if len(vectors) != len(unique_texts):
+                raise ValueError(
+                    f"{self.name} returned {len(vectors)} embeddings for {len(unique_texts)} inputs"
+                )
+        except Exception as e:
+            self.failures += 1
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        by_text = dict(zip(unique_texts, vectors))
+        for text, future in batch:
+            if not future.done():
+                future.set_result(by_text[text])
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "failures": self.failures,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "fill_ratio": round(self.items / (self.batches * self.max_batch_size), 4) if self.batches else 0.0
+        }
+
+_batchers: Dict[str, EmbeddingBatcher] = {}
+
+def get_embedding_batcher(name: str, embed_batch: EmbedBatchFn) -> EmbeddingBatcher:
+    """Get or create the process-wide batcher for an embedding backend"""
+    if name not in _batchers:
+        _batchers[name] = EmbeddingBatcher(
+            name,
+            embed_batch,
+            max_batch_size=settings.embedding_batch_max_size,
+            max_wait_ms=settings.embedding_batch_max_wait_ms
+        )
+    return _batchers[name]
+
+def embedding_batcher_stats() -> Dict[str, dict]:
+    return {name: batcher.stats() for name, batcher in _batchers.items()}
@@ -0,0 +1,148 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from app.core.config import settings
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_text(text: str) -> str:
+    """Normalize text so whitespace-only and Unicode-form differences share a cache key"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+def text_fingerprint(text: str) -> str:
+    """SHA-256 of the normalized text"""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """
+    Embedding cache keyed by (model, normalized-text hash)
+
+    Entries live in a bounded in-memory LRU with a TTL. When a path is
+    configured, entries are also written to a SQLite file read through
+    mmap so vectors survive restarts and are promoted back into memory
+    on first use.
+    """
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        ttl_seconds: float = 7 * 24 * 3600,
+        disk_path: Optional[str] = None,
+        mmap_bytes: int = 256 * 1024 * 1024
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, List[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._disk = None
+        if disk_path:
+            self._disk = self._open_disk(disk_path, mmap_bytes)
+
+    @staticmethod
+    def _open_disk(path: str, mmap_bytes: int) -> sqlite3.Connection:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA mmap_size={int(mmap_bytes)}")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " text_hash TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " PRIMARY KEY (model, text_hash))"
+        )
+        return conn
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl_seconds > 0 and time.time() - created_at > self.ttl_seconds
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        key = (model, text_fingerprint(text))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created_at, vector = entry
+                if not self._expired(created_at):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return vector
+                del self._entries[key]
+
+            if self._disk is not None:
+                row = self._disk.execute(
+                    "SELECT created_at, vector FROM embeddings WHERE model = ? AND text_hash = ?",
+                    key
+                ).fetchone()
+                if row is not None and not self._expired(row[0]):
+                    vector = array("f", row[1]).tolist()
+                    self._remember(key, row[0], vector)
+                    self.disk_hits += 1
+                    return vector
+
+            self.misses += 1
+            return None
+
+    def put(self, model: str, text: str, vector: List[float]):
+        if not vector:
+            return
+        key = (model, text_fingerprint(text))
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, vector)
+            if self._disk is not None:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO embeddings (model, text_hash, created_at, vector) VALUES (?, ?, ?, ?)",
+                    (key[0], key[1], now, array("f", vector).tobytes())
+                )
+
+    def _remember(self, key: Tuple[str, str], created_at: float, vector: List[float]):
+        self._entries[key] = (created_at, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            "disk_enabled": self._disk is not None
+        }
+
+    def close(self):
+        if self._disk is not None:
+            self._disk.close()
+            self._disk = None
+
+_cache: Optional[EmbeddingCache] = None
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Get or create the process-wide embedding cache shared by both RAG services"""
+    global _cache
+    if _cache is None:
+        _cache = EmbeddingCache(
+            max_entries=settings.embedding_cache_max_entries,
+            ttl_seconds=settings.embedding_cache_ttl_seconds,
+            disk_path=settings.embedding_cache_path,
+            mmap_bytes=settings.embedding_cache_mmap_bytes
+        )
+    return _cache
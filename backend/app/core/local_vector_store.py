@@ -0,0 +1,417 @@
+"""
+In-process vector store backed by NumPy
+
+Vectors are L2-normalised and kept contiguously per user, so a search is
+one matrix-vector product over that user's rows followed by a partial
+sort (``argpartition``) for the top k. There is no ANN index: brute force
+is exact and, at the few thousand entries a diary user has, faster than
+a network round trip to Weaviate.
+
+With a ``path`` each changed collection is saved by ``flush`` (called
+periodically by the vector store flusher and on close) as
+``<collection>.vectors.npy`` (rows grouped by user) plus
+``<collection>.meta.json``, and loaded back as a read-only memory map;
+a user's shard is copied into memory the first time it is written.
+``persisted_at`` records when the last flush started, so writes made after
+it (lost in a crash) can be replayed from the indexing queue.
+
+Keyword search uses a per-user BM25 index over title and content, built
+on the first keyword query for that user and kept up to date afterwards.
+"""
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set
+import numpy as np
+from app.core.text_search import BM25Index, diary_tokens, tokenize
+from app.core.vector_store import VectorStore
+from app.core.weaviate_client import vector_class_name
+
+_INITIAL_CAPACITY = 16
+
+_PERSISTED_FILE = "persisted.json"
+
+class _Shard:
+    """One user's vectors in a contiguous, growable matrix"""
+
+    def __init__(self, dim: int, vectors: Optional[np.ndarray] = None, ids=None, properties=None):
+        self.vectors = vectors if vectors is not None else np.empty((0, dim), dtype=np.float32)
+        self.count = len(ids or [])
+        self.ids: List[str] = list(ids or [])
+        self.properties: List[dict] = list(properties or [])
+        self.rows: Dict[str, int] = {uuid: row for row, uuid in enumerate(self.ids)}
+        self.text_index: Optional[BM25Index] = None
+
+    def _writable(self, needed: int):
+        vectors = self.vectors
+        if needed <= len(vectors) and vectors.flags.writeable and not isinstance(vectors, np.memmap):
+            return
+        capacity = max(_INITIAL_CAPACITY, needed, 2 * len(vectors))
+        grown = np.empty((capacity, vectors.shape[1]), dtype=np.float32)
+        grown[:self.count] = vectors[:self.count]
+        self.vectors = grown
+
+    def upsert(self, uuid: str, properties: dict, vector: np.ndarray):
+        row = self.rows.get(uuid)
+        if row is None:
+            self._writable(self.count + 1)
+            row = self.count
+            self.count += 1
+            self.rows[uuid] = row
+            self.ids.append(uuid)
+            self.properties.append(properties)
+        else:
+            self._writable(self.count)
+            self.properties[row] = properties
+        self.vectors[row] = vector
+        if self.text_index is not None:
+            self.text_index.add(uuid, self._tokens(properties))
+
+    def remove(self, uuid: str) -> bool:
+        row = self.rows.pop(uuid, None)
+        if row is None:
+            return False
+        if self.text_index is not None:
+            self.text_index.remove(uuid)
+        self._writable(self.count)
+        last = self.count - 1
+        if row != last:
+            # Move the last row into the hole to stay contiguous
+            self.vectors[row] = self.vectors[last]
+            self.ids[row] = self.ids[last]
+            self.properties[row] = self.properties[last]
+            self.rows[self.ids[row]] = row
+        self.ids.pop()
+        self.properties.pop()
+        self.count = last
+        return True
+
+    def top_k(self, query: np.ndarray, limit: int):
+        if self.count == 0 or limit <= 0:
+            return []
+        scores = self.vectors[:self.count] @ query
+        if limit < self.count:
+            candidates = np.argpartition(-scores, limit - 1)[:limit]
+        else:
+            candidates = np.arange(self.count)
+        ordered = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(int(row), float(scores[row])) for row in ordered]
+
+    @staticmethod
+    def _tokens(properties: dict) -> List[str]:
+        return diary_tokens(properties.get("title") or "", properties.get("content") or "")
+
+    def keyword_top_k(self, query: str, limit: int):
+        if self.text_index is None:
+            self.text_index = BM25Index()
+            for uuid, properties in zip(self.ids, self.properties):
+                self.text_index.add(uuid, self._tokens(properties))
+        return [(self.rows[uuid], score) for uuid, score in self.text_index.search(tokenize(query), limit)]
+
+class _Collection:
+    def __init__(self, dim: Optional[int] = None):
+        self.dim = dim
+        self.shards: Dict[str, _Shard] = {}
+        self.owners: Dict[str, str] = {}
+        # diaryId -> UUIDs of its passage objects
+        self.diaries: Dict[str, Set[str]] = {}
+
+    def link(self, uuid: str, properties: dict):
+        self.diaries.setdefault(properties.get("diaryId"), set()).add(uuid)
+
+    def unlink(self, uuid: str, properties: dict):
+        uuids = self.diaries.get(properties.get("diaryId"))
+        if uuids is not None:
+            uuids.discard(uuid)
+            if not uuids:
+                del self.diaries[properties.get("diaryId")]
+
+    def __len__(self):
+        return len(self.owners)
+
+class LocalVectorStore(VectorStore):
+    name = "local"
+    in_process = True
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._collections: Dict[str, _Collection] = {}
+        self._dirty = set()
+        # Writes since the last flush; ``on_write`` is called with the count
+        # (under the store lock, so it must be cheap)
+        self._writes = 0
+        self.on_write: Optional[Callable[[int], None]] = None
+        self._lock = threading.RLock()
+        # Serialises flushes, which write files outside ``_lock``
+        self._flush_lock = threading.Lock()
+        if path:
+            os.makedirs(path, exist_ok=True)
+            for filename in os.listdir(path):
+                if filename.endswith(".meta.json"):
+                    self._load(filename[:-len(".meta.json")])
+            self.persisted_at = self._load_persisted_at()
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm > 0 else array
+
+    def _collection(self, name: str) -> _Collection:
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = _Collection()
+        return collection
+
+    def ensure_collection(self, provider: str, model: str) -> str:
+        name = vector_class_name(provider, model)
+        with self._lock:
+            self._collection(name)
+        return name
+
+    def collection_exists(self, collection: str) -> bool:
+        return collection in self._collections
+
+    def drop_collection(self, collection: str):
+        with self._flush_lock, self._lock:
+            self._collections.pop(collection, None)
+            self._dirty.discard(collection)
+            if self.path:
+                for suffix in (".vectors.npy", ".meta.json"):
+                    try:
+                        os.remove(os.path.join(self.path, collection + suffix))
+                    except FileNotFoundError:
+                        pass
+
+    def upsert(self, collection, uuid, properties, vector, exists=False):
+        vector = self._normalize(vector)
+        user_id = properties["userId"]
+        with self._lock:
+            store = self._collection(collection)
+            if store.dim is None:
+                store.dim = len(vector)
+            elif len(vector) != store.dim:
+                raise ValueError(
+                    f"Vector dimension {len(vector)} does not match {collection} ({store.dim})"
+                )
+
+            previous_owner = store.owners.get(uuid)
+            if previous_owner is not None:
+                previous = store.shards[previous_owner]
+                store.unlink(uuid, previous.properties[previous.rows[uuid]])
+                if previous_owner != user_id:
+                    previous.remove(uuid)
+
+            shard = store.shards.get(user_id)
+            if shard is None:
+                shard = store.shards[user_id] = _Shard(store.dim)
+            shard.upsert(uuid, dict(properties), vector)
+            store.owners[uuid] = user_id
+            store.link(uuid, properties)
+            self._touch(collection)
+
+    def delete(self, collection, uuid):
+        with self._lock:
+            store = self._collections.get(collection)
+            if store is None:
+                return False
+            return self._delete(collection, store, uuid)
+
+    def _delete(self, collection: str, store: _Collection, uuid: str) -> bool:
+        user_id = store.owners.pop(uuid, None)
+        if user_id is None:
+            return False
+        shard = store.shards[user_id]
+        store.unlink(uuid, shard.properties[shard.rows[uuid]])
+        shard.remove(uuid)
+        self._touch(collection)
+        return True
+
+    def _touch(self, collection: str):
+        self._dirty.add(collection)
+        self._writes += 1
+        if self.on_write is not None:
+            self.on_write(self._writes)
+
+    @property
+    def pending_writes(self) -> int:
+        return self._writes
+
+    def delete_passages(self, collection, diary_id, start=0):
+        with self._lock:
+            store = self._collections.get(collection)
+            if store is None:
+                return 0
+            doomed = []
+            for uuid in store.diaries.get(diary_id, ()):
+                shard = store.shards[store.owners[uuid]]
+                if (shard.properties[shard.rows[uuid]].get("chunkIndex") or 0) >= start:
+                    doomed.append(uuid)
+            for uuid in doomed:
+                self._delete(collection, store, uuid)
+            return len(doomed)
+
+    def passage_fingerprints(self, collection, diary_id):
+        with self._lock:
+            store = self._collections.get(collection)
+            if store is None:
+                return {}
+            fingerprints = {}
+            for uuid in store.diaries.get(diary_id, ()):
+                shard = store.shards[store.owners[uuid]]
+                properties = shard.properties[shard.rows[uuid]]
+                fingerprints[properties.get("chunkIndex") or 0] = properties.get("fingerprint")
+            return fingerprints
+
+    def search(self, collection, vector, user_id, limit, properties):
+        query = self._normalize(vector)
+        with self._lock:
+            store = self._collections.get(collection)
+            shard = store.shards.get(user_id) if store is not None else None
+            if shard is None:
+                return []
+            if len(query) != store.dim:
+                raise ValueError(
+                    f"Query dimension {len(query)} does not match {collection} ({store.dim})"
+                )
+            results = []
+            for row, score in shard.top_k(query, limit):
+                stored = shard.properties[row]
+                entry = {name: stored.get(name) for name in properties}
+                entry["_additional"] = {"distance": max(0.0, 1.0 - score)}
+                results.append(entry)
+            return results
+
+    def keyword_search(self, collection, query, user_id, limit, properties):
+        with self._lock:
+            store = self._collections.get(collection)
+            shard = store.shards.get(user_id) if store is not None else None
+            if shard is None:
+                return []
+            results = []
+            for row, score in shard.keyword_top_k(query, limit):
+                stored = shard.properties[row]
+                entry = {name: stored.get(name) for name in properties}
+                entry["_additional"] = {"score": score}
+                results.append(entry)
+            return results
+
+    def iter_objects(self, collection, batch_size=200):
+        with self._lock:
+            store = self._collections.get(collection)
+            if store is None:
+                return
+            objects = sorted(
+                (uuid, shard.properties[shard.rows[uuid]])
+                for shard in store.shards.values()
+                for uuid in shard.ids
+            )
+        for start in range(0, len(objects), batch_size):
+            yield [
+                {"id": uuid, "properties": dict(properties)}
+                for uuid, properties in objects[start:start + batch_size]
+            ]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": self.name,
+                "collections": {
+                    name: {"objects": len(store), "users": len(store.shards), "dimension": store.dim}
+                    for name, store in self._collections.items()
+                }
+            }
+
+    # ----- persistence -----
+
+    def _files(self, collection: str):
+        base = os.path.join(self.path, collection)
+        return base + ".vectors.npy", base + ".meta.json"
+
+    def _load(self, collection: str):
+        vectors_path, meta_path = self._files(collection)
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        store = self._collections[collection] = _Collection(meta["dim"])
+        if not meta["users"]:
+            return
+        vectors = np.load(vectors_path, mmap_mode="r")
+        for user_id, (start, count) in meta["users"].items():
+            objects = meta["objects"][start:start + count]
+            store.shards[user_id] = _Shard(
+                store.dim,
+                vectors=vectors[start:start + count],
+                ids=[obj["id"] for obj in objects],
+                properties=[obj["properties"] for obj in objects]
+            )
+            for obj in objects:
+                store.owners[obj["id"]] = user_id
+                store.link(obj["id"], obj["properties"])
+
+    def _load_persisted_at(self) -> Optional[float]:
+        try:
+            with open(os.path.join(self.path, _PERSISTED_FILE), encoding="utf-8") as f:
+                return json.load(f)["persistedAt"]
+        except FileNotFoundError:
+            # Files written before the marker existed were saved on close;
+            # a new store has nothing on disk yet
+            return max(
+                (os.path.getmtime(self._files(collection)[1]) for collection in self._collections),
+                default=0.0
+            )
+
+    def _snapshot(self, store: _Collection):
+        """Copy of a collection's rows for writing without holding the lock"""
+        users, objects, blocks = {}, [], []
+        for user_id, shard in store.shards.items():
+            if shard.count == 0:
+                continue
+            users[user_id] = (len(objects), shard.count)
+            # Stored property dicts are replaced on update, never mutated
+            objects.extend(
+                {"id": uuid, "properties": properties}
+                for uuid, properties in zip(shard.ids, shard.properties)
+            )
+            blocks.append(shard.vectors[:shard.count])
+        vectors = np.concatenate(blocks) if blocks else np.empty((0, store.dim or 0), dtype=np.float32)
+        return {"dim": store.dim, "users": users, "objects": objects}, vectors
+
+    def flush(self):
+        """Write changed collections to disk (atomically, one file pair each)"""
+        if not self.path:
+            return
+        with self._flush_lock:
+            with self._lock:
+                started = time.time()
+                dirty = set(self._dirty)
+                snapshots = [
+                    (collection, self._snapshot(self._collections[collection]))
+                    for collection in dirty
+                    if collection in self._collections
+                ]
+                self._dirty.clear()
+                self._writes = 0
+            try:
+                for collection, (meta, vectors) in snapshots:
+                    vectors_path, meta_path = self._files(collection)
+                    with open(vectors_path + ".tmp", "wb") as f:
+                        np.save(f, vectors)
+                    with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+                        json.dump(meta, f)
+                    os.replace(vectors_path + ".tmp", vectors_path)
+                    os.replace(meta_path + ".tmp", meta_path)
+                persisted_path = os.path.join(self.path, _PERSISTED_FILE)
+                with open(persisted_path + ".tmp", "w", encoding="utf-8") as f:
+                    json.dump({"persistedAt": started}, f)
+                os.replace(persisted_path + ".tmp", persisted_path)
+            except BaseException:
+                # Keep the changes pending so the next flush retries them
+                with self._lock:
+                    self._dirty |= dirty
+                    self._writes = max(self._writes, 1)
+                raise
+            self.persisted_at = started
+
+    def close(self):
+        self.flush()
@@ -0,0 +1,65 @@
+"""
+Structured, sampled logging
+
+Every record is one JSON object (``LOG_FORMAT=text`` for a readable
+form while developing) carrying an ``event`` name plus fields.
+``log_event`` drops sampled-out records before any formatting work, so
+per-request events cost one random draw: warnings and errors are always
+kept, lower levels are kept with probability ``LOG_SAMPLE_RATE``.
+"""
+import json
+import logging
+import random
+import sys
+import time
+from app.core.config import settings
+
+_configured = False
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": getattr(record, "event", record.getMessage()),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        fields = " ".join(f"{key}={value}" for key, value in getattr(record, "fields", {}).items())
+        line = (
+            f"{time.strftime('%H:%M:%S', time.localtime(record.created))} {record.levelname:<7} "
+            f"{record.name} {getattr(record, 'event', record.getMessage())} {fields}"
+        ).rstrip()
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+def configure_logging():
+    global _configured
+    if _configured:
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(TextFormatter() if settings.log_format == "text" else JsonFormatter())
+    root = logging.getLogger("app")
+    root.addHandler(handler)
+    root.setLevel(settings.log_level.upper())
+    root.propagate = False
+    _configured = True
+
+def get_logger(name: str) -> logging.Logger:
+    configure_logging()
+    return logging.getLogger(name)
+
+def log_event(logger: logging.Logger, level: int, event: str, exc_info=None, **fields):
+    """Log ``event`` with structured ``fields``; INFO and below are sampled"""
+    if level < logging.WARNING and settings.log_sample_rate < 1.0 and random.random() >= settings.log_sample_rate:
+        return
+    if not logger.isEnabledFor(level):
+        return
+    logger.log(level, event, exc_info=exc_info, extra={"event": event, "fields": fields})
@@ -0,0 +1,198 @@
+"""
+Prometheus metrics
+
+Exposed at ``/metrics``:
+
+- ``http_request_duration_seconds{method,route,status}``: per-route request
+  time, measured until the last body chunk is sent (covers streams)
+- ``http_requests_in_flight``
+- ``rag_stage_duration_seconds{pipeline,stage}``: embed, search, prompt and
+  generate for the insight (OpenAI) and recommendation (Llama) pipelines
+- ``provider_errors_total{provider,operation,kind}``: kind is timeout or error
+- ``generations_in_flight{pipeline}``
+- ``indexing_queue_depth``
+- ``admission_active`` / ``admission_queued`` / ``admission_rejected_total`` /
+  ``admission_wait_seconds`` per admission controller
+- ``ollama_node_healthy{node}`` / ``ollama_node_in_flight{node}`` and
+  ``ollama_failovers_total{endpoint}`` for the Ollama pool
+- ``response_cache_lookups_total{pipeline,result}``: result is hit or miss
+- ``coalescer_requests_total{coalescer,outcome}``: started, deduplicated or
+  superseded
+- ``retrieval_budget_exceeded_total{pipeline,stage}``: retrieval stages
+  dropped for missing their latency budget
+- ``retrieval_abandoned_calls_total{pipeline,stage}`` /
+  ``retrieval_abandoned_in_flight``: store searches still running after
+  their budget expired, and how many of them hold a search thread now
+- ``prompt_tokens{pipeline}``: tokens in each assembled prompt
+- ``index_passages_total{pipeline,outcome}``: passages embedded or skipped
+  as unchanged when a diary is (re)indexed
+"""
+import asyncio
+import time
+from contextlib import contextmanager
+import httpx
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request duration by route template",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being served")
+RAG_STAGE_DURATION = Histogram(
+    "rag_stage_duration_seconds",
+    "Time spent in each RAG pipeline stage",
+    ["pipeline", "stage"],
+    buckets=LATENCY_BUCKETS
+)
+PROVIDER_ERRORS = Counter(
+    "provider_errors_total",
+    "Failed embedding/generation provider calls",
+    ["provider", "operation", "kind"]
+)
+GENERATIONS_IN_FLIGHT = Gauge(
+    "generations_in_flight",
+    "Generation requests currently running against a provider",
+    ["pipeline"]
+)
+INDEXING_QUEUE_DEPTH = Gauge("indexing_queue_depth", "Pending and running indexing jobs")
+ADMISSION_ACTIVE = Gauge("admission_active", "Requests holding an admission slot", ["controller"])
+ADMISSION_QUEUED = Gauge("admission_queued", "Requests waiting for an admission slot", ["controller"])
+ADMISSION_REJECTED = Counter(
+    "admission_rejected_total",
+    "Requests shed by admission control",
+    ["controller", "reason"]
+)
+ADMISSION_WAIT = Histogram(
+    "admission_wait_seconds",
+    "Time spent queued before admission",
+    ["controller"],
+    buckets=(0.0, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+OLLAMA_NODE_HEALTHY = Gauge("ollama_node_healthy", "1 if the Ollama node is routable", ["node"])
+OLLAMA_NODE_IN_FLIGHT = Gauge("ollama_node_in_flight", "Calls in flight per Ollama node", ["node"])
+OLLAMA_FAILOVERS = Counter(
+    "ollama_failovers_total",
+    "Ollama calls retried on another node after a connect error",
+    ["endpoint"]
+)
+RESPONSE_CACHE_LOOKUPS = Counter(
+    "response_cache_lookups_total",
+    "Semantic response cache lookups",
+    ["pipeline", "result"]
+)
+COALESCER_REQUESTS = Counter(
+    "coalescer_requests_total",
+    "Requests started, joined to an identical in-flight request, or superseded",
+    ["coalescer", "outcome"]
+)
+RETRIEVAL_BUDGET_EXCEEDED = Counter(
+    "retrieval_budget_exceeded_total",
+    "Retrieval stages dropped for missing their latency budget",
+    ["pipeline", "stage"]
+)
+RETRIEVAL_ABANDONED_CALLS = Counter(
+    "retrieval_abandoned_calls_total",
+    "Store searches left running after their retrieval budget expired",
+    ["pipeline", "stage"]
+)
+RETRIEVAL_ABANDONED_IN_FLIGHT = Gauge(
+    "retrieval_abandoned_in_flight",
+    "Abandoned store searches still holding a search thread"
+)
+
+PROMPT_TOKENS = Histogram(
+    "prompt_tokens",
+    "Tokens in each assembled prompt",
+    ["pipeline"],
+    buckets=(64, 128, 256, 512, 1024, 1536, 2048, 4096, 8192)
+)
+
+INDEX_PASSAGES = Counter(
+    "index_passages_total",
+    "Diary passages embedded or skipped as unchanged during indexing",
+    ["pipeline", "outcome"]
+)
+
+def _is_timeout(error: BaseException) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, httpx.TimeoutException)):
+        return True
+    # openai.APITimeoutError, without importing openai here
+    return type(error).__name__ == "APITimeoutError"
+
+def record_provider_error(provider: str, operation: str, error: BaseException):
+    kind = "timeout" if _is_timeout(error) else "error"
+    PROVIDER_ERRORS.labels(provider, operation, kind).inc()
+
+@contextmanager
+def stage_timer(pipeline: str, stage: str):
+    """Time a RAG stage (also recorded when the stage raises)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        RAG_STAGE_DURATION.labels(pipeline, stage).observe(time.perf_counter() - start)
+
+@contextmanager
+def generation_in_flight(pipeline: str):
+    gauge = GENERATIONS_IN_FLIGHT.labels(pipeline)
+    gauge.inc()
+    try:
+        yield
+    finally:
+        gauge.dec()
+
+async def render_metrics():
+    """Body and content type for the /metrics endpoint"""
+    from app.services.indexing_queue import get_indexing_queue
+    stats = await get_indexing_queue().stats()
+    INDEXING_QUEUE_DEPTH.set(stats["pending"] + stats["running"])
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+class MetricsMiddleware:
+    """ASGI middleware recording request duration per route template"""
+    def __init__(self, app):
+        self.app = app
+        self._routes = None
+
+    def _route_template(self, scope) -> str:
+        # The router stores the matched endpoint in the scope; map it back
+        # to its path template so label cardinality stays bounded
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if self._routes is None:
+            self._routes = {
+                getattr(route, "endpoint", None): route.path
+                for route in scope["app"].routes
+                if hasattr(route, "path")
+            }
+        return self._routes.get(endpoint, "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            HTTP_REQUEST_DURATION.labels(
+                scope["method"],
+                self._route_template(scope),
+                str(status)
+            ).observe(time.perf_counter() - start)
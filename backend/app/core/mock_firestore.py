@@ -0,0 +1,436 @@
+"""
+In-memory Firestore stand-in for development and load testing
+
+Implements the subset of the firebase-admin API the backend uses
+(documents, where/order_by/start_after/select/limit queries, get_all,
+batches and transactions) with Firestore's result semantics, so dev mode
+returns the same data as production. Queries are served from indexes
+that are built on first use and maintained on every write:
+
+- equality indexes: field -> value -> document IDs
+- composite indexes: (equality fields, order field) -> equality values ->
+  sorted [(order value, document ID)], mirroring Firestore's composite
+  indexes, so ``where(userId == x).order_by(createdAt).limit(n)`` costs
+  O(log n + limit) instead of a collection scan.
+"""
+import bisect
+import itertools
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from google.api_core.exceptions import NotFound
+
+# The store is accessed from the Firestore thread pool, so mutations and
+# scans are serialized
+_lock = threading.RLock()
+
+DOCUMENT_ID = "__name__"
+DESCENDING = "DESCENDING"
+
+_OPS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a is not None and a < b,
+    "<=": lambda a, b: a is not None and a <= b,
+    ">": lambda a, b: a is not None and a > b,
+    ">=": lambda a, b: a is not None and a >= b,
+    "in": lambda a, b: a in b,
+    "not-in": lambda a, b: a not in b,
+    "array_contains": lambda a, b: isinstance(a, list) and b in a,
+}
+
+def _hashable(value) -> bool:
+    try:
+        hash(value)
+        return True
+    except TypeError:
+        return False
+
+class MockFirestore:
+    """Mock Firestore for development"""
+    def __init__(self):
+        self._data = {}
+
+    def collection(self, name):
+        with _lock:
+            if name not in self._data:
+                self._data[name] = MockCollection(name)
+            return self._data[name]
+
+    def get_all(self, references):
+        return [ref.get() for ref in references]
+
+    def batch(self):
+        return MockWriteBatch()
+
+    def transaction(self):
+        return MockTransaction()
+
+class MockWriteBatch:
+    def __init__(self):
+        self._writes = []
+
+    def set(self, reference, data):
+        self._writes.append((reference.set, data))
+
+    def update(self, reference, data):
+        self._writes.append((reference.update, data))
+
+    def delete(self, reference):
+        self._writes.append((lambda _: reference.delete(), None))
+
+    def commit(self):
+        with _lock:
+            for write, data in self._writes:
+                write(data)
+        self._writes = []
+
+class MockTransaction(MockWriteBatch):
+    """
+    Mock transaction compatible with ``firestore.transactional``
+
+    Holds the store lock from begin to commit/rollback, so transactions
+    are fully serialized.
+    """
+    _read_only = False
+    _max_attempts = 1
+
+    def __init__(self):
+        super().__init__()
+        self._id = None
+
+    def _clean_up(self):
+        self._writes = []
+        self._id = None
+
+    def _begin(self, retry_id=None):
+        _lock.acquire()
+        self._id = id(self)
+
+    def _commit(self):
+        try:
+            self.commit()
+        finally:
+            self._release()
+
+    def _rollback(self):
+        self._writes = []
+        self._release()
+
+    def _release(self):
+        if self._id is not None:
+            self._id = None
+            _lock.release()
+
+class MockCollection:
+    def __init__(self, name):
+        self.name = name
+        self._docs: Dict[str, "MockDocument"] = {}
+        self._counter = itertools.count(1)
+        self._eq_indexes: Dict[str, Dict[object, set]] = {}
+        self._composite_indexes: Dict[Tuple[Tuple[str, ...], str], Dict[tuple, list]] = {}
+
+    def document(self, doc_id=None):
+        with _lock:
+            # Auto-generate ID if not provided
+            if doc_id is None:
+                doc_id = f"mock_doc_{next(self._counter)}"
+
+            doc = self._docs.get(doc_id)
+            if doc is None:
+                doc = MockDocument(doc_id, self)
+            return doc
+
+    def stream(self):
+        return MockQuery(self).stream()
+
+    def where(self, field, op, value):
+        return MockQuery(self).where(field, op, value)
+
+    def order_by(self, field, direction="ASCENDING"):
+        return MockQuery(self).order_by(field, direction)
+
+    def limit(self, count):
+        return MockQuery(self).limit(count)
+
+    # ----- index maintenance (callers hold the lock) -----
+
+    def _write(self, doc: "MockDocument", data: Optional[dict]):
+        stored = self._docs.get(doc.id)
+        old = stored._data if stored is not None else None
+        if data:
+            doc._data = data
+            self._docs[doc.id] = doc
+        else:
+            doc._data = {}
+            self._docs.pop(doc.id, None)
+        self._reindex(doc.id, old, data or None)
+
+    def _reindex(self, doc_id: str, old: Optional[dict], new: Optional[dict]):
+        for field, index in self._eq_indexes.items():
+            if old is not None and _hashable(old.get(field)):
+                ids = index.get(old.get(field))
+                if ids is not None:
+                    ids.discard(doc_id)
+                    if not ids:
+                        del index[old.get(field)]
+            if new is not None and _hashable(new.get(field)):
+                index.setdefault(new.get(field), set()).add(doc_id)
+
+        for (eq_fields, order_field), index in self._composite_indexes.items():
+            if old is not None:
+                entry = self._composite_entry(doc_id, old, eq_fields, order_field)
+                if entry is not None:
+                    key, item = entry
+                    rows = index.get(key, [])
+                    position = bisect.bisect_left(rows, item)
+                    if position < len(rows) and rows[position] == item:
+                        rows.pop(position)
+            if new is not None:
+                entry = self._composite_entry(doc_id, new, eq_fields, order_field)
+                if entry is not None:
+                    key, item = entry
+                    bisect.insort(index.setdefault(key, []), item)
+
+    @staticmethod
+    def _composite_entry(doc_id, data, eq_fields, order_field):
+        # Like Firestore, documents missing the order field are not indexed
+        if order_field not in data:
+            return None
+        key = tuple(data.get(field) for field in eq_fields)
+        if not _hashable(key):
+            return None
+        return key, (data[order_field], doc_id)
+
+    def _eq_index(self, field: str) -> Dict[object, set]:
+        index = self._eq_indexes.get(field)
+        if index is None:
+            index = {}
+            for doc_id, doc in self._docs.items():
+                value = doc._data.get(field)
+                if _hashable(value):
+                    index.setdefault(value, set()).add(doc_id)
+            self._eq_indexes[field] = index
+        return index
+
+    def _composite_index(self, eq_fields: Tuple[str, ...], order_field: str) -> Dict[tuple, list]:
+        index = self._composite_indexes.get((eq_fields, order_field))
+        if index is None:
+            index = {}
+            for doc_id, doc in self._docs.items():
+                entry = self._composite_entry(doc_id, doc._data, eq_fields, order_field)
+                if entry is not None:
+                    index.setdefault(entry[0], []).append(entry[1])
+            for rows in index.values():
+                rows.sort()
+            self._composite_indexes[(eq_fields, order_field)] = index
+        return index
+
+class MockQuery:
+    def __init__(self, collection, filters=None):
+        self.collection = collection
+        self.filters = list(filters or [])
+        self._orders = []
+        self._start_after = None
+        self._fields = None
+        self._limit_count = None
+
+    def where(self, field, op, value):
+        if op not in _OPS:
+            raise ValueError(f"Unsupported operator in mock Firestore: {op}")
+        self.filters.append((field, op, value))
+        return self
+
+    def order_by(self, field, direction="ASCENDING"):
+        self._orders.append((field, direction))
+        return self
+
+    def start_after(self, values):
+        self._start_after = values
+        return self
+
+    def select(self, fields):
+        self._fields = list(fields)
+        return self
+
+    def limit(self, count):
+        self._limit_count = count
+        return self
+
+    @staticmethod
+    def _value(doc_id, data, field):
+        return doc_id if field == DOCUMENT_ID else data.get(field)
+
+    def _matches(self, data, filters) -> bool:
+        return all(_OPS[op](data.get(field), value) for field, op, value in filters)
+
+    def _after_cursor(self, doc_id, data) -> bool:
+        # Compare field by field in order_by order, honouring each direction
+        for field, direction in self._orders:
+            value = self._value(doc_id, data, field)
+            cursor = self._start_after.get(field)
+            if value == cursor:
+                continue
+            if direction == DESCENDING:
+                return value < cursor
+            return value > cursor
+        return False
+
+    def _equalities(self) -> Tuple[List[Tuple[str, object]], list]:
+        equalities, others = [], []
+        for field, op, value in self.filters:
+            if op == "==" and field != DOCUMENT_ID and _hashable(value):
+                equalities.append((field, value))
+            else:
+                others.append((field, op, value))
+        return equalities, others
+
+    def _uses_composite_index(self) -> bool:
+        """True when the ordering is one field, optionally tie-broken by document ID in the same direction"""
+        if not self._orders or self._orders[0][0] == DOCUMENT_ID:
+            return False
+        if len(self._orders) == 1:
+            return True
+        return (
+            len(self._orders) == 2
+            and self._orders[1][0] == DOCUMENT_ID
+            and self._orders[1][1] == self._orders[0][1]
+        )
+
+    def _stream_indexed(self, equalities, others) -> List[Tuple[str, dict]]:
+        order_field, direction = self._orders[0]
+        equalities = sorted(equalities)
+        eq_fields = tuple(field for field, _ in equalities)
+        rows = self.collection._composite_index(eq_fields, order_field).get(
+            tuple(value for _, value in equalities), []
+        )
+        descending = direction == DESCENDING
+
+        # Position just past the cursor with a binary search
+        if descending:
+            end = len(rows)
+            if self._start_after is not None:
+                cursor = (self._start_after.get(order_field), self._start_after.get(DOCUMENT_ID, ""))
+                if DOCUMENT_ID in self._start_after:
+                    end = bisect.bisect_left(rows, cursor)
+                else:
+                    end = bisect.bisect_left(rows, (cursor[0],))
+            positions = range(end - 1, -1, -1)
+        else:
+            start = 0
+            if self._start_after is not None:
+                value = self._start_after.get(order_field)
+                if DOCUMENT_ID in self._start_after:
+                    start = bisect.bisect_right(rows, (value, self._start_after[DOCUMENT_ID]))
+                else:
+                    start = bisect.bisect_right(rows, (value, "￿"))
+            positions = range(start, len(rows))
+
+        docs = []
+        for position in positions:
+            _, doc_id = rows[position]
+            data = self.collection._docs[doc_id]._data
+            if others and not self._matches(data, others):
+                continue
+            docs.append((doc_id, data))
+            if self._limit_count is not None and len(docs) >= self._limit_count:
+                break
+        return docs
+
+    def _stream_scan(self, equalities, others) -> List[Tuple[str, dict]]:
+        if equalities:
+            # Narrow candidates with the most selective equality index
+            candidate_sets = [
+                self.collection._eq_index(field).get(value, set())
+                for field, value in equalities
+            ]
+            candidates = min(candidate_sets, key=len)
+            docs = [(doc_id, self.collection._docs[doc_id]._data) for doc_id in candidates]
+            others = others + [(field, "==", value) for field, value in equalities]
+        else:
+            docs = [(doc_id, doc._data) for doc_id, doc in self.collection._docs.items()]
+
+        docs = [(doc_id, data) for doc_id, data in docs if self._matches(data, others)]
+
+        # Firestore omits documents that lack an order_by field
+        for field, _ in self._orders:
+            if field != DOCUMENT_ID:
+                docs = [(doc_id, data) for doc_id, data in docs if field in data]
+
+        # Firestore breaks ties by document ID in the direction of the last
+        # order_by, and orders by document ID when there is no order_by
+        orders = list(self._orders)
+        if not orders or orders[-1][0] != DOCUMENT_ID:
+            orders.append((DOCUMENT_ID, orders[-1][1] if orders else "ASCENDING"))
+
+        # Stable multi-key sort: apply the least significant key first
+        for field, direction in reversed(orders):
+            docs.sort(
+                key=lambda item: self._value(item[0], item[1], field),
+                reverse=direction == DESCENDING
+            )
+
+        if self._start_after is not None:
+            docs = [item for item in docs if self._after_cursor(*item)]
+
+        if self._limit_count is not None:
+            docs = docs[:self._limit_count]
+        return docs
+
+    def stream(self):
+        with _lock:
+            equalities, others = self._equalities()
+            if self._uses_composite_index():
+                docs = self._stream_indexed(equalities, others)
+            else:
+                docs = self._stream_scan(equalities, others)
+
+            if self._fields is not None:
+                return [
+                    MockDocSnapshot(doc_id, {k: v for k, v in data.items() if k in self._fields})
+                    for doc_id, data in docs
+                ]
+            return [MockDocSnapshot(doc_id, dict(data)) for doc_id, data in docs]
+
+    def get(self):
+        return self.stream()
+
+class MockDocument:
+    def __init__(self, doc_id, collection):
+        self.id = doc_id
+        self.collection = collection
+        self._data = {}
+
+    def get(self, transaction=None):
+        with _lock:
+            stored = self.collection._docs.get(self.id)
+            return MockDocSnapshot(self.id, dict(stored._data) if stored is not None else {})
+
+    def set(self, data):
+        with _lock:
+            self.collection._write(self, dict(data))
+
+    def update(self, data):
+        with _lock:
+            stored = self.collection._docs.get(self.id)
+            if stored is None:
+                raise NotFound(f"No document to update: {self.collection.name}/{self.id}")
+            self.collection._write(stored, {**stored._data, **data})
+
+    def delete(self):
+        with _lock:
+            stored = self.collection._docs.get(self.id)
+            if stored is not None:
+                self.collection._write(stored, None)
+
+class MockDocSnapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    @property
+    def exists(self):
+        return bool(self._data)
+
+    def to_dict(self):
+        return self._data
@@ -0,0 +1,336 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional
+import httpx
+from app.core.config import settings
+from app.core.log import get_logger, log_event
+from app.core.metrics import OLLAMA_FAILOVERS, OLLAMA_NODE_HEALTHY, OLLAMA_NODE_IN_FLIGHT
+
+logger = get_logger("app.ollama")
+
+# Errors raised before a request reached the node; safe to retry elsewhere
+CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+
+class LatencyStats:
+    """Rolling per-endpoint latency samples (total call time and connection setup)"""
+    def __init__(self, window: int = 1024):
+        self._total = defaultdict(lambda: deque(maxlen=window))
+        self._connect = defaultdict(lambda: deque(maxlen=window))
+        self._calls = defaultdict(int)
+        self._new_connections = defaultdict(int)
+
+    def record(self, endpoint: str, total: float, connect: float):
+        self._calls[endpoint] += 1
+        self._total[endpoint].append(total)
+        self._connect[endpoint].append(connect)
+        if connect > 0:
+            self._new_connections[endpoint] += 1
+
+    @staticmethod
+    def _percentile(samples, q: float) -> float:
+        if not samples:
+            return 0.0
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+        return ordered[index]
+
+    def snapshot(self) -> Dict[str, dict]:
+        result = {}
+        for endpoint, samples in self._total.items():
+            connect = self._connect[endpoint]
+            result[endpoint] = {
+                "calls": self._calls[endpoint],
+                "new_connections": self._new_connections[endpoint],
+                "p50_ms": round(self._percentile(samples, 0.50) * 1000, 2),
+                "p95_ms": round(self._percentile(samples, 0.95) * 1000, 2),
+                "p99_ms": round(self._percentile(samples, 0.99) * 1000, 2),
+                "connect_p99_ms": round(self._percentile(connect, 0.99) * 1000, 2),
+            }
+        return result
+
+class OllamaSession:
+    """
+    Process-wide HTTP session for Ollama
+
+    One pooled (optionally HTTP/2) httpx client is opened at startup and
+    shared by every embedding, generation and status call so keep-alive
+    connections are reused. Each call records its total latency and the
+    time spent establishing a new connection, if one was needed.
+    """
+    def __init__(self, base_url: str, stats: Optional[LatencyStats] = None):
+        self.base_url = base_url
+        self.timeouts = {
+            "embed": settings.ollama_embed_timeout,
+            "embeddings": settings.ollama_embed_timeout,
+            "generate": settings.ollama_generate_timeout,
+            "tags": settings.ollama_status_timeout,
+        }
+        self.stats = stats or LatencyStats()
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                http2=settings.ollama_http2,
+                limits=httpx.Limits(
+                    max_connections=settings.ollama_max_connections,
+                    max_keepalive_connections=settings.ollama_max_keepalive_connections,
+                    keepalive_expiry=settings.ollama_keepalive_expiry,
+                ),
+                timeout=httpx.Timeout(
+                    settings.ollama_generate_timeout,
+                    connect=settings.ollama_connect_timeout,
+                ),
+            )
+        return self._client
+
+    def _timeout(self, endpoint: str) -> httpx.Timeout:
+        return httpx.Timeout(
+            self.timeouts.get(endpoint, settings.ollama_generate_timeout),
+            connect=settings.ollama_connect_timeout,
+        )
+
+    async def request(self, method: str, path: str, endpoint: str, **kwargs) -> httpx.Response:
+        """Send a request through the shared pool, timing the call and any connection setup"""
+        connect = {"started": None, "elapsed": 0.0}
+
+        async def trace(event: str, info: dict):
+            if event == "connection.connect_tcp.started":
+                connect["started"] = time.perf_counter()
+            elif event in ("connection.connect_tcp.complete", "connection.start_tls.complete") and connect["started"] is not None:
+                connect["elapsed"] = time.perf_counter() - connect["started"]
+
+        start = time.perf_counter()
+        try:
+            return await self.client.request(
+                method,
+                path,
+                timeout=self._timeout(endpoint),
+                extensions={"trace": trace},
+                **kwargs
+            )
+        finally:
+            self.stats.record(endpoint, time.perf_counter() - start, connect["elapsed"])
+
+    @asynccontextmanager
+    async def stream(self, method: str, path: str, endpoint: str, **kwargs) -> AsyncIterator[httpx.Response]:
+        """Stream a response body; the recorded latency covers the whole stream"""
+        start = time.perf_counter()
+        try:
+            async with self.client.stream(method, path, timeout=self._timeout(endpoint), **kwargs) as response:
+                yield response
+        finally:
+            self.stats.record(f"{endpoint}_stream", time.perf_counter() - start, 0.0)
+
+    async def post(self, path: str, endpoint: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", path, endpoint, **kwargs)
+
+    async def get(self, path: str, endpoint: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", path, endpoint, **kwargs)
+
+    async def open(self):
+        # Touching the property creates the pooled client
+        _ = self.client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+        self._client = None
+
+class OllamaNode:
+    """One Ollama instance in the pool, with its health and current load"""
+    def __init__(self, base_url: str, stats: LatencyStats):
+        self.base_url = base_url
+        self.session = OllamaSession(base_url, stats)
+        # Optimistic until the first probe says otherwise
+        self.healthy = True
+        self.models: List[str] = []
+        self.has_model: Optional[bool] = None
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self.last_probe: Optional[float] = None
+        OLLAMA_NODE_HEALTHY.labels(base_url).set(1)
+
+    @property
+    def routable(self) -> bool:
+        # A node without the configured model would answer every call with an error
+        return self.healthy and self.has_model is not False
+
+    def mark_up(self, models: List[str]):
+        self.models = models
+        self.has_model = any(settings.ollama_model in name for name in models)
+        self.last_error = None if self.has_model else f"model {settings.ollama_model} not available"
+        if not self.healthy:
+            log_event(logger, logging.INFO, "ollama_node_up", node=self.base_url)
+        self.healthy = True
+        OLLAMA_NODE_HEALTHY.labels(self.base_url).set(1 if self.has_model else 0)
+
+    def mark_down(self, error):
+        self.failures += 1
+        self.last_error = str(error) or type(error).__name__
+        if self.healthy:
+            log_event(logger, logging.WARNING, "ollama_node_down", node=self.base_url, error=self.last_error)
+        self.healthy = False
+        OLLAMA_NODE_HEALTHY.labels(self.base_url).set(0)
+
+    def acquire(self):
+        self.in_flight += 1
+        OLLAMA_NODE_IN_FLIGHT.labels(self.base_url).set(self.in_flight)
+
+    def release(self):
+        self.in_flight -= 1
+        OLLAMA_NODE_IN_FLIGHT.labels(self.base_url).set(self.in_flight)
+
+    def snapshot(self) -> dict:
+        return {
+            "url": self.base_url,
+            "healthy": self.healthy,
+            "model_available": self.has_model,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "last_probe_age_s": round(time.monotonic() - self.last_probe, 1) if self.last_probe else None,
+        }
+
+class OllamaPool:
+    """
+    Routes Ollama calls across several instances
+
+    Each call goes to the healthy node with the fewest calls in flight
+    (ties rotate round-robin). A node that refuses the connection is marked
+    down and the call moves on to the next node; nodes come back once a
+    background probe of ``/api/tags`` succeeds again. When no node is
+    known to be healthy every node is tried, so a single-node setup
+    behaves exactly like a plain session. Exposes the same request/stream
+    interface as ``OllamaSession``; ``stats`` aggregates all nodes.
+    """
+    def __init__(self, urls: List[str]):
+        self.stats = LatencyStats()
+        self.nodes = [OllamaNode(url, self.stats) for url in urls]
+        self._next = 0
+        self._probe_task: Optional[asyncio.Task] = None
+
+    def _candidates(self) -> List[OllamaNode]:
+        start = self._next
+        self._next = (self._next + 1) % len(self.nodes)
+        rotated = self.nodes[start:] + self.nodes[:start]
+        routable = [node for node in rotated if node.routable] or rotated
+        # Stable sort: equally loaded nodes keep their round-robin order
+        return sorted(routable, key=lambda node: node.in_flight)
+
+    async def request(self, method: str, path: str, endpoint: str, **kwargs) -> httpx.Response:
+        last_error = None
+        for node in self._candidates():
+            if last_error is not None:
+                OLLAMA_FAILOVERS.labels(endpoint).inc()
+            node.acquire()
+            try:
+                response = await node.session.request(method, path, endpoint, **kwargs)
+            except CONNECT_ERRORS as e:
+                node.mark_down(e)
+                last_error = e
+                continue
+            finally:
+                node.release()
+            node.requests += 1
+            return response
+        raise last_error
+
+    @asynccontextmanager
+    async def stream(self, method: str, path: str, endpoint: str, **kwargs) -> AsyncIterator[httpx.Response]:
+        """Stream from the least-loaded node; fails over only before the response starts"""
+        last_error = None
+        for node in self._candidates():
+            if last_error is not None:
+                OLLAMA_FAILOVERS.labels(endpoint).inc()
+            opened = False
+            node.acquire()
+            try:
+                async with node.session.stream(method, path, endpoint, **kwargs) as response:
+                    opened = True
+                    node.requests += 1
+                    yield response
+                return
+            except CONNECT_ERRORS as e:
+                if opened:
+                    raise
+                node.mark_down(e)
+                last_error = e
+            finally:
+                node.release()
+        raise last_error
+
+    async def post(self, path: str, endpoint: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", path, endpoint, **kwargs)
+
+    async def get(self, path: str, endpoint: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", path, endpoint, **kwargs)
+
+    async def probe(self, node: OllamaNode):
+        """Check one node via /api/tags and update its health"""
+        node.last_probe = time.monotonic()
+        try:
+            response = await node.session.get("/api/tags", endpoint="tags")
+        except Exception as e:
+            node.mark_down(e)
+            return
+        if response.status_code != 200:
+            node.mark_down(f"HTTP {response.status_code}")
+            return
+        node.mark_up([model.get("name", "") for model in response.json().get("models", [])])
+
+    async def probe_all(self):
+        await asyncio.gather(*(self.probe(node) for node in self.nodes))
+
+    async def _probe_loop(self):
+        while True:
+            await self.probe_all()
+            await asyncio.sleep(settings.ollama_health_interval)
+
+    def node_stats(self) -> List[dict]:
+        return [node.snapshot() for node in self.nodes]
+
+    async def open(self):
+        for node in self.nodes:
+            await node.session.open()
+        if settings.ollama_health_interval > 0 and self._probe_task is None:
+            self._probe_task = asyncio.create_task(self._probe_loop())
+
+    async def close(self):
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            try:
+                await self._probe_task
+            except asyncio.CancelledError:
+                pass
+            self._probe_task = None
+        for node in self.nodes:
+            await node.session.close()
+
+def ollama_urls() -> List[str]:
+    """Configured Ollama instances: OLLAMA_URLS (comma-separated) or OLLAMA_URL"""
+    urls = [url.strip() for url in settings.ollama_urls.split(",") if url.strip()]
+    return urls or [settings.ollama_url]
+
+_session: Optional[OllamaPool] = None
+
+def get_ollama_session() -> OllamaPool:
+    """Get or create the shared Ollama pool"""
+    global _session
+    if _session is None:
+        _session = OllamaPool(ollama_urls())
+    return _session
+async def open_ollama_session():
+    await get_ollama_session().open()
+
+async def close_ollama_session():
+    if _session is not None:
+        await _session.close()
@@ -0,0 +1,48 @@
+import asyncio
+from typing import Optional
+import httpx
+from openai import AsyncOpenAI
+from app.core.config import settings
+
+_client: Optional[AsyncOpenAI] = None
+_limiter: Optional[asyncio.Semaphore] = None
+
+def get_openai_client() -> AsyncOpenAI:
+    """Get or create the shared async OpenAI client
+
+    All RAG calls share one connection pool so keep-alive connections are
+    reused across requests instead of being opened per call.
+    """
+    global _client
+    if _client is None:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.openai_max_connections,
+                max_keepalive_connections=settings.openai_max_keepalive_connections,
+            ),
+            timeout=httpx.Timeout(
+                settings.openai_chat_timeout,
+                connect=settings.openai_connect_timeout,
+            ),
+        )
+        _client = AsyncOpenAI(
+            api_key=settings.openai_api_key,
+            max_retries=settings.openai_max_retries,
+            http_client=http_client,
+        )
+    return _client
+
+def get_openai_limiter() -> asyncio.Semaphore:
+    """Semaphore bounding the number of in-flight OpenAI requests per process"""
+    global _limiter
+    if _limiter is None:
+        _limiter = asyncio.Semaphore(settings.openai_concurrency_limit)
+    return _limiter
+
+async def close_openai_client():
+    """Close the shared client and release pooled connections"""
+    global _client, _limiter
+    if _client is not None:
+        await _client.close()
+    _client = None
+    _limiter = None
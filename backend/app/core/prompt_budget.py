@@ -0,0 +1,66 @@
+"""
+Token-budgeted prompt assembly
+
+A ``PromptBudget`` hands out a fixed number of prompt tokens in the order
+the caller asks for them, so the most important parts are placed first:
+the prompt template, then the current entry, then retrieved passages by
+score. Text that does not fit is truncated at a token boundary (marked
+with ``...``), and a section that would be left with fewer than
+``min_tokens`` tokens is dropped instead of included as a useless stub.
+"""
+from typing import Optional
+from app.core.metrics import PROMPT_TOKENS
+from app.core.tokenizer import Tokenizer, get_tokenizer
+
+ELLIPSIS = "..."
+
+class PromptBudget:
+    def __init__(self, max_tokens: int, tokenizer: Optional[Tokenizer] = None):
+        self.max_tokens = max_tokens
+        self.tokenizer = tokenizer or get_tokenizer()
+        self.used = 0
+
+    @property
+    def remaining(self) -> int:
+        return max(0, self.max_tokens - self.used)
+
+    def reserve(self, text: str) -> int:
+        """Count fixed text (template, system prompt) in full, even past the budget"""
+        tokens = self.tokenizer.count(text)
+        self.used += tokens
+        return tokens
+
+    def take(
+        self,
+        text: str,
+        limit: Optional[int] = None,
+        overhead: str = "",
+        min_tokens: int = 1
+    ) -> Optional[str]:
+        """
+        Fit ``text`` into the remaining budget (and ``limit``, if given)
+
+        ``overhead`` is the fixed text that goes with it (a heading or
+        label) and is counted in full. Returns the possibly truncated text,
+        or None without using any budget if it has to be cut to fewer than
+        ``min_tokens`` tokens.
+        """
+        fixed = self.tokenizer.count(overhead)
+        available = self.remaining - fixed
+        if limit is not None:
+            available = min(available, limit)
+        tokens = self.tokenizer.count(text)
+        if tokens > available:
+            # Leave room for the truncation marker
+            available -= self.tokenizer.count(ELLIPSIS)
+            if available < min_tokens:
+                return None
+            text = self.tokenizer.truncate(text, available).rstrip() + ELLIPSIS
+            tokens = self.tokenizer.count(text)
+        self.used += fixed + tokens
+        return text
+
+    def record(self, pipeline: str) -> int:
+        """Report the tokens used by the finished prompt"""
+        PROMPT_TOKENS.labels(pipeline).observe(self.used)
+        return self.used
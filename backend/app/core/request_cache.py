@@ -0,0 +1,39 @@
+from contextvars import ContextVar
+from typing import Optional
+
+# Documents read or written during the current HTTP request, keyed by
+# (collection, document id). None outside of a request, e.g. in
+# background workers, which then always read from the store.
+_documents: ContextVar[Optional[dict]] = ContextVar("request_documents", default=None)
+
+# Sentinel returned by get_cached when the document has not been seen
+MISSING = object()
+
+class RequestCacheMiddleware:
+    """ASGI middleware giving every HTTP request its own document cache"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = _documents.set({})
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _documents.reset(token)
+
+def get_cached(collection: str, doc_id: str):
+    """Return the cached document data, None for a known-missing document, or MISSING"""
+    cache = _documents.get()
+    if cache is None:
+        return MISSING
+    data = cache.get((collection, doc_id), MISSING)
+    return dict(data) if isinstance(data, dict) else data
+
+def set_cached(collection: str, doc_id: str, data: Optional[dict]):
+    cache = _documents.get()
+    if cache is not None:
+        cache[(collection, doc_id)] = dict(data) if data is not None else None
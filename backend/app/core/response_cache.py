@@ -0,0 +1,176 @@
+"""
+Semantic cache for generated responses
+
+Drafting users ask for recommendations every few words, and most of those
+calls differ by a small edit. A cached response is reused when the new
+query embedding is within ``threshold`` cosine similarity of a recent one
+for the same user and pipeline *and* retrieval returned the same set of
+diaries, so the prompt context is unchanged.
+
+Entries expire after ``ttl_seconds``; the least recently used (user,
+pipeline) bucket loses its oldest entry once ``max_entries`` is exceeded.
+Any change to a user's diaries invalidates all of their entries, including
+responses still being generated when the change happens.
+"""
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+from app.core.metrics import RESPONSE_CACHE_LOOKUPS
+
+class CacheKey(NamedTuple):
+    pipeline: str
+    user_id: str
+    vector: np.ndarray
+    context: frozenset
+    # User generation when the key was made; stale keys are never stored
+    generation: int
+
+class PreparedPrompt(NamedTuple):
+    """A built prompt plus its cache lookup result"""
+    prompt: str
+    cache_key: Optional[CacheKey]
+    cached: Optional[str]
+    # Prompt size as counted by the prompt tokenizer
+    tokens: int = 0
+
+class _Entry(NamedTuple):
+    created_at: float
+    vector: np.ndarray
+    context: frozenset
+    response: str
+
+class ResponseCache:
+    def __init__(
+        self,
+        max_entries: int = 2048,
+        per_user: int = 8,
+        ttl_seconds: float = 600.0,
+        threshold: float = 0.97
+    ):
+        self.max_entries = max_entries
+        self.per_user = per_user
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self._buckets: "OrderedDict[Tuple[str, str], List[_Entry]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._size = 0
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self.evictions = 0
+        self.invalidations = 0
+
+    def key(
+        self,
+        pipeline: str,
+        user_id: str,
+        vector: List[float],
+        context_ids: Iterable[str]
+    ) -> Optional[CacheKey]:
+        """Cache key for a query, or None when the query cannot be cached"""
+        if self.max_entries <= 0 or not vector:
+            return None
+        array = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(array))
+        if norm == 0.0:
+            return None
+        return CacheKey(
+            pipeline,
+            user_id,
+            array / norm,
+            frozenset(context_ids),
+            self._generations.get(user_id, 0)
+        )
+
+    def _expired(self, entry: _Entry, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - entry.created_at > self.ttl_seconds
+
+    def get(self, key: Optional[CacheKey]) -> Optional[str]:
+        if key is None:
+            return None
+        bucket_key = (key.pipeline, key.user_id)
+        bucket = self._buckets.get(bucket_key)
+        best, best_score = None, self.threshold
+        if bucket:
+            now = time.time()
+            live = [entry for entry in bucket if not self._expired(entry, now)]
+            self._size -= len(bucket) - len(live)
+            bucket[:] = live
+            for entry in live:
+                if entry.context != key.context or entry.vector.shape != key.vector.shape:
+                    continue
+                score = float(np.dot(entry.vector, key.vector))
+                if score >= best_score:
+                    best, best_score = entry, score
+            if not live:
+                del self._buckets[bucket_key]
+            else:
+                self._buckets.move_to_end(bucket_key)
+
+        result = "hit" if best is not None else "miss"
+        counts = self.hits if best is not None else self.misses
+        counts[key.pipeline] = counts.get(key.pipeline, 0) + 1
+        RESPONSE_CACHE_LOOKUPS.labels(key.pipeline, result).inc()
+        return best.response if best is not None else None
+
+    def put(self, key: Optional[CacheKey], response: str):
+        if key is None or not response:
+            return
+        if self._generations.get(key.user_id, 0) != key.generation:
+            # The user's diaries changed while this response was generated
+            return
+        bucket_key = (key.pipeline, key.user_id)
+        bucket = self._buckets.setdefault(bucket_key, [])
+        bucket.append(_Entry(time.time(), key.vector, key.context, response))
+        self._size += 1
+        if len(bucket) > self.per_user:
+            bucket.pop(0)
+            self._size -= 1
+        self._buckets.move_to_end(bucket_key)
+        while self._size > self.max_entries:
+            oldest_key, oldest = next(iter(self._buckets.items()))
+            oldest.pop(0)
+            self._size -= 1
+            self.evictions += 1
+            if not oldest:
+                del self._buckets[oldest_key]
+
+    def invalidate_user(self, user_id: str):
+        """Drop every cached response for a user (their diaries changed)"""
+        self._generations[user_id] = self._generations.get(user_id, 0) + 1
+        for bucket_key in [k for k in self._buckets if k[1] == user_id]:
+            self._size -= len(self._buckets.pop(bucket_key))
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        pipelines = set(self.hits) | set(self.misses)
+        per_pipeline = {}
+        for pipeline in sorted(pipelines):
+            hits, misses = self.hits.get(pipeline, 0), self.misses.get(pipeline, 0)
+            per_pipeline[pipeline] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            }
+        return {
+            "entries": self._size,
+            "users": len({user_id for _, user_id in self._buckets}),
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "pipelines": per_pipeline,
+        }
+
+_cache: Optional[ResponseCache] = None
+
+def get_response_cache() -> ResponseCache:
+    """Get or create the process-wide response cache shared by both RAG services"""
+    global _cache
+    if _cache is None:
+        _cache = ResponseCache(
+            max_entries=settings.response_cache_max_entries,
+            per_user=settings.response_cache_per_user,
+            ttl_seconds=settings.response_cache_ttl_seconds,
+            threshold=settings.response_cache_similarity
+        )
+    return _cache
@@ -0,0 +1,98 @@
+"""
+Keyword search helpers
+
+``tokenize`` splits text into lowercase word tokens; runs of CJK
+characters, which have no spaces, become overlapping character bigrams so
+Chinese and Japanese diaries are searchable too. ``BM25Index`` is a small
+incremental inverted index used by the local vector store for keyword
+search (Weaviate runs BM25 server-side).
+"""
+import heapq
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+_TOKEN = re.compile(r"[0-9a-z]+|[぀-ヿ㐀-䶿一-鿿가-힯]+")
+_CJK = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯]")
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for match in _TOKEN.finditer(unicodedata.normalize("NFKC", text or "").lower()):
+        token = match.group()
+        if not _CJK.match(token):
+            tokens.append(token)
+        elif len(token) == 1:
+            tokens.append(token)
+        else:
+            tokens.extend(token[i:i + 2] for i in range(len(token) - 1))
+    return tokens
+
+def diary_tokens(title: str, content: str) -> List[str]:
+    """Tokens of a diary for indexing; the title counts twice"""
+    title_tokens = tokenize(title)
+    return title_tokens + title_tokens + tokenize(content)
+
+class BM25Index:
+    """Okapi BM25 over documents addressed by id, updated in place"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._lengths: Dict[str, int] = {}
+        # Distinct terms per document, so removal only touches its postings
+        self._terms: Dict[str, List[str]] = {}
+        self._total_length = 0
+        # Per-document length normalisation, rebuilt lazily after writes
+        self._norms: Optional[Dict[str, float]] = None
+
+    def __len__(self):
+        return len(self._lengths)
+
+    def add(self, doc_id: str, tokens: List[str]):
+        """Index a document, replacing any previous version"""
+        self.remove(doc_id)
+        counts = Counter(tokens)
+        for term, count in counts.items():
+            self._postings.setdefault(term, {})[doc_id] = count
+        self._terms[doc_id] = list(counts)
+        self._lengths[doc_id] = len(tokens)
+        self._total_length += len(tokens)
+        self._norms = None
+
+    def remove(self, doc_id: str) -> bool:
+        length = self._lengths.pop(doc_id, None)
+        if length is None:
+            return False
+        self._total_length -= length
+        self._norms = None
+        for term in self._terms.pop(doc_id):
+            docs = self._postings[term]
+            del docs[doc_id]
+            if not docs:
+                del self._postings[term]
+        return True
+
+    def search(self, query_tokens: List[str], limit: int) -> List[Tuple[str, float]]:
+        """Best-scoring documents for the query, highest first"""
+        if not self._lengths or limit <= 0:
+            return []
+        total = len(self._lengths)
+        norms = self._norms
+        if norms is None:
+            average = self._total_length / total or 1.0
+            norms = self._norms = {
+                doc_id: self.k1 * (1 - self.b + self.b * length / average)
+                for doc_id, length in self._lengths.items()
+            }
+        scores: Dict[str, float] = {}
+        for term in set(query_tokens):
+            docs = self._postings.get(term)
+            if not docs:
+                continue
+            weight = math.log(1 + (total - len(docs) + 0.5) / (len(docs) + 0.5)) * (self.k1 + 1)
+            for doc_id, count in docs.items():
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight * count / (count + norms[doc_id])
+        return heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
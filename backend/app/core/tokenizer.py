@@ -0,0 +1,129 @@
+"""
+Token counting for prompt budgets
+
+``get_tokenizer`` returns the tokenizer selected by ``settings.prompt_tokenizer``:
+
+- ``tiktoken``: OpenAI's BPE (``settings.prompt_tiktoken_encoding``); exact
+  for OpenAI models and a close estimate for Llama
+- ``heuristic``: no dependency; one token per CJK character and per
+  punctuation mark, one per five letters/digits of a word (rounded up),
+  which is close to BPE counts for English and errs on the high side
+- ``auto`` (default): tiktoken when it is installed and its encoding
+  loads, otherwise heuristic
+
+Encodings are kept in a small LRU cache, since the same diary passages and
+prompt templates are counted on every request.
+"""
+import logging
+import re
+from collections import OrderedDict
+from typing import Optional, Sequence
+from app.core.config import settings
+from app.core.log import get_logger, log_event
+
+logger = get_logger("app.tokenizer")
+
+class Tokenizer:
+    """Counts and truncates text in tokens; subclasses provide the encoding"""
+    name = "base"
+
+    def __init__(self, cache_size: int = 4096):
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Sequence]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _encode(self, text: str) -> Sequence:
+        raise NotImplementedError
+
+    def _prefix(self, text: str, encoded: Sequence, max_tokens: int) -> str:
+        """The text of the first ``max_tokens`` tokens"""
+        raise NotImplementedError
+
+    def encode(self, text: str) -> Sequence:
+        encoded = self._cache.get(text)
+        if encoded is not None:
+            self._cache.move_to_end(text)
+            self.hits += 1
+            return encoded
+        self.misses += 1
+        encoded = self._encode(text)
+        if self.cache_size > 0:
+            self._cache[text] = encoded
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return encoded
+
+    def count(self, text: str) -> int:
+        return len(self.encode(text)) if text else 0
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """``text`` cut to at most ``max_tokens`` tokens"""
+        if not text or max_tokens <= 0:
+            return ""
+        encoded = self.encode(text)
+        if len(encoded) <= max_tokens:
+            return text
+        return self._prefix(text, encoded, max_tokens)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "tokenizer": self.name,
+            "cached": len(self._cache),
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+_PIECE = re.compile(r"(?P<cjk>[぀-ヿ㐀-䶿一-鿿가-힯])|(?P<word>[^\W_]+)|\S", re.UNICODE)
+
+class HeuristicTokenizer(Tokenizer):
+    """Dependency-free estimate; the encoding is each token's end offset"""
+    name = "heuristic"
+
+    def _encode(self, text):
+        ends = []
+        for match in _PIECE.finditer(text):
+            start, end = match.span()
+            pieces = -(-(end - start) // 5) if match.lastgroup == "word" else 1
+            ends.extend(start + (end - start) * i // pieces for i in range(1, pieces + 1))
+        return ends
+
+    def _prefix(self, text, encoded, max_tokens):
+        return text[:encoded[max_tokens - 1]]
+
+class TiktokenTokenizer(Tokenizer):
+    name = "tiktoken"
+
+    def __init__(self, encoding: str = "cl100k_base", cache_size: int = 4096):
+        # Imported lazily so tiktoken stays optional
+        import tiktoken
+        super().__init__(cache_size)
+        self.encoding = tiktoken.get_encoding(encoding)
+
+    def _encode(self, text):
+        return self.encoding.encode(text, disallowed_special=())
+
+    def _prefix(self, text, encoded, max_tokens):
+        return self.encoding.decode(encoded[:max_tokens])
+
+_tokenizer: Optional[Tokenizer] = None
+
+def get_tokenizer() -> Tokenizer:
+    """Get or create the tokenizer selected by ``settings.prompt_tokenizer``"""
+    global _tokenizer
+    if _tokenizer is None:
+        choice = settings.prompt_tokenizer
+        cache_size = settings.prompt_tokenizer_cache_size
+        if choice not in ("auto", "tiktoken", "heuristic"):
+            raise ValueError(f"Unknown tokenizer: {choice}")
+        if choice != "heuristic":
+            try:
+                _tokenizer = TiktokenTokenizer(settings.prompt_tiktoken_encoding, cache_size)
+            except Exception as e:
+                # Not installed, or its encoding files could not be fetched
+                if choice == "tiktoken":
+                    raise
+                log_event(logger, logging.WARNING, "tokenizer_fallback", tokenizer="heuristic", error=str(e))
+        if _tokenizer is None:
+            _tokenizer = HeuristicTokenizer(cache_size)
+    return _tokenizer
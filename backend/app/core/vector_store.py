@@ -0,0 +1,348 @@
+"""
+Vector store interface
+
+``RAGService`` and ``LlamaRAGService`` talk to a ``VectorStore`` instead of
+a Weaviate client, so the backend can run against:
+
+- ``weaviate``: the Weaviate server at ``settings.weaviate_url`` (default)
+- ``local``: an in-process NumPy index (see ``app.core.local_vector_store``)
+  for offline development, benchmarks and small tenants
+
+Collections are named per embedding model (see ``vector_class_name``) and
+objects are addressed by their deterministic UUID (``passage_object_uuid``;
+a diary is stored as one object per passage, see ``app.core.chunking``).
+Neither backend touches the network or disk until first use.
+
+The local store keeps writes in memory; ``start_vector_store_flusher``
+runs a task that writes them to disk every
+``settings.vector_store_flush_interval_seconds`` or after
+``settings.vector_store_flush_writes`` writes, whichever comes first.
+"""
+import asyncio
+import logging
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+from app.core.config import settings
+from app.core.log import get_logger, log_event
+from app.core.weaviate_client import (
+    get_weaviate_client,
+    ensure_vector_class,
+    upsert_object,
+    delete_object,
+)
+
+logger = get_logger("app.vector_store")
+
+_store = None
+_flusher: Optional[asyncio.Task] = None
+
+# Upper bound on passages read back for one diary
+MAX_PASSAGES = 1000
+
+class VectorStore:
+    """Operations the services need from a vector index"""
+    # In-process stores answer in microseconds; calling them inline is
+    # cheaper than handing each query to a thread
+    in_process = False
+    # Time after which writes may not be durable yet (stores that persist
+    # in the background); None when every write is durable once it returns
+    persisted_at: Optional[float] = None
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Await a blocking call to this store (``fn`` is one of its methods)
+
+        Network-backed stores run it in a worker thread so a round trip
+        never stalls the event loop; in-process stores are called inline.
+        """
+        if self.in_process:
+            return fn(*args, **kwargs)
+        return await asyncio.to_thread(fn, *args, **kwargs)
+
+    def ensure_collection(self, provider: str, model: str) -> str:
+        """Create the collection for an embedding model if needed and return its name"""
+        raise NotImplementedError
+
+    def collection_exists(self, collection: str) -> bool:
+        raise NotImplementedError
+
+    def drop_collection(self, collection: str):
+        raise NotImplementedError
+
+    def upsert(
+        self,
+        collection: str,
+        uuid: str,
+        properties: dict,
+        vector: List[float],
+        exists: bool = False
+    ):
+        """Create or fully replace an object; ``properties`` must include ``userId``"""
+        raise NotImplementedError
+
+    def upsert_many(self, collection: str, objects: List[Tuple[str, dict, List[float]]]):
+        """Create or replace many ``(uuid, properties, vector)`` objects in one request"""
+        for uuid, properties, vector in objects:
+            self.upsert(collection, uuid, properties, vector)
+
+    def delete(self, collection: str, uuid: str) -> bool:
+        """Delete an object by UUID; returns False if it did not exist"""
+        raise NotImplementedError
+
+    def delete_passages(self, collection: str, diary_id: str, start: int = 0) -> int:
+        """
+        Delete a diary's passage objects from ``chunkIndex`` ``start`` on
+
+        ``start=0`` removes every object of the diary, including ones
+        written before passages existed. Returns the number deleted.
+        """
+        raise NotImplementedError
+
+    def passage_fingerprints(self, collection: str, diary_id: str) -> Dict[int, Optional[str]]:
+        """``chunkIndex`` -> stored ``fingerprint`` of each of a diary's passages"""
+        raise NotImplementedError
+
+    def search(
+        self,
+        collection: str,
+        vector: List[float],
+        user_id: str,
+        limit: int,
+        properties: List[str]
+    ) -> List[dict]:
+        """
+        Nearest objects of one user by cosine distance, closest first
+
+        Each entry holds the requested properties plus
+        ``{"_additional": {"distance": ...}}``.
+        """
+        raise NotImplementedError
+
+    def keyword_search(
+        self,
+        collection: str,
+        query: str,
+        user_id: str,
+        limit: int,
+        properties: List[str]
+    ) -> List[dict]:
+        """
+        BM25 matches of one user's title/content, best first
+
+        Each entry holds the requested properties plus
+        ``{"_additional": {"score": ...}}``.
+        """
+        raise NotImplementedError
+
+    def iter_objects(self, collection: str, batch_size: int = 200) -> Iterator[List[dict]]:
+        """Pages of ``{"id": uuid, "properties": {...}}`` covering the whole collection"""
+        raise NotImplementedError
+
+    @property
+    def pending_writes(self) -> int:
+        """Writes not yet persisted by ``flush``"""
+        return 0
+
+    def flush(self):
+        """Persist pending writes (stores that write in the background)"""
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+    def close(self):
+        pass
+
+class WeaviateVectorStore(VectorStore):
+    name = "weaviate"
+
+    def __init__(self):
+        # The client's batch buffer is shared; one batch import at a time
+        self._batch_lock = threading.Lock()
+
+    @property
+    def client(self):
+        # Connecting is deferred to first use so importing the services
+        # never requires a live Weaviate
+        return get_weaviate_client()
+
+    def ensure_collection(self, provider: str, model: str) -> str:
+        return ensure_vector_class(self.client, provider, model)
+
+    def collection_exists(self, collection: str) -> bool:
+        return self.client.schema.exists(collection)
+
+    def drop_collection(self, collection: str):
+        self.client.schema.delete_class(collection)
+
+    def upsert(self, collection, uuid, properties, vector, exists=False):
+        upsert_object(self.client, collection, uuid, properties, vector=vector, exists=exists)
+
+    def upsert_many(self, collection, objects):
+        # One batch import request per call; batch writes overwrite by UUID
+        with self._batch_lock:
+            batch = self.client.batch
+            for uuid, properties, vector in objects:
+                batch.add_data_object(properties, collection, uuid=uuid, vector=vector)
+            results = batch.create_objects() or []
+        for result in results:
+            errors = (result.get("result") or {}).get("errors")
+            if errors:
+                raise RuntimeError(f"Batch import failed for {result.get('id')}: {errors}")
+
+    def delete(self, collection, uuid):
+        return delete_object(self.client, collection, uuid)
+
+    def delete_passages(self, collection, diary_id, start=0):
+        where = {
+            "path": ["diaryId"],
+            "operator": "Equal",
+            "valueText": diary_id
+        }
+        if start > 0:
+            where = {
+                "operator": "And",
+                "operands": [where, {
+                    "path": ["chunkIndex"],
+                    "operator": "GreaterThanEqual",
+                    "valueInt": start
+                }]
+            }
+        result = self.client.batch.delete_objects(class_name=collection, where=where, output="minimal")
+        return ((result or {}).get("results") or {}).get("successful", 0)
+
+    def passage_fingerprints(self, collection, diary_id):
+        result = (
+            self.client.query
+            .get(collection, ["chunkIndex", "fingerprint"])
+            .with_where({
+                "path": ["diaryId"],
+                "operator": "Equal",
+                "valueText": diary_id
+            })
+            .with_limit(MAX_PASSAGES)
+            .do()
+        )
+        if "errors" in result:
+            raise RuntimeError(result["errors"])
+        entries = result.get("data", {}).get("Get", {}).get(collection) or []
+        return {entry.get("chunkIndex") or 0: entry.get("fingerprint") for entry in entries}
+
+    def search(self, collection, vector, user_id, limit, properties):
+        result = (
+            self.client.query
+            .get(collection, properties)
+            .with_near_vector({
+                "vector": vector
+            })
+            .with_where({
+                "path": ["userId"],
+                "operator": "Equal",
+                "valueText": user_id
+            })
+            .with_additional(["distance"])
+            .with_limit(limit)
+            .do()
+        )
+        if "errors" in result:
+            raise RuntimeError(result["errors"])
+        return result.get("data", {}).get("Get", {}).get(collection) or []
+
+    def keyword_search(self, collection, query, user_id, limit, properties):
+        result = (
+            self.client.query
+            .get(collection, properties)
+            .with_bm25(query=query, properties=["title^2", "content"])
+            .with_where({
+                "path": ["userId"],
+                "operator": "Equal",
+                "valueText": user_id
+            })
+            .with_additional(["score"])
+            .with_limit(limit)
+            .do()
+        )
+        if "errors" in result:
+            raise RuntimeError(result["errors"])
+        entries = result.get("data", {}).get("Get", {}).get(collection) or []
+        for entry in entries:
+            # GraphQL returns the BM25 score as a string
+            entry["_additional"]["score"] = float(entry["_additional"]["score"])
+        return entries
+
+    def iter_objects(self, collection, batch_size=200):
+        after = None
+        while True:
+            result = self.client.data_object.get(
+                class_name=collection,
+                limit=batch_size,
+                after=after
+            )
+            objects = (result or {}).get("objects", [])
+            if not objects:
+                return
+            yield objects
+            after = objects[-1]["id"]
+
+def get_vector_store() -> VectorStore:
+    """Get or create the vector store selected by ``settings.vector_store``"""
+    global _store
+    if _store is None:
+        if settings.vector_store == "local":
+            # Imported lazily so NumPy is only needed by the local backend
+            from app.core.local_vector_store import LocalVectorStore
+            _store = LocalVectorStore(settings.vector_store_path)
+        elif settings.vector_store == "weaviate":
+            _store = WeaviateVectorStore()
+        else:
+            raise ValueError(f"Unknown vector store backend: {settings.vector_store}")
+    return _store
+
+def close_vector_store():
+    global _store
+    if _store is not None:
+        _store.close()
+    _store = None
+
+async def _flush_periodically(store: VectorStore, interval: float, due: asyncio.Event):
+    try:
+        while True:
+            try:
+                await asyncio.wait_for(due.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            due.clear()
+            if store.pending_writes:
+                try:
+                    await asyncio.to_thread(store.flush)
+                except Exception as e:
+                    log_event(logger, logging.WARNING, "vector_store_flush_failed", error=str(e))
+    finally:
+        store.on_write = None
+
+async def start_vector_store_flusher():
+    """Start persisting the local store in the background (no-op for Weaviate)"""
+    global _flusher
+    store = get_vector_store()
+    if _flusher is not None or store.persisted_at is None:
+        return
+    loop = asyncio.get_running_loop()
+    due = asyncio.Event()
+    max_writes = max(1, settings.vector_store_flush_writes)
+
+    def on_write(pending: int):
+        # Called from whichever thread wrote
+        if pending == max_writes:
+            loop.call_soon_threadsafe(due.set)
+
+    store.on_write = on_write
+    _flusher = asyncio.create_task(
+        _flush_periodically(store, settings.vector_store_flush_interval_seconds, due)
+    )
+
+async def stop_vector_store_flusher():
+    """Stop the flusher; ``close_vector_store`` writes what is left"""
+    global _flusher
+    if _flusher is not None:
+        _flusher.cancel()
+        await asyncio.gather(_flusher, return_exceptions=True)
+    _flusher = None
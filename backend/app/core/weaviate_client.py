@@ -1,7 +1,16 @@
+import logging
+import re
+from typing import List, Optional
 import weaviate
+from weaviate.exceptions import ObjectAlreadyExistsException, UnexpectedStatusCodeException
+from weaviate.util import generate_uuid5
 from app.core.config import settings
+from app.core.log import get_logger, log_event
+
+logger = get_logger("app.weaviate")
 
 _client = None
+_known_classes = set()
 
 def get_weaviate_client():
     """Get or create Weaviate client instance"""
@@ -10,57 +19,160 @@ def get_weaviate_client():
         _client = weaviate.Client(
             url=settings.weaviate_url,
         )
-        
-        # Create schema if it doesn't exist
-        _initialize_schema(_client)
     
     return _client
 
-def _initialize_schema(client: weaviate.Client):
-    """Initialize Weaviate schema for diary entries"""
-    schema = {
-        "classes": [
+def vector_class_name(provider: str, model: str) -> str:
+    """
+    Weaviate class holding the vectors of one embedding model
+
+    Each model gets its own class (and HNSW index) so vectors of different
+    dimensionality never share an index, e.g. ("openai",
+    "text-embedding-ada-002") -> "DiaryOpenaiTextEmbeddingAda002".
+    """
+    words = re.split(r"[^0-9a-zA-Z]+", f"{provider} {model}")
+    return "Diary" + "".join(word[:1].upper() + word[1:] for word in words if word)
+
+# Position of a passage within its diary (long diaries are stored as
+# several passage objects, see app.core.chunking)
+CHUNK_INDEX_PROPERTY = {
+    "name": "chunkIndex",
+    "dataType": ["int"],
+    "indexFilterable": True,
+    "description": "Position of this passage within the diary entry"
+}
+FINGERPRINT_PROPERTY = {
+    "name": "fingerprint",
+    "dataType": ["text"],
+    "tokenization": "field",
+    "indexFilterable": False,
+    "indexSearchable": False,
+    "description": "Hash of the embedded text, used to skip unchanged passages on update"
+}
+PASSAGE_PROPERTIES = [CHUNK_INDEX_PROPERTY, FINGERPRINT_PROPERTY]
+
+def _class_definition(class_name: str, description: str) -> dict:
+    """Schema for a per-model diary class with an explicitly tuned HNSW index"""
+    filterable = {
+        "dataType": ["text"],
+        "tokenization": "field",
+        "indexFilterable": True,
+        "indexSearchable": False
+    }
+    return {
+        "class": class_name,
+        "description": description,
+        "vectorizer": "none",
+        "vectorIndexType": "hnsw",
+        "vectorIndexConfig": {
+            "distance": "cosine",
+            "ef": settings.weaviate_hnsw_ef,
+            "efConstruction": settings.weaviate_hnsw_ef_construction,
+            "maxConnections": settings.weaviate_hnsw_max_connections
+        },
+        "properties": [
+            {
+                "name": "diaryId",
+                "description": "The diary entry ID from Firestore",
+                **filterable
+            },
+            {
+                "name": "userId",
+                "description": "The user ID who owns this diary",
+                **filterable
+            },
+            {
+                "name": "title",
+                "dataType": ["text"],
+                "description": "The title of the diary entry"
+            },
+            {
+                "name": "content",
+                "dataType": ["text"],
+                "description": "The content of the diary entry"
+            },
             {
-                "class": "DiaryEntry",
-                "description": "A diary entry with its content",
-                "properties": [
-                    {
-                        "name": "diaryId",
-                        "dataType": ["string"],
-                        "description": "The diary entry ID from Firestore"
-                    },
-                    {
-                        "name": "userId",
-                        "dataType": ["string"],
-                        "description": "The user ID who owns this diary"
-                    },
-                    {
-                        "name": "title",
-                        "dataType": ["string"],
-                        "description": "The title of the diary entry"
-                    },
-                    {
-                        "name": "content",
-                        "dataType": ["text"],
-                        "description": "The content of the diary entry"
-                    },
-                    {
-                        "name": "createdAt",
-                        "dataType": ["string"],
-                        "description": "Timestamp when entry was created"
-                    }
-                ]
-            }
+                "name": "createdAt",
+                "dataType": ["text"],
+                "tokenization": "field",
+                "indexSearchable": False,
+                "description": "Timestamp when entry was created"
+            },
+            *PASSAGE_PROPERTIES
         ]
     }
+
+def ensure_vector_class(client: weaviate.Client, provider: str, model: str) -> str:
+    """Create the class for an embedding model if it does not exist yet and return its name"""
+    class_name = vector_class_name(provider, model)
+    if class_name in _known_classes:
+        return class_name
     
-    # Check if class already exists
     try:
-        existing_schema = client.schema.get()
-        class_names = [c["class"] for c in existing_schema.get("classes", [])]
-        
-        if "DiaryEntry" not in class_names:
-            client.schema.create(schema)
+        if not client.schema.exists(class_name):
+            client.schema.create_class(
+                _class_definition(class_name, f"Diary entries embedded with {provider} {model}")
+            )
+        else:
+            # Classes created before passages existed lack their properties;
+            # adding them explicitly keeps auto-schema from guessing types
+            existing = {prop.get("name") for prop in client.schema.get(class_name).get("properties") or []}
+            for prop in PASSAGE_PROPERTIES:
+                if prop["name"] not in existing:
+                    client.schema.property.create(class_name, prop)
+        _known_classes.add(class_name)
     except Exception as e:
-        print(f"Schema initialization error: {e}")
+        log_event(logger, logging.WARNING, "schema_init_failed", class_name=class_name, error=str(e))
+    
+    return class_name
+
+def diary_object_uuid(class_name: str, diary_id: str) -> str:
+    """Deterministic object UUID for a diary within a class"""
+    return generate_uuid5(diary_id, class_name)
+
+def passage_object_uuid(class_name: str, diary_id: str, index: int) -> str:
+    """Deterministic UUID of a diary's passage; the first passage keeps the diary's UUID"""
+    if index == 0:
+        return diary_object_uuid(class_name, diary_id)
+    return generate_uuid5(f"{diary_id}#{index}", class_name)
+
+def upsert_object(
+    client: weaviate.Client,
+    class_name: str,
+    uuid: str,
+    data_object: dict,
+    vector: Optional[List[float]] = None,
+    exists: bool = False
+):
+    """
+    Create or fully replace an object in a single call in the common case
 
+    ``exists`` says which outcome is expected: new objects are created
+    first and replaced on conflict, known objects are replaced first and
+    created if they turn out to be missing.
+    """
+    if not exists:
+        try:
+            client.data_object.create(data_object, class_name, uuid=uuid, vector=vector)
+            return
+        except ObjectAlreadyExistsException:
+            pass
+        client.data_object.replace(data_object, class_name, uuid, vector=vector)
+        return
+
+    try:
+        client.data_object.replace(data_object, class_name, uuid, vector=vector)
+    except UnexpectedStatusCodeException as e:
+        if e.status_code != 404:
+            raise
+        client.data_object.create(data_object, class_name, uuid=uuid, vector=vector)
+
+def delete_object(client: weaviate.Client, class_name: str, uuid: str) -> bool:
+    """Delete an object by UUID; returns False if it did not exist"""
+    try:
+        client.data_object.delete(uuid=uuid, class_name=class_name)
+        return True
+    except UnexpectedStatusCodeException as e:
+        if e.status_code == 404:
+            return False
+        raise
@@ -1,16 +1,58 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.core.config import settings
+from app.core.admission import AdmissionRejected, get_generation_admission
 from app.api.routes import diaries
-from app.core.firebase import initialize_firebase
+from app.core.firebase import initialize_firebase, shutdown_firestore_executor
+from app.core.openai_client import close_openai_client
+from app.core.request_cache import RequestCacheMiddleware
+from app.core.metrics import MetricsMiddleware, render_metrics
+from app.core.ollama_client import open_ollama_session, close_ollama_session
+from app.core.embedding_cache import get_embedding_cache
+from app.core.embedding_batcher import embedding_batcher_stats
+from app.core.response_cache import get_response_cache
+from app.core.tokenizer import get_tokenizer
+from app.core.coalescer import get_recommendation_coalescer
+from app.core.vector_store import (
+    get_vector_store,
+    close_vector_store,
+    start_vector_store_flusher,
+    stop_vector_store_flusher,
+)
+from app.services.indexing_queue import start_indexing_queue, close_indexing_queue, get_indexing_queue
+from app.services.retrieval import get_retriever
 
 # Initialize Firebase
 initialize_firebase()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await open_ollama_session()
+    # Jobs finished after the local store last reached disk lost their
+    # writes if the previous process died; run them again
+    persisted_at = get_vector_store().persisted_at
+    if persisted_at is not None:
+        await get_indexing_queue().replay_completed(persisted_at)
+    await start_vector_store_flusher()
+    await start_indexing_queue(diaries.diary_service.process_index_job)
+    yield
+    # Stop indexing workers (unfinished jobs resume on next start) and
+    # release pooled provider connections on shutdown
+    await close_indexing_queue()
+    await stop_vector_store_flusher()
+    await close_ollama_session()
+    await close_openai_client()
+    get_embedding_cache().close()
+    close_vector_store()
+    shutdown_firestore_executor()
+
 app = FastAPI(
     title="AI Diary API",
     description="Backend API for AI-powered diary application",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -22,6 +64,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-request document cache (one Firestore read per document per request)
+app.add_middleware(RequestCacheMiddleware)
+
+# Request duration per route template, exported at /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Shed generation requests: 429 when one user has too many in flight,
+# 503 when the model queue is full or the wait ran out
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail, "reason": exc.reason},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 # Include routers
 app.include_router(diaries.router, prefix="/diaries", tags=["diaries"])
 
@@ -37,3 +95,21 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    body, content_type = await render_metrics()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/stats")
+async def stats():
+    return {
+        "embedding_cache": get_embedding_cache().stats(),
+        "embedding_batchers": embedding_batcher_stats(),
+        "indexing_queue": await get_indexing_queue().stats(),
+        "vector_store": get_vector_store().stats(),
+        "generation_admission": get_generation_admission().stats(),
+        "response_cache": get_response_cache().stats(),
+        "recommendation_coalescer": get_recommendation_coalescer().stats(),
+        "prompt_tokenizer": get_tokenizer().stats(),
+        "retrieval": get_retriever().stats()
+    }
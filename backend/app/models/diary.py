@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional, Union
 
 class DiaryBase(BaseModel):
     title: str = Field(..., min_length=1, max_length=200)
@@ -23,6 +23,19 @@ class DiaryResponse(DiaryBase):
     class Config:
         from_attributes = True
 
+class DiarySummary(BaseModel):
+    """Lightweight projection of a diary for list views"""
+    id: str
+    title: str
+    snippet: str
+    createdAt: datetime
+    updatedAt: datetime
+    aiInsight: Optional[str] = None
+
+class DiaryPage(BaseModel):
+    items: List[Union[DiaryResponse, DiarySummary]]
+    nextCursor: Optional[str] = None
+
 class AIInsightResponse(BaseModel):
     insight: str
 
@@ -0,0 +1,2 @@
+# Providers module
+
@@ -0,0 +1,53 @@
+from typing import AsyncIterator, List, Optional
+from app.core.weaviate_client import vector_class_name
+
+class ProviderError(RuntimeError):
+    """A provider answered, but not with a usable result"""
+
+class EmbeddingProvider:
+    """Turns texts into vectors; one instance per (provider, model)"""
+    name: str = ""
+    model: str = ""
+
+    @property
+    def cache_key(self) -> str:
+        """Embedding cache / batcher key, e.g. "openai:text-embedding-ada-002" """
+        return f"{self.name}:{self.model}"
+
+    @property
+    def vector_class(self) -> str:
+        """Vector store collection for this model's vectors"""
+        return vector_class_name(self.name, self.model)
+
+    async def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """One vector per text, in input order; raises on failure"""
+        raise NotImplementedError
+
+class GenerationProvider:
+    """Completes a prompt, either in one piece or as a token stream"""
+    name: str = ""
+    model: str = ""
+
+    async def generate(
+        self,
+        prompt: str,
+        system: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 200
+    ) -> str:
+        raise NotImplementedError
+
+    def stream(
+        self,
+        prompt: str,
+        system: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 200
+    ) -> AsyncIterator[str]:
+        """
+        Yield text as it is produced
+
+        Closing the generator must release the upstream request so the
+        provider stops spending capacity on it.
+        """
+        raise NotImplementedError
@@ -0,0 +1,139 @@
+import asyncio
+import json
+import logging
+from typing import AsyncIterator, List, Optional
+from app.core.config import settings
+from app.core.log import get_logger, log_event
+from app.core.ollama_client import get_ollama_session
+from app.providers.base import EmbeddingProvider, GenerationProvider, ProviderError
+
+logger = get_logger("app.providers.ollama")
+
+class OllamaEmbedder(EmbeddingProvider):
+    name = "ollama"
+
+    def __init__(self, model: Optional[str] = None):
+        self.model = model or settings.ollama_model
+
+    @property
+    def session(self):
+        # 进程内共享的 Ollama 节点池（在 FastAPI 启动时打开，关闭时释放），
+        # 每次调用路由到负载最低的健康节点
+        return get_ollama_session()
+
+    async def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """
+        批量生成嵌入向量
+
+        优先使用 /api/embed（支持数组输入）；旧版 Ollama 没有该接口时，
+        退回到逐条调用 /api/embeddings
+        """
+        response = await self.session.post(
+            "/api/embed",
+            endpoint="embed",
+            json={
+                "model": self.model,
+                "input": texts
+            }
+        )
+
+        if response.status_code == 404:
+            return list(await asyncio.gather(*(self._embed_single(text) for text in texts)))
+
+        if response.status_code != 200:
+            raise ProviderError(f"Embedding failed: {response.status_code}")
+
+        embeddings = response.json().get("embeddings", [])
+        if len(embeddings) != len(texts) or not all(embeddings):
+            raise ProviderError("Embedding failed: incomplete batch response")
+        return embeddings
+
+    async def _embed_single(self, text: str) -> List[float]:
+        response = await self.session.post(
+            "/api/embeddings",
+            endpoint="embeddings",
+            json={
+                "model": self.model,
+                "prompt": text
+            }
+        )
+
+        if response.status_code != 200:
+            raise ProviderError(f"Embedding failed: {response.status_code}")
+
+        embedding = response.json().get("embedding", [])
+        if not embedding:
+            raise ProviderError("Embedding failed: empty embedding")
+        return embedding
+
+class OllamaGenerator(GenerationProvider):
+    name = "ollama"
+
+    def __init__(self, model: Optional[str] = None):
+        self.model = model or settings.ollama_model
+
+    @property
+    def session(self):
+        return get_ollama_session()
+
+    def _payload(self, prompt, system, temperature, max_tokens, stream) -> dict:
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "options": {
+                "temperature": temperature,
+                "num_predict": max_tokens
+            }
+        }
+        if system:
+            payload["system"] = system
+        return payload
+
+    async def generate(self, prompt, system=None, temperature=0.7, max_tokens=200) -> str:
+        """非流式生成；Ollama 返回错误或空结果时抛出 ProviderError（网络错误原样抛出）"""
+        response = await self.session.post(
+            "/api/generate",
+            endpoint="generate",
+            json=self._payload(prompt, system, temperature, max_tokens, stream=False)
+        )
+
+        if response.status_code != 200:
+            error_text = response.text
+            log_event(logger, logging.WARNING, "ollama_error_response", status=response.status_code, body=error_text[:500])
+            raise ProviderError(f"Ollama 服务错误 (状态码 {response.status_code}): {error_text[:200]}")
+
+        result = response.json()
+        recommendation = result.get("response", "")
+        if not recommendation:
+            error_msg = result.get("error", "未知错误")
+            log_event(logger, logging.WARNING, "ollama_empty_response", error=error_msg)
+            raise ProviderError(f"Ollama 返回空结果。可能是模型未加载。错误: {error_msg}")
+        return recommendation
+
+    async def stream(self, prompt, system=None, temperature=0.7, max_tokens=200) -> AsyncIterator[str]:
+        """
+        流式生成：Ollama 每产生一段文本就立即返回
+
+        生成器被关闭时随之关闭与 Ollama 的连接，Ollama 会停止这次生成
+        """
+        async with self.session.stream(
+            "POST",
+            "/api/generate",
+            endpoint="generate",
+            json=self._payload(prompt, system, temperature, max_tokens, stream=True)
+        ) as response:
+            if response.status_code != 200:
+                error_text = (await response.aread()).decode("utf-8", errors="replace")
+                raise ProviderError(f"Ollama 服务错误 (状态码 {response.status_code}): {error_text[:200]}")
+
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise ProviderError(chunk["error"])
+                if chunk.get("response"):
+                    yield chunk["response"]
+                if chunk.get("done"):
+                    break
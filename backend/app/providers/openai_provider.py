@@ -0,0 +1,63 @@
+from typing import AsyncIterator, List, Optional
+from app.core.config import settings
+from app.core.openai_client import get_openai_client, get_openai_limiter
+from app.providers.base import EmbeddingProvider, GenerationProvider
+
+def _messages(prompt: str, system: Optional[str]) -> List[dict]:
+    messages = [{"role": "system", "content": system}] if system else []
+    messages.append({"role": "user", "content": prompt})
+    return messages
+
+class OpenAIEmbedder(EmbeddingProvider):
+    name = "openai"
+
+    def __init__(self, model: Optional[str] = None):
+        self.model = model or settings.openai_embedding_model
+
+    async def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed several texts in a single OpenAI request"""
+        # Client and limiter are resolved per call so a client closed at
+        # shutdown is never reused
+        async with get_openai_limiter():
+            embedding_response = await get_openai_client().embeddings.create(
+                model=self.model,
+                input=texts,
+                timeout=settings.openai_embedding_timeout
+            )
+
+        ordered = sorted(embedding_response.data, key=lambda item: item.index)
+        return [item.embedding for item in ordered]
+
+class OpenAIGenerator(GenerationProvider):
+    name = "openai"
+
+    def __init__(self, model: Optional[str] = None):
+        self.model = model or settings.openai_chat_model
+
+    async def generate(self, prompt, system=None, temperature=0.7, max_tokens=200) -> str:
+        async with get_openai_limiter():
+            response = await get_openai_client().chat.completions.create(
+                model=self.model,
+                messages=_messages(prompt, system),
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=settings.openai_chat_timeout
+            )
+        return response.choices[0].message.content.strip()
+
+    async def stream(self, prompt, system=None, temperature=0.7, max_tokens=200) -> AsyncIterator[str]:
+        async with get_openai_limiter():
+            stream = await get_openai_client().chat.completions.create(
+                model=self.model,
+                messages=_messages(prompt, system),
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True,
+                timeout=settings.openai_chat_timeout
+            )
+            try:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                await stream.response.aclose()
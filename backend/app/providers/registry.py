@@ -0,0 +1,34 @@
+from typing import Dict, Tuple
+from app.providers.base import EmbeddingProvider, GenerationProvider
+
+_providers: Dict[Tuple[str, str], object] = {}
+
+def _create(kind: str, name: str):
+    if name == "openai":
+        from app.providers.openai_provider import OpenAIEmbedder, OpenAIGenerator
+        return OpenAIEmbedder() if kind == "embedder" else OpenAIGenerator()
+    if name == "ollama":
+        from app.providers.ollama_provider import OllamaEmbedder, OllamaGenerator
+        return OllamaEmbedder() if kind == "embedder" else OllamaGenerator()
+    if name == "stub":
+        from app.providers.stub_provider import HashEmbedder, TemplateGenerator
+        return HashEmbedder() if kind == "embedder" else TemplateGenerator()
+    raise ValueError(f"Unknown provider: {name}")
+
+def get_embedder(name: str) -> EmbeddingProvider:
+    """Shared embedding provider by name: "openai", "ollama" or "stub" """
+    key = ("embedder", name)
+    if key not in _providers:
+        _providers[key] = _create("embedder", name)
+    return _providers[key]
+
+def get_generator(name: str) -> GenerationProvider:
+    """Shared generation provider by name: "openai", "ollama" or "stub" """
+    key = ("generator", name)
+    if key not in _providers:
+        _providers[key] = _create("generator", name)
+    return _providers[key]
+
+def set_provider(kind: str, name: str, provider):
+    """Replace a shared provider, e.g. a stub with custom latency in a benchmark"""
+    _providers[(kind, name)] = provider
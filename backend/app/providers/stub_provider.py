@@ -0,0 +1,131 @@
+"""
+Deterministic local providers for offline development and benchmarks
+
+``HashEmbedder`` maps text to vectors by feature hashing its words, so
+equal texts get equal vectors and texts sharing words are close, which
+is enough for search to behave sensibly. ``TemplateGenerator`` fills a
+fixed template with words from the prompt and streams it word by word.
+
+Both simulate provider behaviour with injected latency (a fixed base
+plus an exponential tail, so percentiles look like a real service) and
+a failure rate; failures raise ``ProviderError``.
+"""
+import asyncio
+import hashlib
+import math
+import random
+import re
+from collections import Counter
+from typing import AsyncIterator, List, Optional
+from app.core.config import settings
+from app.core.embedding_cache import normalize_text
+from app.providers.base import EmbeddingProvider, GenerationProvider, ProviderError
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+class FaultInjector:
+    """Latency and failure injection shared by the stub providers"""
+
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        failure_rate: float = 0.0,
+        seed: Optional[int] = None
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+
+    def delay(self) -> float:
+        """Seconds to wait for one simulated call"""
+        delay = self.latency_ms
+        if self.jitter_ms > 0:
+            delay += self._random.expovariate(1.0 / self.jitter_ms)
+        return delay / 1000.0
+
+    async def wait(self, operation: str, delay: Optional[float] = None):
+        delay = self.delay() if delay is None else delay
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.failure_rate > 0 and self._random.random() < self.failure_rate:
+            raise ProviderError(f"Injected {operation} failure")
+
+class HashEmbedder(EmbeddingProvider):
+    name = "stub"
+
+    def __init__(self, dim: Optional[int] = None, faults: Optional[FaultInjector] = None):
+        self.dim = dim or settings.stub_embedding_dim
+        self.model = f"hash-{self.dim}"
+        self.faults = faults or FaultInjector(
+            settings.stub_embed_latency_ms,
+            settings.stub_latency_jitter_ms,
+            settings.stub_embed_failure_rate,
+            settings.stub_seed
+        )
+
+    def embed(self, text: str) -> List[float]:
+        """Signed feature hashing of words, L2-normalised"""
+        vector = [0.0] * self.dim
+        words = _WORD.findall(normalize_text(text)) or [text]
+        for word in words:
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(value * value for value in vector))
+        if norm == 0:
+            return vector
+        return [value / norm for value in vector]
+
+    async def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        # One simulated request per batch, like the real providers
+        await self.faults.wait("embedding")
+        return [self.embed(text) for text in texts]
+
+class TemplateGenerator(GenerationProvider):
+    name = "stub"
+    model = "template"
+
+    TEMPLATE = (
+        "Thank you for writing about {topic}. Looking back at your recent entries, "
+        "you keep returning to {theme}. Try noting one small thing that went well today."
+    )
+
+    def __init__(
+        self,
+        faults: Optional[FaultInjector] = None,
+        token_latency_ms: Optional[float] = None
+    ):
+        self.faults = faults or FaultInjector(
+            settings.stub_generate_latency_ms,
+            settings.stub_latency_jitter_ms,
+            settings.stub_generate_failure_rate,
+            settings.stub_seed
+        )
+        self.token_latency_ms = (
+            settings.stub_token_latency_ms if token_latency_ms is None else token_latency_ms
+        )
+
+    def render(self, prompt: str, max_tokens: int) -> List[str]:
+        """Deterministic response for a prompt, as whitespace-separated tokens"""
+        words = [word for word in _WORD.findall(prompt.lower()) if len(word) > 3]
+        counts = Counter(words)
+        ranked = sorted(counts, key=lambda word: (-counts[word], word))
+        topic = ranked[0] if ranked else "your day"
+        theme = ranked[1] if len(ranked) > 1 else "this"
+        tokens = self.TEMPLATE.format(topic=topic, theme=theme).split(" ")
+        return tokens[:max_tokens]
+
+    async def generate(self, prompt, system=None, temperature=0.7, max_tokens=200) -> str:
+        tokens = self.render(prompt, max_tokens)
+        # Time to first token plus the time to "decode" the rest
+        await self.faults.wait("generation", self.faults.delay() + len(tokens) * self.token_latency_ms / 1000.0)
+        return " ".join(tokens)
+
+    async def stream(self, prompt, system=None, temperature=0.7, max_tokens=200) -> AsyncIterator[str]:
+        await self.faults.wait("generation")
+        for index, token in enumerate(self.render(prompt, max_tokens)):
+            if index and self.token_latency_ms > 0:
+                await asyncio.sleep(self.token_latency_ms / 1000.0)
+            yield token if index == 0 else " " + token
@@ -0,0 +1,2 @@
+# Repositories module
+
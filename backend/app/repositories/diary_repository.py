@@ -0,0 +1,208 @@
+import asyncio
+from datetime import datetime
+from functools import partial
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from firebase_admin import firestore
+from app.core.firebase import get_firestore_db, get_firestore_executor
+from app.core.request_cache import MISSING, get_cached, set_cached
+
+# Firestore rejects batches with more than 500 writes
+MAX_BATCH_WRITES = 500
+
+class DiaryRepository:
+    """
+    Async data access for the diaries collection
+
+    The firebase-admin client is synchronous, so every Firestore call is
+    run on a bounded thread pool instead of blocking the event loop;
+    concurrent requests then overlap their round-trips. Within an HTTP
+    request, documents read or written are kept in the request cache so
+    a handler never fetches the same diary twice.
+    """
+    def __init__(self, db=None, collection_name: str = "diaries"):
+        self._db = db
+        self.collection_name = collection_name
+
+    @property
+    def db(self):
+        return self._db if self._db is not None else get_firestore_db()
+
+    @property
+    def collection(self):
+        return self.db.collection(self.collection_name)
+
+    async def _run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_firestore_executor(), partial(fn, *args, **kwargs))
+
+    async def get(self, diary_id: str) -> Optional[dict]:
+        """Fetch one diary's data, or None if it does not exist"""
+        cached = get_cached(self.collection_name, diary_id)
+        if cached is not MISSING:
+            return cached
+
+        def _get():
+            doc = self.collection.document(diary_id).get()
+            return doc.to_dict() if doc.exists else None
+        data = await self._run(_get)
+        set_cached(self.collection_name, diary_id, data)
+        return data
+
+    async def get_many(self, diary_ids: Sequence[str]) -> Dict[str, dict]:
+        """Fetch several diaries in one batched read"""
+        if not diary_ids:
+            return {}
+
+        def _get_all():
+            refs = [self.collection.document(diary_id) for diary_id in diary_ids]
+            return {doc.id: doc.to_dict() for doc in self.db.get_all(refs) if doc.exists}
+        return await self._run(_get_all)
+
+    async def create(self, data: dict) -> str:
+        """Create a diary with an auto-generated ID and return the ID"""
+        def _create():
+            doc_ref = self.collection.document()
+            doc_ref.set(data)
+            return doc_ref.id
+        diary_id = await self._run(_create)
+        set_cached(self.collection_name, diary_id, data)
+        return diary_id
+
+    async def update(self, diary_id: str, data: dict):
+        await self._run(lambda: self.collection.document(diary_id).update(data))
+        cached = get_cached(self.collection_name, diary_id)
+        if isinstance(cached, dict):
+            set_cached(self.collection_name, diary_id, {**cached, **data})
+
+    async def delete(self, diary_id: str):
+        await self._run(lambda: self.collection.document(diary_id).delete())
+        set_cached(self.collection_name, diary_id, None)
+
+    async def _transaction(self, fn):
+        """Run fn(transaction) in a Firestore transaction (retried on contention)"""
+        return await self._run(lambda: firestore.transactional(fn)(self.db.transaction()))
+
+    async def update_if_owned(
+        self,
+        diary_id: str,
+        user_id: str,
+        changes: dict,
+        with_previous: bool = False
+    ) -> Union[None, dict, Tuple[dict, dict]]:
+        """
+        Apply changes only if the diary exists and belongs to user_id
+
+        The ownership check and the write share one transaction, so the
+        update is conditional on the document read. Returns the merged
+        data (or ``(previous, merged)`` with ``with_previous``), or None if
+        the diary is missing or owned by someone else.
+        """
+        def _update(transaction):
+            doc_ref = self.collection.document(diary_id)
+            doc = doc_ref.get(transaction=transaction)
+            if not doc.exists:
+                return None
+            data = doc.to_dict()
+            if data.get("userId") != user_id:
+                return None
+            transaction.update(doc_ref, changes)
+            return data, {**data, **changes}
+
+        result = await self._transaction(_update)
+        if result is None:
+            return None
+        previous, data = result
+        set_cached(self.collection_name, diary_id, data)
+        return (previous, data) if with_previous else data
+
+    async def delete_if_owned(self, diary_id: str, user_id: str) -> Optional[dict]:
+        """Delete the diary if it belongs to user_id; returns its last data or None"""
+        def _delete(transaction):
+            doc_ref = self.collection.document(diary_id)
+            doc = doc_ref.get(transaction=transaction)
+            if not doc.exists:
+                return None
+            data = doc.to_dict()
+            if data.get("userId") != user_id:
+                return None
+            transaction.delete(doc_ref)
+            return data
+
+        data = await self._transaction(_delete)
+        if data is not None:
+            set_cached(self.collection_name, diary_id, None)
+        return data
+
+    async def write_batch(self, writes: Sequence[Tuple[str, Optional[str], Optional[dict]]]) -> List[str]:
+        """
+        Apply ("set" | "update" | "delete", diary_id, data) writes in batches
+
+        A diary_id of None with "set" creates a new document. Returns the
+        document IDs in input order.
+        """
+        def _commit(chunk):
+            batch = self.db.batch()
+            ids = []
+            for op, diary_id, data in chunk:
+                doc_ref = self.collection.document(diary_id)
+                ids.append(doc_ref.id)
+                if op == "set":
+                    batch.set(doc_ref, data)
+                elif op == "update":
+                    batch.update(doc_ref, data)
+                elif op == "delete":
+                    batch.delete(doc_ref)
+                else:
+                    raise ValueError(f"Unknown write op: {op}")
+            batch.commit()
+            return ids
+
+        ids = []
+        for start in range(0, len(writes), MAX_BATCH_WRITES):
+            ids.extend(await self._run(_commit, writes[start:start + MAX_BATCH_WRITES]))
+        return ids
+
+    async def list_page(
+        self,
+        user_id: str,
+        limit: int,
+        cursor: Optional[Tuple[datetime, str]] = None,
+        fields: Optional[List[str]] = None
+    ) -> List[Tuple[str, dict]]:
+        """One keyset page of a user's diaries ordered by (createdAt, id) descending"""
+        def _list():
+            query = (
+                self.collection
+                .where("userId", "==", user_id)
+                .order_by("createdAt", direction="DESCENDING")
+                .order_by("__name__", direction="DESCENDING")
+            )
+            if cursor is not None:
+                created_at, diary_id = cursor
+                query = query.start_after({"createdAt": created_at, "__name__": diary_id})
+            if fields is not None:
+                query = query.select(fields)
+            return [(doc.id, doc.to_dict()) for doc in query.limit(limit).stream()]
+        return await self._run(_list)
+
+    async def scan_page(
+        self,
+        limit: int,
+        after: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> List[Tuple[str, dict]]:
+        """
+        One page of all diaries (or one user's) in document ID order
+
+        For bulk jobs: resuming after the last ID seen needs no other state
+        and never skips or repeats a document.
+        """
+        def _scan():
+            query = self.collection
+            if user_id is not None:
+                query = query.where("userId", "==", user_id)
+            query = query.order_by("__name__")
+            if after is not None:
+                query = query.start_after({"__name__": after})
+            return [(doc.id, doc.to_dict()) for doc in query.limit(limit).stream()]
+        return await self._run(_scan)
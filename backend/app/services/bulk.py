@@ -0,0 +1,432 @@
+"""
+Bulk import, export and re-indexing
+
+Usage:
+    python -m app.services.bulk import diaries.jsonl [--user UID] [--no-index]
+    python -m app.services.bulk export diaries.jsonl [--user UID]
+    python -m app.services.bulk reindex [--user UID] [--target all|openai|llama] [--force]
+
+Files are JSONL/NDJSON with one diary per line, e.g.
+``{"id": "...", "userId": "...", "title": "...", "content": "...",
+"createdAt": "2024-05-01T21:30:00"}`` ("-" reads stdin or writes stdout).
+Both directions stream record by record, so memory is bounded by
+``--batch-size`` rather than by the file.
+
+Indexing bypasses the indexing queue. A batch of diaries is split into
+passages, embedded in provider requests of ``--embed-batch-size`` texts
+with at most ``--concurrency`` requests in flight, and written with one
+vector store batch import. Stored passage fingerprints are honoured, so a
+re-run only embeds what changed (``--force`` re-embeds everything, e.g.
+after changing a model's configuration under the same name). ``reindex``
+rebuilds the index from Firestore, for instance into the collection of a
+newly configured embedding model.
+
+With ``--checkpoint PATH`` progress is saved after every batch and
+``--resume`` continues from it. Imported diaries keep their ``id`` or get
+one derived from their content, so a batch replayed after a crash
+overwrites instead of duplicating.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+from typing import AsyncIterator, BinaryIO, Dict, Iterator, List, Optional, Tuple
+from app.core.firebase import shutdown_firestore_executor
+from app.core.log import get_logger, log_event
+from app.core.ollama_client import close_ollama_session
+from app.core.openai_client import close_openai_client
+from app.core.vector_store import close_vector_store, get_vector_store
+from app.models.diary import DiaryCreate
+from app.repositories.diary_repository import DiaryRepository
+from app.services.diary_service import diary_snippet
+from app.services.llama_rag_service import LlamaRAGService
+from app.services.passage_index import index_diary_passages
+from app.services.rag_service import RAGService
+
+logger = get_logger("app.bulk")
+
+# Indexing-queue target names, as used by DiaryService
+TARGETS = ("openai", "llama")
+
+Page = List[Tuple[str, dict]]
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Not JSON serializable: {type(value).__name__}")
+
+class Checkpoint:
+    """Progress of one bulk job, rewritten atomically after every batch"""
+
+    def __init__(self, path: Optional[str], job: dict):
+        self.path = path
+        # Identifies the job, so a checkpoint is never resumed by another one
+        self.job = job
+
+    def load(self) -> dict:
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        with open(self.path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("job") != self.job:
+            raise ValueError(f"Checkpoint {self.path} belongs to another job: {data.get('job')}")
+        return data.get("state") or {}
+
+    def save(self, state: dict):
+        if not self.path:
+            return
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"job": self.job, "state": state, "savedAt": time.time()}, f)
+        os.replace(self.path + ".tmp", self.path)
+
+class Progress:
+    """Counters of the running job, printed to stderr every ``interval`` seconds"""
+
+    def __init__(self, command: str, interval: float = 5.0):
+        self.command = command
+        self.interval = interval
+        self.counts: Dict[str, int] = {}
+        self.started = time.monotonic()
+        self._reported = self.started
+
+    def add(self, **counts: int):
+        for name, count in counts.items():
+            self.counts[name] = self.counts.get(name, 0) + count
+        now = time.monotonic()
+        if now - self._reported >= self.interval:
+            self._reported = now
+            fields = " ".join(f"{name}={count}" for name, count in self.counts.items())
+            print(f"{self.command}: {fields} ({now - self.started:.0f}s)", file=sys.stderr)
+
+    def report(self) -> dict:
+        elapsed = time.monotonic() - self.started
+        return {
+            "command": self.command,
+            "elapsedSeconds": round(elapsed, 2),
+            "counts": dict(self.counts),
+            "perSecond": {
+                name: round(count / elapsed, 1) if elapsed > 0 else 0.0
+                for name, count in self.counts.items()
+            },
+        }
+
+class PassageIndexer:
+    """Writes batches of diaries into one target's vector collection"""
+
+    def __init__(
+        self,
+        target: str,
+        embed_batch_size: int = 64,
+        concurrency: int = 4,
+        force: bool = False,
+        attempts: int = 3
+    ):
+        self.target = target
+        self.service = RAGService() if target == "openai" else LlamaRAGService()
+        self.embed_batch_size = max(1, embed_batch_size)
+        self.concurrency = max(1, concurrency)
+        self.force = force
+        self.attempts = attempts
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def _call(self, fn, *args, **kwargs):
+        """Run a blocking vector store call within the concurrency limit"""
+        async with self._slots:
+            return await self.service.vector_store.run(fn, *args, **kwargs)
+
+    async def _embed(self, texts: List[str]) -> List[List[float]]:
+        async with self._slots:
+            for attempt in range(1, self.attempts + 1):
+                try:
+                    return await self.service._embed_batch(texts)
+                except Exception as e:
+                    if attempt == self.attempts:
+                        raise
+                    log_event(
+                        logger, logging.WARNING, "bulk_embed_retry",
+                        target=self.target, attempt=attempt, error=str(e)
+                    )
+                    await asyncio.sleep(2 ** (attempt - 1))
+
+    async def _embed_all(self, texts: List[str]) -> List[List[float]]:
+        batches = await asyncio.gather(*(
+            self._embed(texts[start:start + self.embed_batch_size])
+            for start in range(0, len(texts), self.embed_batch_size)
+        ))
+        return [vector for batch in batches for vector in batch]
+
+    async def index(self, diaries: Page) -> Dict[str, int]:
+        """Index a page of ``(diary_id, data)``; returns passage counts"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        service = self.service
+        embedded, unchanged = await index_diary_passages(
+            service.vector_store, service.embedder, service.weaviate_class, "bulk", diaries, self._embed_all,
+            reuse_stored=not self.force, trim=True, run=self._call
+        )
+        return {
+            f"{self.target}_passages_embedded": embedded,
+            f"{self.target}_passages_unchanged": unchanged,
+        }
+
+async def index_page(indexers: List[PassageIndexer], page: Page, progress: Progress):
+    """Index one page into every target concurrently (different providers)"""
+    for counts in await asyncio.gather(*(indexer.index(page) for indexer in indexers)):
+        progress.add(**counts)
+    if indexers:
+        # The local store writes in the background; a checkpoint must not
+        # record a page before its vectors are on disk
+        await asyncio.to_thread(get_vector_store().flush)
+
+async def iter_pages(
+    repository: DiaryRepository,
+    batch_size: int,
+    after: Optional[str] = None,
+    user_id: Optional[str] = None
+) -> AsyncIterator[Page]:
+    """Firestore pages in document ID order; the next page is fetched while the caller works"""
+    pending = asyncio.ensure_future(repository.scan_page(batch_size, after, user_id))
+    while True:
+        page = await pending
+        if len(page) < batch_size:
+            if page:
+                yield page
+            return
+        pending = asyncio.ensure_future(repository.scan_page(batch_size, page[-1][0], user_id))
+        try:
+            yield page
+        except BaseException:
+            pending.cancel()
+            raise
+
+def read_jsonl(path: str, skip: int = 0) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """Stream ``(line number, record, error)`` for each non-blank line after the first ``skip``"""
+    stream = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        for number, line in enumerate(stream, 1):
+            if number <= skip or not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield number, None, f"invalid JSON: {e}"
+                continue
+            if not isinstance(record, dict):
+                yield number, None, "not a JSON object"
+                continue
+            yield number, record, None
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+def _parse_time(value) -> Optional[datetime]:
+    if value in (None, ""):
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.utcfromtimestamp(value)
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+
+def imported_diary_id(user_id: str, record: dict) -> str:
+    """Stable ID for a record without one, so replaying an import overwrites it"""
+    key = json.dumps(
+        [user_id, record.get("createdAt"), record.get("title"), record.get("content")],
+        ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:20]
+
+def diary_from_record(record: dict, user_id: Optional[str] = None) -> Tuple[str, dict]:
+    """Validate an import record and turn it into a Firestore document"""
+    owner = user_id or record.get("userId")
+    if not owner:
+        raise ValueError("missing userId (or pass --user)")
+    # Same validation as the create endpoint
+    diary = DiaryCreate(title=record.get("title"), content=record.get("content"))
+    created_at = _parse_time(record.get("createdAt")) or datetime.utcnow()
+    data = {
+        "userId": owner,
+        "title": diary.title,
+        "content": diary.content,
+        "snippet": diary_snippet(diary.content),
+        "createdAt": created_at,
+        "updatedAt": _parse_time(record.get("updatedAt")) or created_at,
+        "aiInsight": record.get("aiInsight"),
+    }
+    return str(record.get("id") or imported_diary_id(owner, record)), data
+
+async def run_import(
+    source: str,
+    repository: DiaryRepository,
+    indexers: List[PassageIndexer],
+    checkpoint: Checkpoint,
+    progress: Progress,
+    batch_size: int,
+    user_id: Optional[str] = None,
+    resume: bool = False
+):
+    state = checkpoint.load() if resume else {}
+    position = state.get("lines", 0)
+    batch: Dict[str, dict] = {}
+
+    async def flush():
+        page = list(batch.items())
+        await repository.write_batch([("set", diary_id, data) for diary_id, data in page])
+        progress.add(diaries=len(page))
+        await index_page(indexers, page, progress)
+        batch.clear()
+        checkpoint.save({"lines": position})
+
+    for number, record, error in read_jsonl(source, skip=position):
+        if error is None:
+            try:
+                diary_id, data = diary_from_record(record, user_id)
+                batch[diary_id] = data
+            except ValueError as e:
+                error = str(e).splitlines()[0]
+        if error is not None:
+            progress.add(invalid=1)
+            log_event(logger, logging.WARNING, "bulk_import_invalid", line=number, error=error)
+        position = number
+        if len(batch) >= batch_size:
+            await flush()
+    if batch:
+        await flush()
+    checkpoint.save({"lines": position})
+
+def _open_output(output: str, offset: Optional[int]) -> BinaryIO:
+    if output == "-":
+        if offset is not None:
+            raise ValueError("cannot resume an export to stdout")
+        return sys.stdout.buffer
+    if offset is None:
+        return open(output, "wb")
+    # Drop anything written after the last checkpoint
+    out = open(output, "r+b")
+    out.seek(offset)
+    out.truncate()
+    return out
+
+async def run_export(
+    output: str,
+    repository: DiaryRepository,
+    checkpoint: Checkpoint,
+    progress: Progress,
+    batch_size: int,
+    user_id: Optional[str] = None,
+    resume: bool = False
+):
+    state = checkpoint.load() if resume else {}
+    out = _open_output(output, state.get("offset"))
+    try:
+        async for page in iter_pages(repository, batch_size, state.get("after"), user_id):
+            for diary_id, data in page:
+                line = json.dumps({"id": diary_id, **data}, ensure_ascii=False, default=_json_default)
+                out.write(line.encode("utf-8") + b"\n")
+            out.flush()
+            progress.add(diaries=len(page))
+            if output != "-":
+                checkpoint.save({"after": page[-1][0], "offset": out.tell()})
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+
+async def run_reindex(
+    repository: DiaryRepository,
+    indexers: List[PassageIndexer],
+    checkpoint: Checkpoint,
+    progress: Progress,
+    batch_size: int,
+    user_id: Optional[str] = None,
+    resume: bool = False
+):
+    state = checkpoint.load() if resume else {}
+    async for page in iter_pages(repository, batch_size, state.get("after"), user_id):
+        progress.add(diaries=len(page))
+        await index_page(indexers, page, progress)
+        checkpoint.save({"after": page[-1][0]})
+
+async def run(args) -> dict:
+    repository = DiaryRepository()
+    progress = Progress(args.command)
+    job = {"command": args.command, "user": args.user}
+    indexers = []
+    if args.command in ("import", "reindex") and not getattr(args, "no_index", False):
+        targets = TARGETS if args.target == "all" else (args.target,)
+        job["targets"] = list(targets)
+        indexers = [
+            PassageIndexer(target, args.embed_batch_size, args.concurrency, force=args.force)
+            for target in targets
+        ]
+
+    try:
+        if args.command == "import":
+            job["source"] = os.path.abspath(args.source) if args.source != "-" else "-"
+            await run_import(
+                args.source, repository, indexers, Checkpoint(args.checkpoint, job),
+                progress, args.batch_size, args.user, args.resume
+            )
+        elif args.command == "export":
+            job["output"] = os.path.abspath(args.output) if args.output != "-" else "-"
+            await run_export(
+                args.output, repository, Checkpoint(args.checkpoint, job),
+                progress, args.batch_size, args.user, args.resume
+            )
+        else:
+            await run_reindex(
+                repository, indexers, Checkpoint(args.checkpoint, job),
+                progress, args.batch_size, args.user, args.resume
+            )
+    finally:
+        await close_ollama_session()
+        await close_openai_client()
+        # Writes the local vector store to disk
+        close_vector_store()
+        shutdown_firestore_executor()
+    return progress.report()
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import/export diaries and rebuild the vector index")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--user", default=None, help="only this user's diaries (import: owner of every record)")
+    common.add_argument("--batch-size", type=int, default=100, help="diaries per Firestore/vector store batch")
+    common.add_argument("--checkpoint", default=None, help="file to save progress to after every batch")
+    common.add_argument("--resume", action="store_true", help="continue from --checkpoint")
+
+    indexing = argparse.ArgumentParser(add_help=False)
+    indexing.add_argument("--target", choices=["all", *TARGETS], default="all", help="vector index to write")
+    indexing.add_argument("--embed-batch-size", type=int, default=64, help="texts per embedding request")
+    indexing.add_argument("--concurrency", type=int, default=4, help="embedding/vector store requests in flight per target")
+    indexing.add_argument("--force", action="store_true", help="re-embed passages even if unchanged")
+
+    import_parser = commands.add_parser("import", parents=[common, indexing], help="load diaries from JSONL")
+    import_parser.add_argument("source", help="JSONL file, or - for stdin")
+    import_parser.add_argument("--no-index", action="store_true", help="only write Firestore")
+    export_parser = commands.add_parser("export", parents=[common], help="write diaries to JSONL")
+    export_parser.add_argument("output", help="JSONL file, or - for stdout")
+    commands.add_parser("reindex", parents=[common, indexing], help="rebuild the vector index from Firestore")
+
+    args = parser.parse_args()
+    if args.resume and not args.checkpoint:
+        parser.error("--resume needs --checkpoint")
+
+    # Keep stdout clean when it carries the export
+    out = sys.stdout
+    if getattr(args, "output", None) == "-":
+        out = sys.stderr
+        for handler in logging.getLogger("app").handlers:
+            if isinstance(handler, logging.StreamHandler):
+                handler.setStream(sys.stderr)
+
+    report = asyncio.run(run(args))
+    print(f"{report['command']}: {report['elapsedSeconds']}s", file=out)
+    for name, count in report["counts"].items():
+        print(f"  {name}={count} ({report['perSecond'][name]}/s)", file=out)
+
+if __name__ == "__main__":
+    main()
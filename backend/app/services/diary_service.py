@@ -1,50 +1,100 @@
+import base64
+import json
 from datetime import datetime
-from typing import List, Optional
-from app.models.diary import DiaryCreate, DiaryUpdate, DiaryResponse
-from app.core.firebase import get_firestore_db
+from typing import AsyncIterator, List, Optional, Tuple, Union
+from app.models.diary import DiaryCreate, DiaryUpdate, DiaryResponse, DiarySummary
+from app.repositories.diary_repository import DiaryRepository
 from app.services.rag_service import RAGService
 from app.services.llama_rag_service import LlamaRAGService
+from app.services.indexing_queue import get_indexing_queue
+from app.core.response_cache import get_response_cache
+from app.core.embedding_cache import text_fingerprint
+
+SNIPPET_LENGTH = 160
+
+def encode_cursor(created_at: datetime, diary_id: str) -> str:
+    """Opaque keyset cursor for (createdAt, id)"""
+    raw = json.dumps({"c": created_at.isoformat(), "id": diary_id}).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Inverse of encode_cursor; raises ValueError for malformed cursors"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        return datetime.fromisoformat(data["c"]), data["id"]
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def diary_snippet(content: str) -> str:
+    """Whitespace-collapsed start of the content, stored for list views"""
+    return " ".join((content or "").split())[:SNIPPET_LENGTH]
+
+def indexed_text_fingerprint(data: dict) -> str:
+    """Fingerprint of the text a diary is indexed from (title and content)"""
+    return text_fingerprint(f"{data.get('title') or ''}\n\n{data.get('content') or ''}")
 
 class DiaryService:
     def __init__(self):
-        self.db = get_firestore_db()
-        self.collection_name = "diaries"
+        self.repository = DiaryRepository()
         self.rag_service = RAGService()
         self.llama_rag_service = LlamaRAGService()  # 添加 Llama RAG 服务
 
-    async def get_all_diaries(self, user_id: str) -> List[DiaryResponse]:
-        """Get all diaries for a user"""
-        diaries_ref = self.db.collection(self.collection_name)
-        query = diaries_ref.where("userId", "==", user_id).order_by("createdAt", direction="DESCENDING")
+    async def list_diaries(
+        self,
+        user_id: str,
+        limit: int,
+        cursor: Optional[Tuple[datetime, str]] = None,
+        view: str = "full"
+    ) -> Tuple[List[Union[DiaryResponse, DiarySummary]], Optional[str]]:
+        """
+        One page of a user's diaries, newest first, and the next page's cursor
+
+        Uses keyset pagination on (createdAt, id) and fetches ``limit + 1``
+        documents so it can tell whether another page exists. Memory is
+        bounded by the page size rather than the user's history. The summary
+        view reads only the stored snippet, never the full content.
+        """
+        fields = ["title", "snippet", "createdAt", "updatedAt", "aiInsight"] if view == "summary" else None
+        docs = await self.repository.list_page(user_id, limit + 1, cursor, fields)
         
-        docs = query.stream()
-        diaries = []
+        if view == "summary":
+            # Diaries written before snippets were stored: read their content once
+            missing = [doc_id for doc_id, data in docs[:limit] if "snippet" not in data]
+            contents = await self.repository.get_many(missing)
         
-        for doc in docs:
-            data = doc.to_dict()
-            diaries.append(DiaryResponse(
-                id=doc.id,
-                **data
-            ))
+        items = []
+        for doc_id, data in docs[:limit]:
+            if view == "summary":
+                snippet = data.get("snippet")
+                if snippet is None:
+                    snippet = diary_snippet(contents.get(doc_id, {}).get("content", ""))
+                item = DiarySummary(
+                    id=doc_id,
+                    title=data.get("title", ""),
+                    snippet=snippet,
+                    createdAt=data["createdAt"],
+                    updatedAt=data["updatedAt"],
+                    aiInsight=data.get("aiInsight")
+                )
+            else:
+                item = DiaryResponse(id=doc_id, **data)
+            items.append(item)
         
-        return diaries
+        # The extra document only tells us another page exists
+        next_cursor = encode_cursor(items[-1].createdAt, items[-1].id) if len(docs) > limit else None
+        return items, next_cursor
 
     async def get_diary(self, diary_id: str, user_id: str) -> Optional[DiaryResponse]:
         """Get a specific diary"""
-        doc_ref = self.db.collection(self.collection_name).document(diary_id)
-        doc = doc_ref.get()
-        
-        if not doc.exists:
-            return None
-        
-        data = doc.to_dict()
+        data = await self.repository.get(diary_id)
         
         # Verify ownership
-        if data.get("userId") != user_id:
+        if data is None or data.get("userId") != user_id:
             return None
         
         return DiaryResponse(
-            id=doc.id,
+            id=diary_id,
             **data
         )
 
@@ -56,36 +106,29 @@ class DiaryService:
             "userId": user_id,
             "title": diary.title,
             "content": diary.content,
+            "snippet": diary_snippet(diary.content),
             "createdAt": now,
             "updatedAt": now,
             "aiInsight": None
         }
         
         # Add to Firestore
-        doc_ref = self.db.collection(self.collection_name).document()
-        doc_ref.set(diary_data)
-        
-        # Index in Weaviate for both RAG systems
-        # 1. OpenAI RAG (使用 OpenAI embeddings)
-        await self.rag_service.index_diary(
-            diary_id=doc_ref.id,
-            user_id=user_id,
-            title=diary.title,
-            content=diary.content,
-            created_at=now.isoformat()
-        )
+        diary_id = await self.repository.create(diary_data)
         
-        # 2. Llama RAG (使用 Ollama embeddings)
-        await self.llama_rag_service.index_diary(
-            diary_id=doc_ref.id,
-            user_id=user_id,
-            title=diary.title,
-            content=diary.content,
-            created_at=now.isoformat()
-        )
+        # Queue indexing in Weaviate for both RAG systems; the response does not
+        # wait for embeddings (1. OpenAI RAG, 2. Llama RAG 使用 Ollama embeddings)
+        payload = {
+            "title": diary.title,
+            "content": diary.content,
+            "created_at": now.isoformat()
+        }
+        queue = get_indexing_queue()
+        await queue.enqueue("openai", "index", diary_id, user_id, payload)
+        await queue.enqueue("llama", "index", diary_id, user_id, payload)
+        get_response_cache().invalidate_user(user_id)
         
         return DiaryResponse(
-            id=doc_ref.id,
+            id=diary_id,
             **diary_data
         )
 
@@ -96,18 +139,6 @@ class DiaryService:
         user_id: str
     ) -> Optional[DiaryResponse]:
         """Update an existing diary"""
-        doc_ref = self.db.collection(self.collection_name).document(diary_id)
-        doc = doc_ref.get()
-        
-        if not doc.exists:
-            return None
-        
-        data = doc.to_dict()
-        
-        # Verify ownership
-        if data.get("userId") != user_id:
-            return None
-        
         # Update fields
         update_data = {"updatedAt": datetime.utcnow()}
         
@@ -115,55 +146,55 @@ class DiaryService:
             update_data["title"] = diary.title
         if diary.content is not None:
             update_data["content"] = diary.content
+            update_data["snippet"] = diary_snippet(diary.content)
         
-        doc_ref.update(update_data)
+        # Ownership check and write in one transaction; the merged document is
+        # returned, so no second read is needed for the response
+        result = await self.repository.update_if_owned(diary_id, user_id, update_data, with_previous=True)
         
-        # Update in Weaviate if content changed
-        if diary.content is not None or diary.title is not None:
-            updated_title = diary.title if diary.title is not None else data.get("title")
-            updated_content = diary.content if diary.content is not None else data.get("content")
-            
-            await self.rag_service.update_diary(
-                diary_id=diary_id,
-                user_id=user_id,
-                title=updated_title,
-                content=updated_content
-            )
+        if result is None:
+            return None
+        previous, data = result
         
-        # Get updated document
-        updated_doc = doc_ref.get()
-        updated_data = updated_doc.to_dict()
+        # Queue a Weaviate update only if the indexed text changed; autosaves
+        # that repeat the same title and content cost no embedding calls
+        if indexed_text_fingerprint(data) != indexed_text_fingerprint(previous):
+            created_at = data.get("createdAt")
+            
+            payload = {
+                "title": data.get("title"),
+                "content": data.get("content"),
+                "created_at": created_at.isoformat() if hasattr(created_at, "isoformat") else created_at
+            }
+            queue = get_indexing_queue()
+            await queue.enqueue("openai", "update", diary_id, user_id, payload)
+            await queue.enqueue("llama", "update", diary_id, user_id, payload)
+            get_response_cache().invalidate_user(user_id)
         
         return DiaryResponse(
             id=diary_id,
-            **updated_data
+            **data
         )
 
     async def delete_diary(self, diary_id: str, user_id: str) -> bool:
         """Delete a diary"""
-        doc_ref = self.db.collection(self.collection_name).document(diary_id)
-        doc = doc_ref.get()
+        # Verify ownership and delete from Firestore in one transaction
+        data = await self.repository.delete_if_owned(diary_id, user_id)
         
-        if not doc.exists:
+        if data is None:
             return False
         
-        data = doc.to_dict()
-        
-        # Verify ownership
-        if data.get("userId") != user_id:
-            return False
-        
-        # Delete from Firestore
-        doc_ref.delete()
-        
-        # Delete from Weaviate
-        await self.rag_service.delete_diary(diary_id)
+        # Queue deletion from Weaviate
+        queue = get_indexing_queue()
+        await queue.enqueue("openai", "delete", diary_id, user_id)
+        await queue.enqueue("llama", "delete", diary_id, user_id)
+        get_response_cache().invalidate_user(user_id)
         
         return True
 
     async def generate_ai_insight(self, diary_id: str, user_id: str) -> str:
         """Generate AI insight for a diary using RAG"""
-        # Get the current diary
+        # Get the current diary (served from the request cache if already read)
         diary = await self.get_diary(diary_id, user_id)
         
         if not diary:
@@ -175,12 +206,83 @@ class DiaryService:
             user_id=user_id
         )
         
-        # Update diary with the insight
-        doc_ref = self.db.collection(self.collection_name).document(diary_id)
-        doc_ref.update({
+        # Save the insight only if the diary still exists and is the user's;
+        # the check and the write are one transaction
+        saved = await self.repository.update_if_owned(diary_id, user_id, {
             "aiInsight": insight,
             "updatedAt": datetime.utcnow()
         })
+        if saved is None:
+            raise ValueError("Diary not found")
         
         return insight
 
+    async def stream_ai_insight(self, diary: DiaryResponse, user_id: str) -> AsyncIterator[str]:
+        """Stream an AI insight and persist the full text once generation completes"""
+        parts = []
+        async for token in self.rag_service.stream_insight(current_diary=diary, user_id=user_id):
+            parts.append(token)
+            yield token
+        
+        # Only reached when the stream ran to completion (not on client disconnect);
+        # a diary deleted mid-stream is simply not updated
+        insight = "".join(parts).strip()
+        await self.repository.update_if_owned(diary.id, user_id, {
+            "aiInsight": insight,
+            "updatedAt": datetime.utcnow()
+        })
+
+    async def get_indexing_status(self, diary_id: str, user_id: str) -> Optional[dict]:
+        """Report background indexing state for a diary"""
+        diary = await self.get_diary(diary_id, user_id)
+        
+        if not diary:
+            return None
+        
+        targets = await get_indexing_queue().diary_status(diary_id)
+        states = {t["state"] for t in targets.values()}
+        
+        if "dead" in states:
+            state = "failed"
+        elif states & {"pending", "running"}:
+            state = "pending"
+        elif states:
+            state = "indexed"
+        else:
+            state = "unknown"
+        
+        return {
+            "diaryId": diary_id,
+            "state": state,
+            "targets": targets
+        }
+
+    async def process_index_job(self, job: dict):
+        """Apply one queued vector-index job (called by the indexing workers)"""
+        payload = job["payload"]
+        rag = self.rag_service if job["target"] == "openai" else self.llama_rag_service
+        
+        if job["op"] == "index":
+            await rag.index_diary(
+                diary_id=job["diary_id"],
+                user_id=job["user_id"],
+                title=payload["title"],
+                content=payload["content"],
+                created_at=payload["created_at"]
+            )
+        elif job["op"] == "update":
+            await rag.update_diary(
+                diary_id=job["diary_id"],
+                user_id=job["user_id"],
+                title=payload["title"],
+                content=payload["content"],
+                created_at=payload["created_at"]
+            )
+        elif job["op"] == "delete":
+            await rag.delete_diary(job["diary_id"])
+        else:
+            raise ValueError(f"Unknown indexing op: {job['op']}")
+        
+        # Retrieval results change once the index catches up; drop responses
+        # cached while the job was still pending
+        get_response_cache().invalidate_user(job["user_id"])
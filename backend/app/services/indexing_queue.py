@@ -0,0 +1,329 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Awaitable, Callable, Dict, List, Optional
+from app.core.config import settings
+from app.core.log import get_logger, log_event
+
+logger = get_logger("app.indexing")
+
+JobHandler = Callable[[dict], Awaitable[None]]
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+DEAD = "dead"
+
+class IndexingQueue:
+    """
+    Durable background indexing pipeline
+
+    Vector-index work is written to a local SQLite outbox and processed by
+    a pool of asyncio workers, so API writes return as soon as Firestore
+    commits. Each job targets one index (e.g. "openai" or "llama") for one
+    diary; a newer job for the same (target, diary) supersedes a pending
+    older one. Failed jobs are retried with exponential backoff and moved
+    to the dead-letter state after ``max_attempts``.
+
+    SQLite calls block, so every statement issued from the event loop runs
+    on a single-thread executor owned by the queue. That thread is also the
+    only one touching the connection, so statements never interleave.
+    """
+    def __init__(
+        self,
+        path: str,
+        workers: int = 4,
+        max_attempts: int = 6,
+        backoff_base: float = 1.0,
+        backoff_max: float = 300.0,
+        poll_interval: float = 1.0
+    ):
+        self.path = path
+        self.workers = max(1, workers)
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.poll_interval = poll_interval
+        self._conn = self._connect(path)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="indexing-queue")
+        self._handler: Optional[JobHandler] = None
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._claim_lock: Optional[asyncio.Lock] = None
+        self._active_keys = set()
+        self.completed = 0
+        self.failed_attempts = 0
+        self._recent_lag: List[float] = []
+
+    @staticmethod
+    def _connect(path: str) -> sqlite3.Connection:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS index_jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " target TEXT NOT NULL,"
+            " op TEXT NOT NULL,"
+            " diary_id TEXT NOT NULL,"
+            " user_id TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " next_attempt_at REAL NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " last_error TEXT)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_index_jobs_due ON index_jobs (status, next_attempt_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_index_jobs_diary ON index_jobs (diary_id, target)")
+        return conn
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(fn, *args))
+
+    async def enqueue(self, target: str, op: str, diary_id: str, user_id: str, payload: Optional[dict] = None) -> int:
+        """Persist a job; any older pending job for the same (target, diary) is dropped"""
+        job_id = await self._run(self.enqueue_sync, target, op, diary_id, user_id, payload)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    def enqueue_sync(self, target: str, op: str, diary_id: str, user_id: str, payload: Optional[dict] = None) -> int:
+        """Blocking ``enqueue`` for tools that run without an event loop"""
+        now = time.time()
+        with self._conn:
+            superseded = self._conn.execute(
+                "SELECT op FROM index_jobs WHERE target = ? AND diary_id = ? AND status = ?",
+                (target, diary_id, PENDING)
+            ).fetchall()
+            # An update replacing a not-yet-run index job must still create the object
+            if op == "update" and any(row["op"] == "index" for row in superseded):
+                op = "index"
+            self._conn.execute(
+                "DELETE FROM index_jobs WHERE target = ? AND diary_id = ? AND status IN (?, ?)",
+                (target, diary_id, PENDING, DONE)
+            )
+            cursor = self._conn.execute(
+                "INSERT INTO index_jobs (target, op, diary_id, user_id, payload, status, attempts,"
+                " next_attempt_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?, ?)",
+                (target, op, diary_id, user_id, json.dumps(payload or {}), PENDING, now, now, now)
+            )
+        return cursor.lastrowid
+
+    async def start(self, handler: JobHandler):
+        """Start the worker pool; jobs left running by a previous process are retried"""
+        self._handler = handler
+        self._wakeup = asyncio.Event()
+        self._claim_lock = asyncio.Lock()
+        await self._run(
+            self._conn.execute,
+            "UPDATE index_jobs SET status = ? WHERE status = ?",
+            (PENDING, RUNNING)
+        )
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _claim(self) -> Optional[dict]:
+        async with self._claim_lock:
+            # The active keys are read on the executor thread but only changed
+            # here, under the claim lock
+            job = await self._run(self._claim_sync, frozenset(self._active_keys))
+            if job is not None:
+                self._active_keys.add((job["target"], job["diary_id"]))
+            return job
+
+    def _claim_sync(self, active_keys: frozenset) -> Optional[dict]:
+        rows = self._conn.execute(
+            "SELECT * FROM index_jobs WHERE status = ? AND next_attempt_at <= ?"
+            " ORDER BY id LIMIT ?",
+            (PENDING, time.time(), self.workers * 4)
+        ).fetchall()
+        for row in rows:
+            # Never run two jobs for the same diary and index concurrently
+            if (row["target"], row["diary_id"]) in active_keys:
+                continue
+            self._conn.execute(
+                "UPDATE index_jobs SET status = ?, updated_at = ? WHERE id = ?",
+                (RUNNING, time.time(), row["id"])
+            )
+            job = dict(row)
+            job["payload"] = json.loads(job["payload"])
+            return job
+        return None
+
+    async def _worker(self):
+        while True:
+            job = await self._claim()
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._handler(job)
+            except asyncio.CancelledError:
+                await self._run(self._release, job)
+                raise
+            except Exception as e:
+                await self._run(self._fail, job, e)
+            else:
+                await self._run(self._complete, job)
+            finally:
+                self._active_keys.discard((job["target"], job["diary_id"]))
+
+    def _release(self, job: dict):
+        self._conn.execute(
+            "UPDATE index_jobs SET status = ? WHERE id = ? AND status = ?",
+            (PENDING, job["id"], RUNNING)
+        )
+
+    def _complete(self, job: dict):
+        now = time.time()
+        self._conn.execute(
+            "UPDATE index_jobs SET status = ?, attempts = attempts + 1, updated_at = ?, last_error = NULL"
+            " WHERE id = ?",
+            (DONE, now, job["id"])
+        )
+        self.completed += 1
+        self._recent_lag = (self._recent_lag + [now - job["created_at"]])[-256:]
+
+    def _fail(self, job: dict, error: Exception):
+        attempts = job["attempts"] + 1
+        self.failed_attempts += 1
+        now = time.time()
+        if attempts >= self.max_attempts:
+            status, next_attempt_at = DEAD, now
+            log_event(
+                logger, logging.ERROR, "job_dead_lettered",
+                job_id=job["id"], target=job["target"], op=job["op"], diary_id=job["diary_id"], error=str(error)
+            )
+        else:
+            delay = min(self.backoff_max, self.backoff_base * (2 ** (attempts - 1)))
+            status, next_attempt_at = PENDING, now + delay * random.uniform(0.5, 1.0)
+        self._conn.execute(
+            "UPDATE index_jobs SET status = ?, attempts = ?, next_attempt_at = ?, updated_at = ?, last_error = ?"
+            " WHERE id = ?",
+            (status, attempts, next_attempt_at, now, f"{type(error).__name__}: {error}", job["id"])
+        )
+
+    async def replay_completed(self, since: float) -> int:
+        """
+        Run jobs completed at or after ``since`` again
+
+        For a vector store that persists in the background: their writes
+        may have been lost with the process. Jobs are idempotent, so a
+        replayed job whose write did survive only rewrites it.
+        """
+        cursor = await self._run(
+            self._conn.execute,
+            "UPDATE index_jobs SET status = ?, next_attempt_at = ? WHERE status = ? AND updated_at >= ?",
+            (PENDING, time.time(), DONE, since)
+        )
+        if cursor.rowcount:
+            log_event(logger, logging.WARNING, "jobs_replayed", count=cursor.rowcount, since=since)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return cursor.rowcount
+
+    async def retry_dead(self) -> int:
+        """Move dead-lettered jobs back to the pending state"""
+        cursor = await self._run(
+            self._conn.execute,
+            "UPDATE index_jobs SET status = ?, attempts = 0, next_attempt_at = ? WHERE status = ?",
+            (PENDING, time.time(), DEAD)
+        )
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return cursor.rowcount
+
+    async def diary_status(self, diary_id: str) -> Dict[str, dict]:
+        """Latest job state per index target for one diary"""
+        def _rows():
+            return self._conn.execute(
+                "SELECT * FROM index_jobs WHERE diary_id = ? ORDER BY id",
+                (diary_id,)
+            ).fetchall()
+        rows = await self._run(_rows)
+        targets = {}
+        for row in rows:
+            targets[row["target"]] = {
+                "op": row["op"],
+                "state": row["status"],
+                "attempts": row["attempts"],
+                "lastError": row["last_error"],
+                "updatedAt": row["updated_at"]
+            }
+        return targets
+
+    async def stats(self) -> dict:
+        def _counts():
+            counts = {PENDING: 0, RUNNING: 0, DONE: 0, DEAD: 0}
+            for row in self._conn.execute("SELECT status, COUNT(*) AS n FROM index_jobs GROUP BY status"):
+                counts[row["status"]] = row["n"]
+            oldest = self._conn.execute(
+                "SELECT MIN(created_at) FROM index_jobs WHERE status IN (?, ?)",
+                (PENDING, RUNNING)
+            ).fetchone()[0]
+            return counts, oldest
+        counts, oldest = await self._run(_counts)
+        return {
+            "depth": counts[PENDING] + counts[RUNNING],
+            "pending": counts[PENDING],
+            "running": counts[RUNNING],
+            "dead": counts[DEAD],
+            "completed": self.completed,
+            "failed_attempts": self.failed_attempts,
+            "workers": len(self._tasks),
+            "lag_seconds": round(time.time() - oldest, 3) if oldest else 0.0,
+            "avg_completion_seconds": round(sum(self._recent_lag) / len(self._recent_lag), 3) if self._recent_lag else 0.0
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._conn.close()
+
+_queue: Optional[IndexingQueue] = None
+
+def get_indexing_queue() -> IndexingQueue:
+    """Get or create the process-wide indexing queue"""
+    global _queue
+    if _queue is None:
+        _queue = IndexingQueue(
+            settings.indexing_queue_path,
+            workers=settings.indexing_workers,
+            max_attempts=settings.indexing_max_attempts,
+            backoff_base=settings.indexing_backoff_base_seconds,
+            backoff_max=settings.indexing_backoff_max_seconds,
+            poll_interval=settings.indexing_poll_interval_seconds
+        )
+    return _queue
+
+async def start_indexing_queue(handler: JobHandler):
+    await get_indexing_queue().start(handler)
+
+async def close_indexing_queue():
+    global _queue
+    if _queue is not None:
+        await _queue.stop()
+        _queue.close()
+    _queue = None
@@ -1,8 +1,27 @@
-from typing import List
+import asyncio
+import logging
+from typing import AsyncIterator, List, Optional, Tuple
 import httpx
+from app.core.admission import Ticket, get_generation_admission
 from app.core.config import settings
+from app.core.embedding_cache import get_embedding_cache
+from app.core.embedding_batcher import get_embedding_batcher
 from app.core.firebase import get_firestore_db
-from app.core.weaviate_client import get_weaviate_client
+from app.core.log import get_logger, log_event
+from app.core.metrics import generation_in_flight, record_provider_error, stage_timer
+from app.core.ollama_client import get_ollama_session
+from app.core.prompt_budget import PromptBudget
+from app.core.response_cache import PreparedPrompt, get_response_cache
+from app.services.passage_index import index_diary_passages
+from app.services.retrieval import context_ids, get_retriever
+from app.core.vector_store import get_vector_store
+from app.providers.base import ProviderError
+from app.providers.registry import get_embedder, get_generator
+
+logger = get_logger("app.llama_rag")
+
+# Prometheus 指标中该流水线的名称
+PIPELINE = "recommendation"
 
 class LlamaRAGService:
     """
@@ -13,13 +32,49 @@ class LlamaRAGService:
     2. 查询阶段：用户写新日记时，查找语义相似的历史日记
     3. 生成阶段：使用相关历史日记作为上下文，生成个性化推荐
     """
-    def __init__(self):
+    def __init__(self, provider: Optional[str] = None):
         self.ollama_url = settings.ollama_url
-        self.model = settings.ollama_model
+        # "ollama" 为真实服务，"stub" 为离线/压测用的本地确定性实现
+        self.provider = provider or settings.recommendation_provider
         self.db = get_firestore_db()
         self.collection_name = "diaries"
-        self.weaviate_client = get_weaviate_client()
-        self.weaviate_class = "DiaryEntry"
+
+    @property
+    def embedder(self):
+        return get_embedder(self.provider)
+
+    @property
+    def generator(self):
+        return get_generator(self.provider)
+
+    @property
+    def model(self) -> str:
+        return self.generator.model
+
+    @property
+    def weaviate_class(self) -> str:
+        # 每个嵌入模型使用独立的 Weaviate 类，避免不同维度的向量混在同一个 HNSW 索引中
+        # 类在首次写入时才创建，启动时不需要连接向量库
+        return self.embedder.vector_class
+
+    @property
+    def vector_store(self):
+        # 向量库后端（Weaviate 或进程内 NumPy 索引），由 settings.vector_store 选择
+        return get_vector_store()
+
+    @property
+    def session(self):
+        # 进程内共享的 Ollama 节点池：按负载路由到健康节点，连接失败时自动切换
+        return get_ollama_session()
+
+    async def admit(self, user_id: str) -> Ticket:
+        """
+        申请一个生成名额（Ollama 同时只能处理少量生成请求）
+
+        名额不足时排队等待；队列已满、等待超时或该用户并发过多时
+        抛出 AdmissionRejected，由 API 返回 429/503 和 Retry-After
+        """
+        return await get_generation_admission().acquire(user_id)
 
     async def generate_embedding(self, text: str) -> List[float]:
         """
@@ -27,73 +82,91 @@ class LlamaRAGService:
         
         使用 Ollama 的 embedding 功能将文本转换为向量表示
         这样可以进行语义相似度搜索
+        相同（规范化后）文本的向量会从共享缓存直接返回，不再调用 Ollama
         """
+        cache = get_embedding_cache()
+        cache_key = self.embedder.cache_key
+        cached = cache.get(cache_key, text)
+        if cached is not None:
+            return cached
+        
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    f"{self.ollama_url}/api/embeddings",
-                    json={
-                        "model": self.model,
-                        "prompt": text
-                    }
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    return result.get("embedding", [])
-                else:
-                    print(f"[Llama RAG] Embedding failed: {response.status_code}")
-                    return []
+            # 并发请求会被微批处理器合并为一次 /api/embed 调用
+            batcher = get_embedding_batcher(cache_key, self._embed_batch)
+            embedding = await batcher.embed(text)
+            cache.put(cache_key, text, embedding)
+            return embedding
         except Exception as e:
-            print(f"[Llama RAG] Error generating embedding: {e}")
+            log_event(logger, logging.WARNING, "embedding_failed", provider=self.provider, error=str(e))
             return []
 
+    async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """批量生成嵌入向量（一次 provider 请求）"""
+        try:
+            return await self.embedder.embed_batch(texts)
+        except Exception as e:
+            record_provider_error(self.provider, "embed", e)
+            raise
+
     async def index_diary(
         self,
         diary_id: str,
         user_id: str,
         title: str,
         content: str,
-        created_at: str
+        created_at: str,
+        exists: bool = False
     ):
         """
         步骤 2: 索引日记到 Weaviate
         
         流程：
-        1. 合并标题和内容
-        2. 生成嵌入向量
-        3. 存储到 Weaviate 向量数据库
+        1. 将内容切分为有重叠的段落（短日记只有一段）
+        2. 更新时读取已存储段落的指纹，指纹未变的段落不再生成嵌入、也不重写
+        3. 为变化的段落（标题 + 段落）生成嵌入向量，并发请求会合并为一次批量调用
+        4. 每段以确定性 UUID（由类名 + diaryId + 段落序号生成）一次批量写入 Weaviate，重复写入即覆盖（upsert）
+        5. 删除旧版本多出来的段落
         
         这样后续可以进行语义搜索
+        失败时抛出异常，由后台索引队列负责重试
         """
         try:
-            print(f"[Llama RAG] Indexing diary {diary_id}")
-            
-            # 合并标题和内容生成嵌入
-            full_text = f"{title}\n\n{content}"
-            embedding = await self.generate_embedding(full_text)
-            
-            if not embedding:
-                print(f"[Llama RAG] Skip indexing - no embedding generated")
-                return
-            
-            # 存储到 Weaviate
-            self.weaviate_client.data_object.create(
-                class_name=self.weaviate_class,
-                data_object={
-                    "diaryId": diary_id,
-                    "userId": user_id,
-                    "title": title,
-                    "content": content,
-                    "createdAt": created_at
-                },
-                vector=embedding
+            # 切分段落、比较指纹、批量嵌入、写入并删除多余段落
+            embedded, unchanged = await index_diary_passages(
+                self.vector_store, self.embedder, self.weaviate_class, PIPELINE,
+                [(diary_id, {"userId": user_id, "title": title, "content": content, "createdAt": created_at})],
+                lambda texts: asyncio.gather(*(self.generate_embedding(text) for text in texts)),
+                reuse_stored=exists
             )
             
-            print(f"[Llama RAG] Successfully indexed diary {diary_id}")
+            log_event(
+                logger, logging.INFO, "diary_indexed",
+                diary_id=diary_id, passages=embedded + unchanged, embedded=embedded
+            )
             
         except Exception as e:
-            print(f"[Llama RAG] Error indexing diary: {e}")
+            log_event(logger, logging.WARNING, "index_failed", diary_id=diary_id, error=str(e))
+            raise
+
+    async def update_diary(
+        self,
+        diary_id: str,
+        user_id: str,
+        title: str,
+        content: str,
+        created_at: str
+    ):
+        """更新日记向量：只重新嵌入并覆盖指纹变化的段落，其余段落保持不变"""
+        await self.index_diary(diary_id, user_id, title, content, created_at, exists=True)
+
+    async def delete_diary(self, diary_id: str):
+        """删除日记向量：按 diaryId 删除该日记的所有段落对象"""
+        store = self.vector_store
+        try:
+            await store.run(store.delete_passages, self.weaviate_class, diary_id)
+        except Exception as e:
+            log_event(logger, logging.WARNING, "delete_failed", diary_id=diary_id, error=str(e))
+            raise
 
     async def search_similar_diaries(
         self,
@@ -112,94 +185,80 @@ class LlamaRAGService:
         
         这是 RAG 的核心 - 检索相关上下文
         """
+        _, entries = await self._retrieve(user_id, query_text, limit)
+        return entries
+
+    async def _retrieve(self, user_id: str, query_text: str, limit: int) -> Tuple[List[float], List[dict]]:
+        """检索相似日记，同时返回查询向量（响应缓存按查询向量匹配）"""
+        query_embedding: List[float] = []
         try:
-            print(f"[Llama RAG] Searching similar diaries for user {user_id}")
-            
             # 为查询生成嵌入
-            query_embedding = await self.generate_embedding(query_text)
+            with stage_timer(PIPELINE, "embed"):
+                query_embedding = await self.generate_embedding(query_text)
             
             if not query_embedding:
-                print(f"[Llama RAG] Skip search - no embedding generated")
-                return []
-            
-            # 在 Weaviate 中进行向量搜索
-            result = (
-                self.weaviate_client.query
-                .get(self.weaviate_class, ["diaryId", "title", "content", "createdAt"])
-                .with_near_vector({
-                    "vector": query_embedding
-                })
-                .with_where({
-                    "path": ["userId"],
-                    "operator": "Equal",
-                    "valueString": user_id
-                })
-                .with_limit(limit)
-                .do()
-            )
+                # 没有向量时仍可只用关键词检索
+                log_event(logger, logging.INFO, "vector_search_skipped", user_id=user_id, reason="no embedding")
             
-            entries = result.get("data", {}).get("Get", {}).get(self.weaviate_class, [])
-            print(f"[Llama RAG] Found {len(entries)} similar diaries")
+            # 在向量库中混合检索该用户的日记段落（向量 + BM25 关键词，融合后可选重排）
+            # 结果按日记分组，每篇日记只保留最相关的段落
+            store = self.vector_store
+            await store.run(store.ensure_collection, self.embedder.name, self.embedder.model)
+            with stage_timer(PIPELINE, "search"):
+                entries = await get_retriever().search(
+                    self.weaviate_class,
+                    query_text,
+                    query_embedding,
+                    user_id,
+                    limit,
+                    ["diaryId", "title", "content", "createdAt"],
+                    pipeline=PIPELINE
+                )
             
-            return entries
+            return query_embedding, entries
             
         except Exception as e:
-            print(f"[Llama RAG] Error searching diaries: {e}")
-            return []
+            log_event(logger, logging.WARNING, "search_failed", user_id=user_id, error=str(e))
+            return query_embedding, []
 
-    async def generate_recommendation(
+    async def prepare_recommendation(
         self,
         user_id: str,
         current_content: str,
         current_title: str = ""
-    ) -> str:
+    ) -> PreparedPrompt:
         """
-        步骤 4: 生成个性化推荐
-        
-        完整 RAG 流程：
-        1. 【检索 Retrieval】使用 Weaviate 语义搜索找到最相关的历史日记
-        2. 【增强 Augmented】将相关日记作为上下文添加到提示词
-        3. 【生成 Generation】使用 Llama 模型生成个性化建议
+        检索 + 增强：找到相关历史日记并构建提示词，同时查询响应缓存
         
-        这就是 RAG (Retrieval-Augmented Generation) 的核心！
+        草稿与最近一次请求足够相似、且检索到的历史日记相同时，
+        直接复用上次生成的推荐（cached 不为 None），不必再调用模型
+        供普通接口和流式接口共用
         """
-        try:
-            print(f"[Llama RAG] ====== RAG 流程开始 ======")
-            print(f"[Llama RAG] 用户 ID: {user_id}")
-            print(f"[Llama RAG] 当前内容长度: {len(current_content)} 字符")
-            
-            # ===== 步骤 1: 检索 (Retrieval) =====
-            print(f"[Llama RAG] 步骤 1/3: 检索相关日记...")
-            query_text = f"{current_title}\n\n{current_content}"
-            # 这个返回的是 Weaviate 里存储的日记的 text 字段内容（如 title、content），而不是 vector（嵌入向量）内容。
-            similar_diaries = await self.search_similar_diaries(
-                user_id=user_id,
-                query_text=query_text,
-                limit=3  # 只取最相关的 3 篇
-            )
-            
-            # ===== 步骤 2: 增强 (Augmented) =====
-            print(f"[Llama RAG] 步骤 2/3: 构建增强上下文...")
-            context = ""
-            if similar_diaries:
-                context = "用户的相关历史日记（按相似度排序）：\n\n"
-                for i, diary in enumerate(similar_diaries, 1):
-                    context += f"【相关日记 {i}】\n"
-                    context += f"标题: {diary.get('title', '无标题')}\n"
-                    context += f"内容: {diary.get('content', '')[:300]}...\n\n"
-                print(f"[Llama RAG] 找到 {len(similar_diaries)} 篇相关日记")
-            else:
-                context = "用户还没有历史日记，这是第一篇。\n\n"
-                print(f"[Llama RAG] 无历史日记，将提供通用建议")
-            
-            # 构建增强的提示词（包含检索到的上下文）
-            prompt = f"""你是一个智能日记助手。根据用户的相关历史日记和当前正在写的内容，提供有帮助的建议。
+        # ===== 步骤 1: 检索 (Retrieval) =====
+        query_text = f"{current_title}\n\n{current_content}"
+        # 这个返回的是 Weaviate 里存储的日记的 text 字段内容（如 title、content），而不是 vector（嵌入向量）内容。
+        query_embedding, similar_diaries = await self._retrieve(
+            user_id=user_id,
+            query_text=query_text,
+            limit=3  # 只取最相关的 3 篇
+        )
+        
+        cache = get_response_cache()
+        cache_key = cache.key(PIPELINE, user_id, query_embedding, context_ids(similar_diaries))
+        
+        # ===== 步骤 2: 增强 (Augmented) =====
+        with stage_timer(PIPELINE, "prompt"):
+            prompt, prompt_tokens = self._recommendation_prompt(similar_diaries, current_content, current_title)
+        return PreparedPrompt(prompt, cache_key, cache.get(cache_key), prompt_tokens)
+
+    # 提示词模板；{context}、{title}、{content} 按 token 预算填充
+    RECOMMENDATION_TEMPLATE = """你是一个智能日记助手。根据用户的相关历史日记和当前正在写的内容，提供有帮助的建议。
 
 {context}
 
 当前正在写的日记：
-标题: {current_title}
-内容: {current_content[:500]}
+标题: {title}
+内容: {content}
 
 请提供：
 1. 对当前内容的简短评论
@@ -208,73 +267,170 @@ class LlamaRAGService:
 
 用中文回复，保持温暖和鼓励的语气，不超过150字。"""
 
+    def _recommendation_prompt(self, similar_diaries: List[dict], current_content: str, current_title: str) -> Tuple[str, int]:
+        """
+        按 token 预算组装提示词，返回 (提示词, token 数)
+        
+        优先级：模板 > 当前日记（最多 PROMPT_ENTRY_MAX_TOKENS）> 按相关度排序的历史片段
+        超出预算的文本在 token 边界截断；截断后太短的片段直接舍弃
+        """
+        budget = PromptBudget(settings.prompt_max_tokens)
+        budget.reserve(self.RECOMMENDATION_TEMPLATE.format(context="", title="", content=""))
+        
+        # 当前日记优先
+        title = budget.take(current_title, limit=settings.prompt_entry_max_tokens) or ""
+        content = budget.take(
+            current_content,
+            limit=settings.prompt_entry_max_tokens - budget.tokenizer.count(title)
+        ) or ""
+        
+        # 剩余预算按相关度依次放入历史日记片段（与当前内容最相关的段落，而不是日记开头）
+        context = ""
+        if similar_diaries:
+            sections = []
+            for diary in similar_diaries:
+                heading = "用户的相关历史日记（按相似度排序）：\n\n" if not sections else ""
+                heading += f"【相关日记 {len(sections) + 1}】\n标题: {diary.get('title', '无标题')}\n相关片段: \n\n"
+                excerpt = budget.take(
+                    diary.get("content", ""),
+                    overhead=heading,
+                    min_tokens=settings.prompt_min_passage_tokens
+                )
+                if excerpt is not None:
+                    sections.append(heading[:-2] + excerpt + "\n\n")
+            context = "".join(sections)
+        else:
+            context = "用户还没有历史日记，这是第一篇。\n\n"
+            budget.reserve(context)
+        
+        # 构建增强的提示词（包含检索到的上下文）
+        prompt = self.RECOMMENDATION_TEMPLATE.format(context=context, title=title, content=content)
+        return prompt, budget.record(PIPELINE)
+
+    async def generate_recommendation(
+        self,
+        user_id: str,
+        current_content: str,
+        current_title: str = ""
+    ) -> str:
+        """
+        步骤 4: 生成个性化推荐
+        
+        完整 RAG 流程：
+        1. 【检索 Retrieval】使用 Weaviate 语义搜索找到最相关的历史日记
+        2. 【增强 Augmented】将相关日记作为上下文添加到提示词
+        3. 【生成 Generation】使用 Llama 模型生成个性化建议
+        
+        这就是 RAG (Retrieval-Augmented Generation) 的核心！
+        命中响应缓存时直接返回，不占用生成名额；
+        名额不足时抛出 AdmissionRejected（不会被下面的异常处理吞掉）
+        """
+        # ===== 步骤 1 & 2: 检索 (Retrieval) + 增强 (Augmented) =====
+        prepared = await self.prepare_recommendation(user_id, current_content, current_title)
+        if prepared.cached is not None:
+            log_event(logger, logging.INFO, "recommendation_cache_hit", user_id=user_id)
+            return prepared.cached
+        
+        ticket = await self.admit(user_id)
+        with ticket:
+            return await self._generate_recommendation(user_id, prepared)
+
+    async def _generate_recommendation(self, user_id: str, prepared: PreparedPrompt) -> str:
+        try:
             # ===== 步骤 3: 生成 (Generation) =====
-            print(f"[Llama RAG] 步骤 3/3: 使用 Llama 生成推荐...")
-            print(f"[Llama RAG] 调用 Ollama API: {self.ollama_url}")
-            
-            # 调用 Ollama API
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                try:
-                    response = await client.post(
-                        f"{self.ollama_url}/api/generate",
-                        json={
-                            "model": self.model,
-                            "prompt": prompt,
-                            "stream": False,
-                            "options": {
-                                "temperature": 0.7,
-                                "num_predict": 200
-                            }
-                        }
+            # 调用生成 provider（Ollama 复用共享连接池）
+            try:
+                with generation_in_flight(PIPELINE), stage_timer(PIPELINE, "generate"):
+                    recommendation = await self.generator.generate(
+                        prepared.prompt,
+                        temperature=0.7,
+                        max_tokens=200
                     )
-                    
-                    print(f"[Llama RAG] Response status: {response.status_code}")
-                    
-                    if response.status_code == 200:
-                        result = response.json()
-                        recommendation = result.get("response", "")
-                        if recommendation:
-                            print(f"[Llama RAG] ✅ 成功生成推荐: {len(recommendation)} 字符")
-                            print(f"[Llama RAG] ====== RAG 流程完成 ======")
-                            return recommendation
-                        else:
-                            error_msg = result.get("error", "未知错误")
-                            print(f"[Llama RAG] No response in result: {error_msg}")
-                            return f"⚠️ Ollama 返回空结果。可能是模型未加载。错误: {error_msg}"
-                    else:
-                        error_text = response.text
-                        print(f"[Llama RAG] Error response: {error_text}")
-                        return f"⚠️ Ollama 服务错误 (状态码 {response.status_code}): {error_text[:200]}"
-                        
-                except httpx.TimeoutException as e:
-                    print(f"[Llama RAG] Timeout error: {e}")
-                    return "⚠️ 请求超时。模型可能正在加载，请稍后再试（30-60秒）。"
-                except httpx.ConnectError as e:
-                    print(f"[Llama RAG] Connection error: {e}")
-                    return "⚠️ 无法连接到 Ollama 服务。请检查服务是否运行: docker ps | grep ollama"
-                    
+                log_event(
+                    logger, logging.INFO, "recommendation_generated",
+                    user_id=user_id, provider=self.provider,
+                    prompt_tokens=prepared.tokens, chars=len(recommendation)
+                )
+                # 只缓存成功生成的结果
+                get_response_cache().put(prepared.cache_key, recommendation)
+                return recommendation
+            except ProviderError as e:
+                record_provider_error(self.provider, "generate", e)
+                log_event(logger, logging.WARNING, "generation_failed", provider=self.provider, error=str(e))
+                return f"⚠️ {e}"
+            except httpx.TimeoutException as e:
+                record_provider_error(self.provider, "generate", e)
+                log_event(logger, logging.WARNING, "generation_timeout", provider=self.provider, error=str(e))
+                return "⚠️ 请求超时。模型可能正在加载，请稍后再试（30-60秒）。"
+            except httpx.ConnectError as e:
+                record_provider_error(self.provider, "generate", e)
+                log_event(logger, logging.WARNING, "generation_connect_failed", provider=self.provider, error=str(e))
+                return "⚠️ 无法连接到 Ollama 服务。请检查服务是否运行: docker ps | grep ollama"
+                
         except Exception as e:
-            import traceback
-            error_trace = traceback.format_exc()
-            print(f"[Llama RAG] Unexpected error: {error_trace}")
+            log_event(logger, logging.ERROR, "recommendation_error", exc_info=True, user_id=user_id)
             return f"生成推荐时出错: {type(e).__name__}: {str(e)}"
 
+    async def stream_recommendation(
+        self,
+        user_id: str,
+        current_content: str,
+        current_title: str = "",
+        ticket: Optional[Ticket] = None,
+        prepared: Optional[PreparedPrompt] = None
+    ) -> AsyncIterator[str]:
+        """
+        流式生成推荐：Ollama 每产生一段文本就立即返回
+        
+        客户端断开时生成器被关闭，随之关闭与 Ollama 的连接，
+        Ollama 会停止这次生成，不再占用模型资源
+        ticket 为调用方事先申请的生成名额（在返回响应前申请，才能回 429/503），
+        生成结束或中断时释放；prepared 为调用方已完成的检索结果
+        命中响应缓存时一次性返回缓存的推荐
+        """
+        if prepared is None:
+            prepared = await self.prepare_recommendation(user_id, current_content, current_title)
+        if prepared.cached is not None:
+            if ticket is not None:
+                ticket.release()
+            yield prepared.cached
+            return
+        
+        if ticket is None:
+            ticket = await self.admit(user_id)
+        with ticket:
+            stream = self.generator.stream(prepared.prompt, temperature=0.7, max_tokens=200)
+            parts = []
+            with generation_in_flight(PIPELINE), stage_timer(PIPELINE, "generate"):
+                try:
+                    async for token in stream:
+                        parts.append(token)
+                        yield token
+                except Exception as e:
+                    record_provider_error(self.provider, "generate", e)
+                    raise
+                finally:
+                    await stream.aclose()
+            # 只有完整生成（客户端未中途断开）时才写入缓存
+            get_response_cache().put(prepared.cache_key, "".join(parts))
+
     async def check_ollama_status(self) -> dict:
-        """检查 Ollama 服务状态"""
-        try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                response = await client.get(f"{self.ollama_url}/api/tags")
-                if response.status_code == 200:
-                    models = response.json().get("models", [])
-                    has_model = any(self.model in m.get("name", "") for m in models)
-                    return {
-                        "status": "running",
-                        "model_available": has_model,
-                        "models": [m.get("name") for m in models]
-                    }
-        except Exception as e:
+        """检查 Ollama 服务状态（立即探测池中所有节点）"""
+        pool = self.session
+        await pool.probe_all()
+        nodes = pool.node_stats()
+        models = sorted({name for node in pool.nodes if node.healthy for name in node.models})
+        if any(node["healthy"] for node in nodes):
             return {
-                "status": "offline",
-                "error": str(e)
+                "status": "running",
+                "model_available": any(node["model_available"] for node in nodes),
+                "models": models,
+                "nodes": nodes,
+                "latency": pool.stats.snapshot()
             }
-
+        return {
+            "status": "offline",
+            "error": "; ".join(f"{node['url']}: {node['last_error']}" for node in nodes),
+            "nodes": nodes,
+            "latency": pool.stats.snapshot()
+        }
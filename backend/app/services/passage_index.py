@@ -0,0 +1,96 @@
+"""
+Write diaries' passages to the vector store
+
+Shared by both RAG services (one diary per indexing job) and bulk
+re-indexing (a page of diaries at a time). Each diary is split into
+passages; when the diary may already be indexed, passages whose stored
+fingerprint still matches keep their vector. The changed passages are
+embedded together, written in one ``upsert_many`` batch under their
+deterministic UUIDs, and passages left over from a longer previous
+version are deleted.
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+from app.core.chunking import index_passages
+from app.core.metrics import INDEX_PASSAGES, stage_timer
+from app.core.vector_store import VectorStore
+from app.core.weaviate_client import passage_object_uuid
+
+# (diary_id, data) with the Firestore fields userId, title, content, createdAt
+Page = Sequence[Tuple[str, dict]]
+EmbedTexts = Callable[[List[str]], Awaitable[List[List[float]]]]
+
+def _iso(value) -> Optional[str]:
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+async def index_diary_passages(
+    store: VectorStore,
+    embedder,
+    class_name: str,
+    pipeline: str,
+    diaries: Page,
+    embed: EmbedTexts,
+    reuse_stored: bool = True,
+    trim: bool = False,
+    run: Optional[Callable[..., Awaitable]] = None
+) -> Tuple[int, int]:
+    """
+    Index ``diaries`` into ``class_name``; returns (embedded, unchanged) passage counts
+
+    ``reuse_stored`` reads each diary's stored passage fingerprints and
+    skips unchanged passages; without it every passage is embedded, and
+    ``trim`` still deletes passages past the new end. ``run`` executes
+    the blocking store calls (``store.run`` by default).
+    """
+    run = run or store.run
+    await run(store.ensure_collection, embedder.name, embedder.model)
+
+    if reuse_stored:
+        stored_by_diary: List[Optional[Dict[int, str]]] = await asyncio.gather(*(
+            run(store.passage_fingerprints, class_name, diary_id) for diary_id, _ in diaries
+        ))
+    else:
+        stored_by_diary = [None] * len(diaries)
+
+    changed, truncated = [], []
+    unchanged = 0
+    for (diary_id, data), stored in zip(diaries, stored_by_diary):
+        passages = index_passages(data.get("title") or "", data.get("content") or "")
+        for passage in passages:
+            if stored is not None and stored.get(passage.index) == passage.fingerprint:
+                unchanged += 1
+            else:
+                changed.append((diary_id, data, passage))
+        if (stored is None and trim) or any(index >= len(passages) for index in stored or ()):
+            truncated.append((diary_id, len(passages)))
+    INDEX_PASSAGES.labels(pipeline, "unchanged").inc(unchanged)
+    INDEX_PASSAGES.labels(pipeline, "embedded").inc(len(changed))
+
+    with stage_timer(pipeline, "index_embed"):
+        vectors = await embed([passage.text for _, _, passage in changed]) if changed else []
+    if len(vectors) != len(changed) or not all(vectors):
+        raise RuntimeError("no embedding generated")
+
+    with stage_timer(pipeline, "index_upsert"):
+        if changed:
+            await run(store.upsert_many, class_name, [
+                (
+                    passage_object_uuid(class_name, diary_id, passage.index),
+                    {
+                        "diaryId": diary_id,
+                        "userId": data.get("userId"),
+                        "title": data.get("title") or "",
+                        "content": passage.content,
+                        "createdAt": _iso(data.get("createdAt")),
+                        "chunkIndex": passage.index,
+                        "fingerprint": passage.fingerprint
+                    },
+                    vector
+                )
+                for (diary_id, data, passage), vector in zip(changed, vectors)
+            ])
+        await asyncio.gather(*(
+            run(store.delete_passages, class_name, diary_id, start=count)
+            for diary_id, count in truncated
+        ))
+    return len(changed), unchanged
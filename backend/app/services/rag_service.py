@@ -1,13 +1,69 @@
-from typing import List
-from openai import OpenAI
+import asyncio
+import logging
+from typing import AsyncIterator, List, Optional, Tuple
 from app.core.config import settings
-from app.core.weaviate_client import get_weaviate_client
+from app.core.embedding_cache import get_embedding_cache
+from app.core.embedding_batcher import get_embedding_batcher
+from app.core.log import get_logger, log_event
+from app.core.metrics import generation_in_flight, record_provider_error, stage_timer
+from app.core.prompt_budget import PromptBudget
+from app.core.response_cache import PreparedPrompt, get_response_cache
+from app.services.passage_index import index_diary_passages
+from app.services.retrieval import context_ids, get_retriever
+from app.core.vector_store import get_vector_store
+from app.providers.registry import get_embedder, get_generator
 from app.models.diary import DiaryResponse
 
+logger = get_logger("app.rag")
+
+# Pipeline label in Prometheus metrics
+PIPELINE = "insight"
+
 class RAGService:
-    def __init__(self):
-        self.openai_client = OpenAI(api_key=settings.openai_api_key)
-        self.weaviate_client = get_weaviate_client()
+    SYSTEM_PROMPT = "You are a compassionate AI journal companion who provides thoughtful, personalized insights."
+
+    def __init__(self, provider: Optional[str] = None):
+        # "openai" in production, "stub" for offline runs and benchmarks
+        self.provider = provider or settings.insight_provider
+
+    @property
+    def embedder(self):
+        return get_embedder(self.provider)
+
+    @property
+    def generator(self):
+        return get_generator(self.provider)
+
+    @property
+    def weaviate_class(self) -> str:
+        # Each embedding model has its own class, separate from Ollama vectors
+        # (created on first write, so startup needs no vector store)
+        return self.embedder.vector_class
+
+    @property
+    def vector_store(self):
+        return get_vector_store()
+
+    async def generate_embedding(self, text: str) -> List[float]:
+        """Create an embedding without blocking the event loop, reusing cached vectors"""
+        cache = get_embedding_cache()
+        cache_key = self.embedder.cache_key
+        cached = cache.get(cache_key, text)
+        if cached is not None:
+            return cached
+        
+        batcher = get_embedding_batcher(cache_key, self._embed_batch)
+        embedding = await batcher.embed(text)
+        cache.put(cache_key, text, embedding)
+        return embedding
+
+    async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed several texts in a single provider request"""
+        try:
+            return await self.embedder.embed_batch(texts)
+        except Exception as e:
+            record_provider_error(self.provider, "embed", e)
+            raise
 
     async def index_diary(
         self,
@@ -17,101 +73,50 @@ class RAGService:
         content: str,
         created_at: str
     ):
-        """Index a diary entry in Weaviate"""
-        try:
-            # Create embedding using OpenAI
-            embedding_response = self.openai_client.embeddings.create(
-                model="text-embedding-ada-002",
-                input=f"{title}\n\n{content}"
-            )
-            
-            embedding = embedding_response.data[0].embedding
-            
-            # Store in Weaviate
-            self.weaviate_client.data_object.create(
-                class_name="DiaryEntry",
-                data_object={
-                    "diaryId": diary_id,
-                    "userId": user_id,
-                    "title": title,
-                    "content": content,
-                    "createdAt": created_at
-                },
-                vector=embedding
-            )
-        except Exception as e:
-            print(f"Error indexing diary: {e}")
+        """Index a diary entry in the vector store (errors propagate so the indexing queue can retry)"""
+        await self._upsert(diary_id, user_id, title, content, created_at, exists=False)
 
     async def update_diary(
         self,
         diary_id: str,
         user_id: str,
         title: str,
-        content: str
+        content: str,
+        created_at: str
+    ):
+        """Update a diary entry in the vector store; only changed passages are re-embedded"""
+        await self._upsert(diary_id, user_id, title, content, created_at, exists=True)
+
+    async def _upsert(
+        self,
+        diary_id: str,
+        user_id: str,
+        title: str,
+        content: str,
+        created_at: str,
+        exists: bool
     ):
-        """Update a diary entry in Weaviate"""
         try:
-            # Find the object by diary ID
-            result = (
-                self.weaviate_client.query
-                .get("DiaryEntry", ["diaryId"])
-                .with_where({
-                    "path": ["diaryId"],
-                    "operator": "Equal",
-                    "valueString": diary_id
-                })
-                .with_additional(["id"])
-                .do()
+            # Unchanged passages keep their vector on update; concurrent
+            # embeddings share one batched request
+            await index_diary_passages(
+                self.vector_store, self.embedder, self.weaviate_class, PIPELINE,
+                [(diary_id, {"userId": user_id, "title": title, "content": content, "createdAt": created_at})],
+                lambda texts: asyncio.gather(*(self.generate_embedding(text) for text in texts)),
+                reuse_stored=exists
             )
-            
-            if result.get("data", {}).get("Get", {}).get("DiaryEntry"):
-                weaviate_id = result["data"]["Get"]["DiaryEntry"][0]["_additional"]["id"]
-                
-                # Create new embedding
-                embedding_response = self.openai_client.embeddings.create(
-                    model="text-embedding-ada-002",
-                    input=f"{title}\n\n{content}"
-                )
-                
-                embedding = embedding_response.data[0].embedding
-                
-                # Update in Weaviate
-                self.weaviate_client.data_object.update(
-                    data_object={
-                        "title": title,
-                        "content": content
-                    },
-                    class_name="DiaryEntry",
-                    uuid=weaviate_id,
-                    vector=embedding
-                )
         except Exception as e:
-            print(f"Error updating diary: {e}")
+            log_event(logger, logging.WARNING, "index_failed", diary_id=diary_id, error=str(e))
+            raise
 
     async def delete_diary(self, diary_id: str):
-        """Delete a diary entry from Weaviate"""
+        """Delete a diary entry from the vector store"""
+        store = self.vector_store
         try:
-            # Find and delete the object
-            result = (
-                self.weaviate_client.query
-                .get("DiaryEntry", ["diaryId"])
-                .with_where({
-                    "path": ["diaryId"],
-                    "operator": "Equal",
-                    "valueString": diary_id
-                })
-                .with_additional(["id"])
-                .do()
-            )
-            
-            if result.get("data", {}).get("Get", {}).get("DiaryEntry"):
-                weaviate_id = result["data"]["Get"]["DiaryEntry"][0]["_additional"]["id"]
-                self.weaviate_client.data_object.delete(
-                    uuid=weaviate_id,
-                    class_name="DiaryEntry"
-                )
+            await store.run(store.delete_passages, self.weaviate_class, diary_id)
         except Exception as e:
-            print(f"Error deleting diary: {e}")
+            log_event(logger, logging.WARNING, "delete_failed", diary_id=diary_id, error=str(e))
+            raise
 
     async def search_similar_diaries(
         self,
@@ -120,70 +125,60 @@ class RAGService:
         limit: int = 5
     ) -> List[dict]:
         """Search for similar diary entries using semantic search"""
+        _, entries = await self._retrieve(user_id, query_text, limit)
+        return entries
+
+    async def _retrieve(self, user_id: str, query_text: str, limit: int) -> Tuple[List[float], List[dict]]:
+        """Search, also returning the query embedding (the response cache matches on it)"""
+        embedding: List[float] = []
         try:
             # Create embedding for the query
-            embedding_response = self.openai_client.embeddings.create(
-                model="text-embedding-ada-002",
-                input=query_text
-            )
+            with stage_timer(PIPELINE, "embed"):
+                embedding = await self.generate_embedding(query_text)
             
-            embedding = embedding_response.data[0].embedding
-            
-            # Search in Weaviate
-            result = (
-                self.weaviate_client.query
-                .get("DiaryEntry", ["diaryId", "title", "content", "createdAt"])
-                .with_near_vector({
-                    "vector": embedding
-                })
-                .with_where({
-                    "path": ["userId"],
-                    "operator": "Equal",
-                    "valueString": user_id
-                })
-                .with_limit(limit)
-                .do()
-            )
-            
-            entries = result.get("data", {}).get("Get", {}).get("DiaryEntry", [])
-            return entries
+            # Hybrid vector + keyword search over the user's passages
+            store = self.vector_store
+            await store.run(store.ensure_collection, self.embedder.name, self.embedder.model)
+            with stage_timer(PIPELINE, "search"):
+                return embedding, await get_retriever().search(
+                    self.weaviate_class,
+                    query_text,
+                    embedding,
+                    user_id,
+                    limit,
+                    ["diaryId", "title", "content", "createdAt"],
+                    pipeline=PIPELINE
+                )
         except Exception as e:
-            print(f"Error searching diaries: {e}")
-            return []
+            log_event(logger, logging.WARNING, "search_failed", user_id=user_id, error=str(e))
+            return embedding, []
 
-    async def generate_insight(
+    async def prepare_insight(
         self,
         current_diary: DiaryResponse,
         user_id: str
-    ) -> str:
-        """Generate personalized AI insight based on user's diary history"""
+    ) -> PreparedPrompt:
+        """Retrieve related entries, build the insight prompt and look up the response cache"""
         # Search for similar past diaries
-        similar_diaries = await self.search_similar_diaries(
+        embedding, similar_diaries = await self._retrieve(
             user_id=user_id,
             query_text=f"{current_diary.title}\n\n{current_diary.content}",
             limit=5
         )
         
-        # Filter out the current diary from results
-        similar_diaries = [
-            d for d in similar_diaries 
-            if d.get("diaryId") != current_diary.id
-        ]
-        
-        # Build context from similar diaries
-        context = ""
-        if similar_diaries:
-            context = "\n\n---Previous related entries---\n"
-            for diary in similar_diaries[:3]:  # Use top 3
-                context += f"\nTitle: {diary.get('title', 'Untitled')}\n"
-                context += f"Content: {diary.get('content', '')[:200]}...\n"
+        cache = get_response_cache()
+        cache_key = cache.key(PIPELINE, user_id, embedding, context_ids(similar_diaries))
         
-        # Generate insight using OpenAI
-        prompt = f"""You are a compassionate AI journal companion. Based on the user's current diary entry and their past related entries, provide a personalized, thoughtful insight.
+        with stage_timer(PIPELINE, "prompt"):
+            prompt, prompt_tokens = self._insight_prompt(current_diary, similar_diaries)
+        return PreparedPrompt(prompt, cache_key, cache.get(cache_key), prompt_tokens)
+
+    # Filled by _insight_prompt within the prompt token budget
+    INSIGHT_TEMPLATE = """You are a compassionate AI journal companion. Based on the user's current diary entry and their past related entries, provide a personalized, thoughtful insight.
 
 Current Entry:
-Title: {current_diary.title}
-Content: {current_diary.content}
+Title: {title}
+Content: {content}
 {context}
 
 Provide a warm, empathetic response that:
@@ -194,20 +189,104 @@ Provide a warm, empathetic response that:
 
 Response:"""
 
-        try:
-            response = self.openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a compassionate AI journal companion who provides thoughtful, personalized insights."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=200
+    def _insight_prompt(self, current_diary: DiaryResponse, similar_diaries: List[dict]) -> Tuple[str, int]:
+        """
+        Build the insight prompt within the token budget; returns (prompt, tokens)
+
+        The system prompt and template come first, then the current entry
+        (up to PROMPT_ENTRY_MAX_TOKENS), then related passages by score.
+        """
+        budget = PromptBudget(settings.prompt_max_tokens)
+        budget.reserve(self.SYSTEM_PROMPT)
+        budget.reserve(self.INSIGHT_TEMPLATE.format(title="", content="", context=""))
+
+        title = budget.take(current_diary.title, limit=settings.prompt_entry_max_tokens) or ""
+        content = budget.take(
+            current_diary.content,
+            limit=settings.prompt_entry_max_tokens - budget.tokenizer.count(title)
+        ) or ""
+
+        # Filter out the current diary from results
+        similar_diaries = [
+            d for d in similar_diaries 
+            if d.get("diaryId") != current_diary.id
+        ]
+        
+        # Build context from the most relevant passages that fit
+        sections = []
+        for diary in similar_diaries[:3]:  # Use top 3
+            heading = "\n\n---Previous related entries---\n" if not sections else ""
+            heading += f"\nTitle: {diary.get('title', 'Untitled')}\nExcerpt: \n"
+            excerpt = budget.take(
+                diary.get("content", ""),
+                overhead=heading,
+                min_tokens=settings.prompt_min_passage_tokens
             )
-            
-            insight = response.choices[0].message.content.strip()
+            if excerpt is not None:
+                sections.append(heading[:-1] + excerpt + "\n")
+        
+        prompt = self.INSIGHT_TEMPLATE.format(title=title, content=content, context="".join(sections))
+        return prompt, budget.record(PIPELINE)
+
+    async def generate_insight(
+        self,
+        current_diary: DiaryResponse,
+        user_id: str
+    ) -> str:
+        """Generate personalized AI insight based on user's diary history"""
+        prepared = await self.prepare_insight(current_diary, user_id)
+        if prepared.cached is not None:
+            return prepared.cached
+
+        # Generate insight
+        try:
+            with generation_in_flight(PIPELINE), stage_timer(PIPELINE, "generate"):
+                insight = await self.generator.generate(
+                    prepared.prompt,
+                    system=self.SYSTEM_PROMPT,
+                    temperature=0.7,
+                    max_tokens=200
+                )
+            get_response_cache().put(prepared.cache_key, insight)
             return insight
         except Exception as e:
-            print(f"Error generating insight: {e}")
+            record_provider_error(self.provider, "generate", e)
+            log_event(logger, logging.WARNING, "generation_failed", provider=self.provider, error=str(e))
             return "Thank you for sharing your thoughts. Keep writing to help me understand you better!"
 
+    async def stream_insight(
+        self,
+        current_diary: DiaryResponse,
+        user_id: str
+    ) -> AsyncIterator[str]:
+        """
+        Stream insight tokens as the provider produces them
+
+        Closing the generator (e.g. when the client disconnects) closes the
+        upstream response so the completion stops consuming capacity.
+        A cached insight is sent as a single chunk.
+        """
+        prepared = await self.prepare_insight(current_diary, user_id)
+        if prepared.cached is not None:
+            yield prepared.cached
+            return
+
+        stream = self.generator.stream(
+            prepared.prompt,
+            system=self.SYSTEM_PROMPT,
+            temperature=0.7,
+            max_tokens=200
+        )
+        parts = []
+        with generation_in_flight(PIPELINE), stage_timer(PIPELINE, "generate"):
+            try:
+                async for token in stream:
+                    parts.append(token)
+                    yield token
+            except Exception as e:
+                record_provider_error(self.provider, "generate", e)
+                raise
+            finally:
+                await stream.aclose()
+        # Only complete streams are cached
+        get_response_cache().put(prepared.cache_key, "".join(parts))
@@ -0,0 +1,126 @@
+"""
+Vector index reconciliation
+
+Removes Weaviate objects that no longer match Firestore: objects of
+deleted diaries, objects whose owner changed, passages beyond the end of a
+diary that has since become shorter, and duplicates stored under random
+UUIDs by earlier versions. Diaries that only had a stray copy are
+re-queued for indexing under their deterministic UUID.
+
+Usage: python -m app.services.reconciliation [--dry-run] [--drop-legacy]
+"""
+import argparse
+from typing import Dict, List
+from app.core.chunking import diary_passages
+from app.core.config import settings
+from app.core.firebase import get_firestore_db
+from app.core.vector_store import get_vector_store
+from app.core.weaviate_client import passage_object_uuid
+from app.providers.registry import get_embedder
+from app.services.indexing_queue import get_indexing_queue
+
+# Single shared class written by versions before per-model classes existed
+LEGACY_CLASS = "DiaryEntry"
+
+class IndexReconciler:
+    def __init__(self, db=None, vector_store=None, queue=None, batch_size: int = 200):
+        self.db = db or get_firestore_db()
+        self.vector_store = vector_store or get_vector_store()
+        self.queue = queue or get_indexing_queue()
+        self.batch_size = batch_size
+        self.collection_name = "diaries"
+
+    @staticmethod
+    def targets() -> Dict[str, str]:
+        """Indexing-queue target -> Weaviate class"""
+        return {
+            "openai": get_embedder(settings.insight_provider).vector_class,
+            "llama": get_embedder(settings.recommendation_provider).vector_class
+        }
+
+    def _load_diaries(self, diary_ids: List[str]) -> Dict[str, dict]:
+        collection = self.db.collection(self.collection_name)
+        refs = [collection.document(diary_id) for diary_id in diary_ids]
+        if hasattr(self.db, "get_all"):
+            snapshots = self.db.get_all(refs)
+        else:
+            snapshots = [ref.get() for ref in refs]
+        return {snap.id: snap.to_dict() for snap in snapshots if snap.exists}
+
+    def reconcile_class(self, target: str, class_name: str, dry_run: bool = False) -> dict:
+        report = {"class": class_name, "scanned": 0, "deleted": 0, "requeued": 0}
+        if not self.vector_store.collection_exists(class_name):
+            return report
+
+        for objects in self.vector_store.iter_objects(class_name, self.batch_size):
+            report["scanned"] += len(objects)
+            diary_ids = list({o.get("properties", {}).get("diaryId") for o in objects} - {None})
+            diaries = self._load_diaries(diary_ids)
+            requeue = set()
+
+            for obj in objects:
+                props = obj.get("properties", {})
+                diary_id = props.get("diaryId")
+                diary = diaries.get(diary_id)
+
+                if diary is None or diary.get("userId") != props.get("userId"):
+                    stale = True
+                elif (props.get("chunkIndex") or 0) >= len(diary_passages(diary.get("content", ""))):
+                    # Left over from a longer version of the diary
+                    stale = True
+                elif obj["id"] != passage_object_uuid(class_name, diary_id, props.get("chunkIndex") or 0):
+                    stale = True
+                    requeue.add(diary_id)
+                else:
+                    stale = False
+
+                if stale:
+                    report["deleted"] += 1
+                    if not dry_run:
+                        self.vector_store.delete(class_name, obj["id"])
+
+            for diary_id in requeue:
+                report["requeued"] += 1
+                if not dry_run:
+                    diary = diaries[diary_id]
+                    created_at = diary.get("createdAt")
+                    self.queue.enqueue_sync(target, "update", diary_id, diary["userId"], {
+                        "title": diary.get("title", ""),
+                        "content": diary.get("content", ""),
+                        "created_at": created_at.isoformat() if hasattr(created_at, "isoformat") else created_at
+                    })
+        return report
+
+    def reconcile(self, dry_run: bool = False, drop_legacy: bool = False) -> dict:
+        reports = [
+            self.reconcile_class(target, class_name, dry_run=dry_run)
+            for target, class_name in self.targets().items()
+        ]
+        legacy_exists = self.vector_store.collection_exists(LEGACY_CLASS)
+        if legacy_exists and drop_legacy and not dry_run:
+            self.vector_store.drop_collection(LEGACY_CLASS)
+        return {
+            "dryRun": dry_run,
+            "classes": reports,
+            "legacyClass": {
+                "name": LEGACY_CLASS,
+                "exists": legacy_exists,
+                "dropped": legacy_exists and drop_legacy and not dry_run
+            }
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Remove orphaned and duplicate diary vectors from Weaviate")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without modifying anything")
+    parser.add_argument("--drop-legacy", action="store_true", help=f"delete the legacy {LEGACY_CLASS} class")
+    args = parser.parse_args()
+
+    report = IndexReconciler().reconcile(dry_run=args.dry_run, drop_legacy=args.drop_legacy)
+    for item in report["classes"]:
+        print(f"{item['class']}: scanned={item['scanned']} deleted={item['deleted']} requeued={item['requeued']}")
+    legacy = report["legacyClass"]
+    if legacy["exists"]:
+        print(f"{legacy['name']}: {'dropped' if legacy['dropped'] else 'present (use --drop-legacy to remove)'}")
+
+if __name__ == "__main__":
+    main()
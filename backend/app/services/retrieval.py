@@ -0,0 +1,319 @@
+"""
+Hybrid retrieval for both RAG pipelines
+
+Vector search finds entries that mean the same thing; BM25 keyword search
+finds entries that share names, places and rare words the embedding
+blurs. ``HybridRetriever`` runs both concurrently, fuses the ranked lists
+(reciprocal rank fusion, or a weighted sum of normalised scores), then
+optionally reorders the fused candidates with a local reranker before
+cutting to the requested top k.
+
+Long diaries are indexed as several passages (see ``app.core.chunking``),
+so search and fusion work on passages; the results are then grouped by
+diary, keeping each diary's ``passages_per_diary`` best passages as its
+content.
+
+Every search has a latency budget. A search that misses its budget is
+dropped and the other one used alone. Searches against an out-of-process
+store run on a bounded thread pool; a blocking client call cannot be
+interrupted, so a dropped search keeps its thread until the store answers
+and is counted as abandoned. While every thread is held by abandoned
+calls, further searches are dropped without being started. In-process
+stores and the reranker run inline; a reranker that overruns its budget
+is only counted. ``RETRIEVAL_MODE=vector`` restores plain vector search.
+"""
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.core.log import get_logger, log_event
+from app.core.metrics import (
+    RETRIEVAL_ABANDONED_CALLS, RETRIEVAL_ABANDONED_IN_FLIGHT, RETRIEVAL_BUDGET_EXCEEDED, stage_timer
+)
+from app.core.text_search import tokenize
+from app.core.vector_store import get_vector_store
+
+logger = get_logger("app.retrieval")
+
+class Reranker:
+    """Reorders fused candidates; the base class keeps the fused order"""
+    name = "none"
+
+    def rerank(self, query_text: str, entries: List[dict]) -> List[dict]:
+        return entries
+
+class OverlapReranker(Reranker):
+    """
+    Blend the fused score with query-term coverage
+
+    Coverage is the share of distinct query terms found in the entry's
+    title and content. It favours entries matching many query terms over
+    ones matching a single rare term very strongly, which is what fusion
+    alone tends to overrate.
+    """
+    name = "overlap"
+
+    def __init__(self, weight: float = 0.5):
+        self.weight = weight
+
+    def rerank(self, query_text, entries):
+        query_terms = set(tokenize(query_text))
+        if not query_terms or not entries:
+            return entries
+        top = max(entry["_additional"]["score"] for entry in entries) or 1.0
+        scored = []
+        for entry in entries:
+            terms = set(tokenize(f"{entry.get('title') or ''} {entry.get('content') or ''}"))
+            coverage = len(query_terms & terms) / len(query_terms)
+            fused = entry["_additional"]["score"] / top
+            scored.append(((1 - self.weight) * fused + self.weight * coverage, entry))
+        scored.sort(key=lambda item: -item[0])
+        return [entry for _, entry in scored]
+
+RERANKERS = {
+    "none": Reranker,
+    "overlap": OverlapReranker,
+}
+
+class HybridRetriever:
+    def __init__(
+        self,
+        mode: str = "hybrid",
+        fusion: str = "rrf",
+        alpha: float = 0.6,
+        rrf_k: int = 60,
+        candidate_multiplier: int = 3,
+        reranker: Optional[Reranker] = None,
+        vector_budget: float = 0.5,
+        keyword_budget: float = 0.3,
+        rerank_budget: float = 0.05,
+        passages_per_diary: int = 1,
+        search_threads: int = 8
+    ):
+        if mode not in ("vector", "hybrid"):
+            raise ValueError(f"Unknown retrieval mode: {mode}")
+        if fusion not in ("rrf", "weighted"):
+            raise ValueError(f"Unknown fusion method: {fusion}")
+        self.mode = mode
+        self.fusion = fusion
+        self.alpha = alpha
+        self.rrf_k = rrf_k
+        self.candidate_multiplier = candidate_multiplier
+        self.reranker = reranker or Reranker()
+        self.vector_budget = vector_budget
+        self.keyword_budget = keyword_budget
+        self.rerank_budget = rerank_budget
+        self.passages_per_diary = max(1, passages_per_diary)
+        self.search_threads = max(1, search_threads)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Calls that missed their budget but still hold a search thread
+        self._abandoned = 0
+        self._abandoned_lock = threading.Lock()
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.search_threads, thread_name_prefix="retrieval")
+        return self._executor
+
+    def _budget_exceeded(self, pipeline: str, stage: str):
+        RETRIEVAL_BUDGET_EXCEEDED.labels(pipeline, stage).inc()
+        log_event(logger, logging.INFO, "retrieval_budget_exceeded", pipeline=pipeline, stage=stage)
+
+    def _abandon(self, pipeline: str, stage: str, future: Future):
+        with self._abandoned_lock:
+            self._abandoned += 1
+        RETRIEVAL_ABANDONED_CALLS.labels(pipeline, stage).inc()
+        RETRIEVAL_ABANDONED_IN_FLIGHT.inc()
+        future.add_done_callback(self._abandoned_call_finished)
+
+    def _abandoned_call_finished(self, future: Future):
+        # Called on the search thread when the abandoned call returns
+        with self._abandoned_lock:
+            self._abandoned -= 1
+        RETRIEVAL_ABANDONED_IN_FLIGHT.dec()
+
+    async def _run(
+        self,
+        pipeline: str,
+        stage: str,
+        budget: float,
+        call: Callable[[], List[dict]],
+        inline: bool = False
+    ) -> Optional[List[dict]]:
+        """Run a blocking search on the search pool (or inline); None if it missed its budget"""
+        with stage_timer(pipeline, stage):
+            if inline:
+                return call()
+            if self._abandoned >= self.search_threads:
+                # Every thread is still waiting on a search nobody wants; a new
+                # one would only queue behind them
+                self._budget_exceeded(pipeline, stage)
+                return None
+            future = self._pool().submit(call)
+            try:
+                return await asyncio.wait_for(asyncio.wrap_future(future), timeout=budget if budget > 0 else None)
+            except asyncio.TimeoutError:
+                self._budget_exceeded(pipeline, stage)
+                # A call still queued is cancelled; a running one cannot be
+                if not future.cancel() and not future.done():
+                    self._abandon(pipeline, stage, future)
+                return None
+
+    async def search(
+        self,
+        collection: str,
+        query_text: str,
+        vector: List[float],
+        user_id: str,
+        limit: int,
+        properties: List[str],
+        pipeline: str
+    ) -> List[dict]:
+        """
+        Top ``limit`` diaries of one user, best first, in the vector store's entry format
+
+        ``content`` holds the diary's best passages in reading order and
+        ``_additional.passages`` their chunk indexes.
+        """
+        store = get_vector_store()
+        properties = list(dict.fromkeys(["diaryId", "chunkIndex", *properties]))
+        hybrid = self.mode == "hybrid" and bool(query_text.strip())
+        # Extra candidates so that several passages of one diary do not
+        # crowd out the other diaries
+        fetch = limit * self.candidate_multiplier
+
+        searches = {}
+        if vector:
+            searches["vector"] = self._run(
+                pipeline, "search_vector", self.vector_budget,
+                lambda: store.search(collection, vector, user_id, fetch, properties),
+                inline=store.in_process
+            )
+        if hybrid:
+            searches["keyword"] = self._run(
+                pipeline, "search_keyword", self.keyword_budget,
+                lambda: store.keyword_search(collection, query_text, user_id, fetch, properties),
+                inline=store.in_process
+            )
+        if not searches:
+            return []
+
+        outcomes = await asyncio.gather(*searches.values(), return_exceptions=True)
+        results: Dict[str, List[dict]] = {}
+        errors = []
+        for kind, outcome in zip(searches, outcomes):
+            if isinstance(outcome, BaseException):
+                log_event(logger, logging.WARNING, "retrieval_search_failed", pipeline=pipeline, kind=kind, error=str(outcome))
+                errors.append(outcome)
+            elif outcome is not None:
+                results[kind] = outcome
+        if not results and errors:
+            raise errors[0]
+        if set(results) == {"vector"} and not hybrid:
+            return self._by_diary(results["vector"], limit)
+
+        fused = self._fuse(results)
+        if self.reranker.name != "none" and len(fused) > 1:
+            # In-process and cheap; a thread hop would cost more than it saves
+            start = time.perf_counter()
+            with stage_timer(pipeline, "rerank"):
+                fused = self.reranker.rerank(query_text, fused)
+            if self.rerank_budget > 0 and time.perf_counter() - start > self.rerank_budget:
+                self._budget_exceeded(pipeline, "rerank")
+        return self._by_diary(fused, limit)
+
+    def _by_diary(self, passages: List[dict], limit: int) -> List[dict]:
+        """Group ranked passages into at most ``limit`` diaries, ordered by their best passage"""
+        groups: Dict[str, List[dict]] = {}
+        for passage in passages:
+            group = groups.get(passage.get("diaryId"))
+            if group is None:
+                if len(groups) == limit:
+                    continue
+                group = groups[passage.get("diaryId")] = []
+            if len(group) < self.passages_per_diary:
+                group.append(passage)
+
+        entries = []
+        for group in groups.values():
+            group_in_order = sorted(group, key=lambda passage: passage.get("chunkIndex") or 0)
+            entry = dict(group[0])
+            entry["_additional"] = {
+                **(group[0].get("_additional") or {}),
+                "passages": [passage.get("chunkIndex") or 0 for passage in group_in_order],
+            }
+            if len(group) > 1:
+                entry["content"] = "\n...\n".join(passage.get("content") or "" for passage in group_in_order)
+            entries.append(entry)
+        return entries
+
+    def _fuse(self, results: Dict[str, List[dict]]) -> List[dict]:
+        merged: Dict[Tuple[str, int], dict] = {}
+        scores: Dict[Tuple[str, int], float] = {}
+        for kind, entries in results.items():
+            if self.fusion == "rrf":
+                contributions = [1.0 / (self.rrf_k + rank) for rank in range(1, len(entries) + 1)]
+            elif kind == "vector":
+                contributions = [1.0 - entry["_additional"]["distance"] for entry in entries]
+            else:
+                top = max((entry["_additional"]["score"] for entry in entries), default=0.0) or 1.0
+                contributions = [entry["_additional"]["score"] / top for entry in entries]
+            weight = 1.0
+            if self.fusion == "weighted":
+                weight = self.alpha if kind == "vector" else 1.0 - self.alpha
+
+            for entry, contribution in zip(entries, contributions):
+                key = (entry.get("diaryId"), entry.get("chunkIndex") or 0)
+                if key not in merged:
+                    merged[key] = {**entry, "_additional": {}}
+                merged[key]["_additional"].update(entry.get("_additional") or {})
+                scores[key] = scores.get(key, 0.0) + weight * contribution
+
+        ordered = sorted(merged, key=lambda key: -scores[key])
+        for key in ordered:
+            merged[key]["_additional"]["score"] = scores[key]
+        return [merged[key] for key in ordered]
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "fusion": self.fusion,
+            "reranker": self.reranker.name,
+            "passages_per_diary": self.passages_per_diary,
+            "search_threads": self.search_threads,
+            "abandoned_in_flight": self._abandoned,
+        }
+
+def context_ids(entries: List[dict]) -> List[str]:
+    """Identify retrieved context by diary and passage (response cache key)"""
+    return [
+        f"{entry.get('diaryId')}#{','.join(str(i) for i in entry.get('_additional', {}).get('passages', [0]))}"
+        for entry in entries
+    ]
+
+_retriever: Optional[HybridRetriever] = None
+
+def get_retriever() -> HybridRetriever:
+    """Get or create the retriever configured by the RETRIEVAL_* settings"""
+    global _retriever
+    if _retriever is None:
+        reranker = RERANKERS.get(settings.retrieval_reranker)
+        if reranker is None:
+            raise ValueError(f"Unknown reranker: {settings.retrieval_reranker}")
+        _retriever = HybridRetriever(
+            mode=settings.retrieval_mode,
+            fusion=settings.retrieval_fusion,
+            alpha=settings.retrieval_hybrid_alpha,
+            rrf_k=settings.retrieval_rrf_k,
+            candidate_multiplier=settings.retrieval_candidate_multiplier,
+            reranker=reranker(),
+            vector_budget=settings.retrieval_vector_budget_ms / 1000,
+            keyword_budget=settings.retrieval_keyword_budget_ms / 1000,
+            rerank_budget=settings.retrieval_rerank_budget_ms / 1000,
+            passages_per_diary=settings.retrieval_passages_per_diary,
+            search_threads=settings.retrieval_search_threads
+        )
+    return _retriever
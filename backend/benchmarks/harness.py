@@ -0,0 +1,193 @@
+"""
+In-process load harness
+
+Runs the FastAPI app through ``httpx.ASGITransport`` against the local
+stand-ins (mock Firestore, in-process vector store, stub providers), so
+results measure the backend itself rather than the network or a model.
+``configure()`` must run before anything imports ``app``, because
+settings are read once at import time.
+"""
+import asyncio
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, List, Optional
+import httpx
+
+def configure(overrides: Optional[Dict[str, str]] = None):
+    """Point settings at the local stand-ins (explicit environment variables win)"""
+    defaults = {
+        "DEV_MODE": "true",
+        "VECTOR_STORE": "local",
+        "INSIGHT_PROVIDER": "stub",
+        "RECOMMENDATION_PROVIDER": "stub",
+        # Nothing listens here, so /ollama/status fails fast instead of hanging on DNS
+        "OLLAMA_URL": "http://127.0.0.1:9",
+        "OLLAMA_URLS": "",
+        # No background health probes against the unused Ollama address
+        "OLLAMA_HEALTH_INTERVAL": "0",
+        "INDEXING_QUEUE_PATH": os.path.join(tempfile.mkdtemp(prefix="bench-"), "indexing_queue.db"),
+        "INDEXING_POLL_INTERVAL_SECONDS": "0.05",
+        # Keep per-request log lines out of the results output
+        "LOG_LEVEL": "WARNING",
+    }
+    defaults.update(overrides or {})
+    for key, value in defaults.items():
+        os.environ.setdefault(key, str(value))
+
+def percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+def summarize(samples: List[float]) -> dict:
+    """Latency summary in milliseconds"""
+    return {
+        "count": len(samples),
+        "mean": round(sum(samples) / len(samples) * 1000, 3) if samples else 0.0,
+        "p50": round(percentile(samples, 0.50) * 1000, 3),
+        "p95": round(percentile(samples, 0.95) * 1000, 3),
+        "p99": round(percentile(samples, 0.99) * 1000, 3),
+        "max": round(max(samples) * 1000, 3) if samples else 0.0,
+    }
+
+class LoopLagMonitor:
+    """Measures how late a periodic timer fires, i.e. how long the event loop was blocked"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - start - self.interval))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def summary(self) -> dict:
+        return summarize(self.samples)
+
+class BenchClient:
+    """HTTP client that records latency and status per route label"""
+
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def request(self, route: str, method: str, url: str, user: str, expect=(200, 201, 204), **kwargs):
+        headers = {"Authorization": f"Bearer {user}"}
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=headers, **kwargs)
+        except Exception:
+            self.errors[route] += 1
+            raise
+        self.latencies[route].append(time.perf_counter() - start)
+        self.statuses[route][response.status_code] += 1
+        if response.status_code not in expect:
+            self.errors[route] += 1
+        return response
+
+    def reset(self):
+        self.latencies.clear()
+        self.statuses.clear()
+        self.errors.clear()
+
+    def report(self, elapsed: float) -> dict:
+        all_samples = [sample for samples in self.latencies.values() for sample in samples]
+        requests = len(all_samples)
+        return {
+            "requests": requests,
+            "errors": sum(self.errors.values()),
+            "throughput_rps": round(requests / elapsed, 2) if elapsed > 0 else 0.0,
+            "latency_ms": summarize(all_samples),
+            "routes": {
+                route: {
+                    **summarize(samples),
+                    "errors": self.errors.get(route, 0),
+                    "statuses": {str(code): count for code, count in sorted(self.statuses[route].items())},
+                }
+                for route, samples in sorted(self.latencies.items())
+            },
+        }
+
+@asynccontextmanager
+async def running_app():
+    """Start the app (lifespan included) and yield a BenchClient bound to it"""
+    from fastapi import Depends
+    from fastapi.security import HTTPAuthorizationCredentials
+    from app.main import app
+    from app.api.dependencies import get_current_user, security
+
+    # Dev-mode auth maps every token to one user; benchmarks need many, so
+    # the bearer token is used as the user ID
+    async def bench_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+        return {"uid": credentials.credentials}
+
+    app.dependency_overrides[get_current_user] = bench_user
+    try:
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+                yield BenchClient(client)
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
+
+async def wait_for_indexing(timeout: float = 60.0) -> float:
+    """Wait until the indexing queue is drained; returns the seconds waited"""
+    from app.services.indexing_queue import get_indexing_queue
+    queue = get_indexing_queue()
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        stats = await queue.stats()
+        if stats["pending"] == 0 and stats["running"] == 0:
+            break
+        await asyncio.sleep(0.02)
+    return time.perf_counter() - start
+
+async def run_users(
+    users: int,
+    duration: float,
+    session: Callable[[int, random.Random], Awaitable[None]],
+    seed: int = 0
+) -> float:
+    """
+    Run ``users`` virtual users until ``duration`` seconds have passed
+
+    Each user repeatedly awaits ``session(user_index, rng)``; failed
+    iterations are counted by the client and do not stop the user.
+    Returns the elapsed wall time.
+    """
+    deadline = time.perf_counter() + duration
+
+    async def user_loop(index: int):
+        rng = random.Random(seed * 100003 + index)
+        while time.perf_counter() < deadline:
+            try:
+                await session(index, rng)
+            except Exception:
+                await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user_loop(index) for index in range(users)))
+    return time.perf_counter() - start
@@ -0,0 +1,89 @@
+"""
+Microbenchmarks for hot paths that the load scenarios exercise indirectly
+"""
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict
+from benchmarks.harness import summarize
+
+def _measure(fn: Callable[[], object], iterations: int) -> dict:
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    total = sum(samples)
+    result = summarize(samples)
+    # Microbenchmarks are reported in microseconds
+    return {
+        "iterations": iterations,
+        "ops_per_second": round(iterations / total, 1) if total > 0 else 0.0,
+        "mean_us": round(result["mean"] * 1000, 2),
+        "p50_us": round(result["p50"] * 1000, 2),
+        "p99_us": round(result["p99"] * 1000, 2),
+    }
+
+def mock_firestore_page(iterations: int) -> dict:
+    """Keyset page of one user's diaries out of 20k documents"""
+    from app.core.mock_firestore import MockFirestore
+    db = MockFirestore()
+    collection = db.collection("diaries")
+    base = datetime.utcnow()
+    for n in range(20000):
+        collection.document().set({"userId": f"user-{n % 50}", "createdAt": base - timedelta(seconds=n)})
+
+    def page():
+        (
+            collection.where("userId", "==", "user-7")
+            .order_by("createdAt", "DESCENDING")
+            .order_by("__name__", "DESCENDING")
+            .start_after({"createdAt": base - timedelta(seconds=2000), "__name__": "mock_doc_2000"})
+            .limit(21)
+            .stream()
+        )
+    return _measure(page, iterations)
+
+def local_vector_search(iterations: int) -> dict:
+    """Top-5 search over one user's 2,000 vectors of dimension 384"""
+    from app.core.local_vector_store import LocalVectorStore
+    rng = random.Random(0)
+    store = LocalVectorStore()
+    for n in range(2000):
+        store.upsert("Bench", f"id-{n}", {"userId": "user", "diaryId": str(n)}, [rng.gauss(0, 1) for _ in range(384)])
+    query = [rng.gauss(0, 1) for _ in range(384)]
+    return _measure(lambda: store.search("Bench", query, "user", 5, ["diaryId"]), iterations)
+
+def hash_embedding(iterations: int) -> dict:
+    """Stub embedding of a 150-word entry"""
+    from app.providers.stub_provider import HashEmbedder
+    from benchmarks.scenarios import sentence
+    embedder = HashEmbedder(dim=384)
+    text = sentence(random.Random(0), 150)
+    return _measure(lambda: embedder.embed(text), iterations)
+
+def embedding_cache_hit(iterations: int) -> dict:
+    """In-memory embedding cache lookup of a 150-word entry"""
+    from app.core.embedding_cache import EmbeddingCache
+    from benchmarks.scenarios import sentence
+    cache = EmbeddingCache(max_entries=1000, ttl_seconds=3600)
+    text = sentence(random.Random(0), 150)
+    cache.put("bench", text, [0.0] * 384)
+    return _measure(lambda: cache.get("bench", text), iterations)
+
+def cursor_roundtrip(iterations: int) -> dict:
+    """Encode and decode a diary list cursor"""
+    from app.services.diary_service import encode_cursor, decode_cursor
+    now = datetime.utcnow()
+    return _measure(lambda: decode_cursor(encode_cursor(now, "mock_doc_123")), iterations)
+
+MICROBENCHMARKS: Dict[str, Callable[[int], dict]] = {
+    "mock_firestore_page": mock_firestore_page,
+    "local_vector_search": local_vector_search,
+    "hash_embedding": hash_embedding,
+    "embedding_cache_hit": embedding_cache_hit,
+    "cursor_roundtrip": cursor_roundtrip,
+}
+
+def run_microbenchmarks(iterations: int = 2000) -> dict:
+    return {name: bench(iterations) for name, bench in MICROBENCHMARKS.items()}
@@ -0,0 +1,157 @@
+"""
+Run the benchmark suite and write machine-readable results
+
+Usage (from backend/):
+    python -m benchmarks.run [--scenarios list_heavy,write_burst] [--duration 10]
+                             [--users 20] [--micro] [--output results.json]
+                             [--baseline previous.json --max-regression 20]
+
+Results are JSON: per scenario the throughput, overall and per-route
+p50/p95/p99 latency, event-loop lag and scenario extras, plus the git
+commit and configuration. With ``--baseline`` the run is compared to an
+earlier results file and exits with status 1 if any scenario's p95
+latency grew, or its throughput fell, by more than ``--max-regression``
+percent.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import List
+
+from benchmarks.harness import configure
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+async def run_scenarios(names: List[str], duration: float, users: int, seed: int) -> dict:
+    from benchmarks.harness import LoopLagMonitor, running_app
+    from benchmarks.scenarios import SCENARIOS, ScenarioConfig
+
+    results = {}
+    async with running_app() as bench:
+        for name in names:
+            config = ScenarioConfig(duration=duration, users=users, seed=seed)
+            print(f"▶ {name}: {users} users for {duration:.0f}s", file=sys.stderr)
+            bench.reset()
+            monitor = LoopLagMonitor()
+            monitor.start()
+            try:
+                extra = await SCENARIOS[name](bench, config)
+            finally:
+                await monitor.stop()
+            elapsed = extra.pop("elapsed", duration)
+            results[name] = {
+                **bench.report(elapsed),
+                "duration_s": round(elapsed, 3),
+                "loop_lag_ms": monitor.summary(),
+                "extra": extra,
+            }
+    return results
+
+def compare(current: dict, baseline: dict, max_regression: float) -> List[str]:
+    """Scenario regressions beyond ``max_regression`` percent"""
+    regressions = []
+    for name, result in current["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        old_p95, new_p95 = previous["latency_ms"]["p95"], result["latency_ms"]["p95"]
+        if old_p95 > 0 and (new_p95 - old_p95) / old_p95 * 100 > max_regression:
+            regressions.append(f"{name}: p95 {old_p95:.1f}ms -> {new_p95:.1f}ms")
+        old_rps, new_rps = previous["throughput_rps"], result["throughput_rps"]
+        if old_rps > 0 and (old_rps - new_rps) / old_rps * 100 > max_regression:
+            regressions.append(f"{name}: throughput {old_rps:.1f} -> {new_rps:.1f} req/s")
+    return regressions
+
+def print_summary(results: dict):
+    print(f"{'scenario':<24}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}{'lag p99':>10}")
+    for name, result in results["scenarios"].items():
+        latency = result["latency_ms"]
+        print(
+            f"{name:<24}{result['throughput_rps']:>10.1f}{latency['p50']:>10.1f}{latency['p95']:>10.1f}"
+            f"{latency['p99']:>10.1f}{result['errors']:>8}{result['loop_lag_ms']['p99']:>10.2f}"
+        )
+    for name, micro in results.get("micro", {}).items():
+        print(f"{name:<24}{micro['ops_per_second']:>10.0f} ops/s  p50 {micro['p50_us']:.1f}us  p99 {micro['p99_us']:.1f}us")
+
+def main():
+    from benchmarks.scenarios import SCENARIOS
+
+    parser = argparse.ArgumentParser(description="Benchmark the diaries API in-process against local stand-ins")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated scenario names")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per scenario")
+    parser.add_argument("--users", type=int, default=20, help="concurrent virtual users per scenario")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--micro", action="store_true", help="also run microbenchmarks")
+    parser.add_argument("--micro-iterations", type=int, default=2000)
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0, help="stub embedding latency")
+    parser.add_argument("--generate-latency-ms", type=float, default=0.0, help="stub time to first token")
+    parser.add_argument("--token-latency-ms", type=float, default=0.0, help="stub per-token latency")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="mean of the exponential latency tail")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="stub failure probability per call")
+    parser.add_argument("--output", default=None, help="results file (default: benchmarks/results/<commit>-<time>.json)")
+    parser.add_argument("--baseline", default=None, help="earlier results file to compare against")
+    parser.add_argument("--max-regression", type=float, default=20.0, help="allowed regression in percent")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    config = {
+        "STUB_EMBED_LATENCY_MS": args.embed_latency_ms,
+        "STUB_GENERATE_LATENCY_MS": args.generate_latency_ms,
+        "STUB_TOKEN_LATENCY_MS": args.token_latency_ms,
+        "STUB_LATENCY_JITTER_MS": args.jitter_ms,
+        "STUB_EMBED_FAILURE_RATE": args.failure_rate,
+        "STUB_GENERATE_FAILURE_RATE": args.failure_rate,
+        "STUB_SEED": args.seed,
+    }
+    configure({key: str(value) for key, value in config.items()})
+
+    results = {
+        "version": 1,
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {"duration": args.duration, "users": args.users, "seed": args.seed, **config},
+        "scenarios": asyncio.run(run_scenarios(names, args.duration, args.users, args.seed)),
+    }
+    if args.micro:
+        from benchmarks.micro import run_microbenchmarks
+        results["micro"] = run_microbenchmarks(args.micro_iterations)
+
+    output = args.output or os.path.join(
+        "benchmarks", "results", f"{results['commit']}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print_summary(results)
+    print(f"Results written to {output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        if regressions:
+            print("Regressions:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("No regressions against baseline")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Load scenarios for the /diaries API
+
+Each scenario seeds its own users (so scenarios do not see each other's
+data), then runs closed-loop virtual users for the configured duration.
+``SCENARIOS`` maps scenario names to their coroutine; every coroutine
+returns scenario-specific extras for the results file.
+"""
+import asyncio
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List
+from benchmarks.harness import BenchClient, run_users, wait_for_indexing
+
+WORDS = (
+    "morning run river coffee work meeting friend family dinner walk rain sun "
+    "tired happy anxious calm project deadline book music garden city train "
+    "weekend sleep dream plan goal progress learn write cook travel home"
+).split()
+
+@dataclass
+class ScenarioConfig:
+    duration: float = 10.0
+    users: int = 20
+    seed: int = 0
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+async def seed_diaries(prefix: str, users: int, per_user: int, seed: int, index: bool) -> Dict[str, List[str]]:
+    """
+    Write diaries straight to the repository (much faster than the API)
+
+    With ``index`` the same indexing jobs as POST /diaries are queued and
+    awaited, so searches have vectors to find.
+    """
+    from app.api.routes.diaries import diary_service
+    from app.services.indexing_queue import get_indexing_queue
+
+    rng = random.Random(seed)
+    base = datetime.utcnow()
+    diary_ids: Dict[str, List[str]] = {}
+    queue = get_indexing_queue()
+    for user_index in range(users):
+        user = f"{prefix}-{user_index}"
+        writes = []
+        for n in range(per_user):
+            created_at = base - timedelta(minutes=n)
+            writes.append(("set", None, {
+                "userId": user,
+                "title": sentence(rng, 3),
+                "content": sentence(rng, 60),
+                "createdAt": created_at,
+                "updatedAt": created_at,
+                "aiInsight": None
+            }))
+        ids = await diary_service.repository.write_batch(writes)
+        diary_ids[user] = ids
+        if index:
+            for diary_id, (_, _, data) in zip(ids, writes):
+                payload = {
+                    "title": data["title"],
+                    "content": data["content"],
+                    "created_at": data["createdAt"].isoformat()
+                }
+                await queue.enqueue("openai", "index", diary_id, user, payload)
+                await queue.enqueue("llama", "index", diary_id, user, payload)
+    if index:
+        await wait_for_indexing(timeout=600)
+    return diary_ids
+
+async def list_heavy(bench: BenchClient, config: ScenarioConfig) -> dict:
+    """Users paging through long histories and opening entries"""
+    per_user = 300
+    diary_ids = await seed_diaries("list", config.users, per_user, config.seed, index=False)
+    users = list(diary_ids)
+
+    async def session(index: int, rng: random.Random):
+        user = users[index % len(users)]
+        view = rng.choice(["full", "summary"])
+        cursor = None
+        for _ in range(rng.randint(1, 5)):
+            params = {"limit": 20, "view": view}
+            if cursor:
+                params["cursor"] = cursor
+            response = await bench.request("GET /diaries", "GET", "/diaries", user, params=params)
+            cursor = response.json().get("nextCursor")
+            if not cursor:
+                break
+        diary_id = rng.choice(diary_ids[user])
+        await bench.request("GET /diaries/{id}", "GET", f"/diaries/{diary_id}", user)
+        if rng.random() < 0.2:
+            await bench.request("GET /diaries/{id}/indexing", "GET", f"/diaries/{diary_id}/indexing", user)
+
+    elapsed = await run_users(config.users, config.duration, session, config.seed)
+    return {"elapsed": elapsed, "diaries_per_user": per_user}
+
+async def write_burst(bench: BenchClient, config: ScenarioConfig) -> dict:
+    """Bursts of creates, edits and deletes; reports how long indexing takes to catch up"""
+    users = [f"write-{n}" for n in range(config.users)]
+
+    async def session(index: int, rng: random.Random):
+        user = users[index]
+        created = await bench.request(
+            "POST /diaries", "POST", "/diaries", user,
+            json={"title": sentence(rng, 3), "content": sentence(rng, 80)}
+        )
+        diary_id = created.json()["id"]
+        await bench.request(
+            "PUT /diaries/{id}", "PUT", f"/diaries/{diary_id}", user,
+            json={"content": sentence(rng, 90)}
+        )
+        if rng.random() < 0.3:
+            await bench.request("DELETE /diaries/{id}", "DELETE", f"/diaries/{diary_id}", user)
+        if rng.random() < 0.1:
+            await bench.request("GET /diaries/indexing/status", "GET", "/diaries/indexing/status", user)
+
+    elapsed = await run_users(config.users, config.duration, session, config.seed)
+    drain = await wait_for_indexing(timeout=600)
+
+    from app.services.indexing_queue import get_indexing_queue
+    return {"elapsed": elapsed, "indexing_drain_seconds": round(drain, 3), "indexing_queue": await get_indexing_queue().stats()}
+
+async def insight_storm(bench: BenchClient, config: ScenarioConfig) -> dict:
+    """Many users asking for AI insights at once, plain and streamed"""
+    diary_ids = await seed_diaries("insight", config.users, 20, config.seed, index=True)
+    users = list(diary_ids)
+
+    async def session(index: int, rng: random.Random):
+        user = users[index % len(users)]
+        diary_id = rng.choice(diary_ids[user])
+        if rng.random() < 0.7:
+            await bench.request("POST /diaries/{id}/ai-insight", "POST", f"/diaries/{diary_id}/ai-insight", user)
+        else:
+            await bench.request("POST /diaries/{id}/ai-insight/stream", "POST", f"/diaries/{diary_id}/ai-insight/stream", user)
+
+    elapsed = await run_users(config.users, config.duration, session, config.seed)
+    return {"elapsed": elapsed}
+
+async def recommend_while_typing(bench: BenchClient, config: ScenarioConfig) -> dict:
+    """Users typing a new entry, asking for recommendations every few words"""
+    diary_ids = await seed_diaries("typing", config.users, 30, config.seed, index=True)
+    users = list(diary_ids)
+
+    async def session(index: int, rng: random.Random):
+        user = users[index % len(users)]
+        title = sentence(rng, 3)
+        content = ""
+        for _ in range(rng.randint(3, 8)):
+            content = (content + " " + sentence(rng, rng.randint(2, 6))).strip()
+            body = {"title": title, "content": content}
+            if rng.random() < 0.5:
+                await bench.request("POST /diaries/recommend", "POST", "/diaries/recommend", user, json=body)
+            else:
+                await bench.request("POST /diaries/recommend/stream", "POST", "/diaries/recommend/stream", user, json=body)
+            # Typing pause between requests
+            await asyncio.sleep(rng.uniform(0.05, 0.25))
+        if rng.random() < 0.05:
+            await bench.request("GET /diaries/ollama/status", "GET", "/diaries/ollama/status", user)
+
+    elapsed = await run_users(config.users, config.duration, session, config.seed)
+    return {"elapsed": elapsed}
+
+SCENARIOS = {
+    "list_heavy": list_heavy,
+    "write_burst": write_burst,
+    "insight_storm": insight_storm,
+    "recommend_while_typing": recommend_while_typing,
+}
@@ -0,0 +1,100 @@
+import asyncio
+import pytest
+from app.core.admission import AdmissionController, AdmissionRejected
+
+def controller(max_concurrent=1, max_queue=8, max_wait=5.0, per_user_limit=4):
+    return AdmissionController("test", max_concurrent, max_queue, max_wait, per_user_limit)
+
+async def queued(admission, user_id):
+    """Start waiting for a slot and return once the request is queued"""
+    task = asyncio.create_task(admission.acquire(user_id))
+    await asyncio.sleep(0)
+    return task
+
+async def test_grants_immediately_while_capacity_is_free():
+    admission = controller(max_concurrent=2)
+    first = await admission.acquire("u1")
+    second = await admission.acquire("u2")
+    assert admission.stats()["active"] == 2
+    first.release()
+    second.release()
+    assert admission.stats()["active"] == 0
+
+async def test_release_is_idempotent():
+    admission = controller()
+    ticket = await admission.acquire("u1")
+    with ticket:
+        pass
+    ticket.release()
+    assert admission.stats()["active"] == 0
+    # The slot was returned exactly once
+    await admission.acquire("u2")
+    assert admission.stats()["active"] == 1
+
+async def test_waiters_are_served_round_robin_across_users():
+    admission = controller()
+    holder = await admission.acquire("busy")
+    order, tickets = [], {}
+
+    async def wait_and_record(name, user_id):
+        tickets[name] = await admission.acquire(user_id)
+        order.append(name)
+
+    # u1 queues twice before u2 queues once
+    waiters = []
+    for name, user_id in (("u1-first", "u1"), ("u1-second", "u1"), ("u2", "u2")):
+        waiters.append(asyncio.create_task(wait_and_record(name, user_id)))
+        await asyncio.sleep(0)
+    assert admission.stats()["queued"] == 3
+
+    holder.release()
+    for granted in range(1, 4):
+        while len(order) < granted:
+            await asyncio.sleep(0)
+        tickets[order[-1]].release()
+    await asyncio.gather(*waiters)
+    assert order == ["u1-first", "u2", "u1-second"]
+
+async def test_per_user_limit_rejects_with_429():
+    admission = controller(max_concurrent=4, per_user_limit=1)
+    await admission.acquire("u1")
+    with pytest.raises(AdmissionRejected) as rejected:
+        await admission.acquire("u1")
+    assert rejected.value.status_code == 429
+    assert rejected.value.reason == "user_limit"
+
+async def test_full_queue_rejects_with_503():
+    admission = controller(max_queue=1)
+    await admission.acquire("u1")
+    waiter = await queued(admission, "u2")
+    with pytest.raises(AdmissionRejected) as rejected:
+        await admission.acquire("u3")
+    assert rejected.value.status_code == 503
+    assert rejected.value.reason == "queue_full"
+    assert rejected.value.retry_after >= 1
+    waiter.cancel()
+
+async def test_queue_timeout_rejects_and_frees_the_queue_position():
+    admission = controller(max_wait=0.05)
+    holder = await admission.acquire("u1")
+    with pytest.raises(AdmissionRejected) as rejected:
+        await admission.acquire("u2")
+    assert rejected.value.reason == "queue_timeout"
+    assert admission.stats()["queued"] == 0
+
+    # The timed-out waiter must not be handed the next free slot
+    holder.release()
+    assert admission.stats()["active"] == 0
+
+async def test_cancelled_waiter_is_abandoned_without_leaking_a_slot():
+    admission = controller()
+    holder = await admission.acquire("u1")
+    waiter = await queued(admission, "u2")
+    waiter.cancel()
+    await asyncio.gather(waiter, return_exceptions=True)
+    assert admission.stats()["queued"] == 0
+
+    holder.release()
+    assert admission.stats()["active"] == 0
+    ticket = await admission.acquire("u2")
+    assert ticket.user_id == "u2"
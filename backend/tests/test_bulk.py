@@ -0,0 +1,135 @@
+import json
+from datetime import datetime
+from types import SimpleNamespace
+import pytest
+from app.core.local_vector_store import LocalVectorStore
+from app.core.mock_firestore import MockFirestore
+from app.repositories.diary_repository import DiaryRepository
+from app.services import bulk
+from app.services.bulk import Checkpoint, PassageIndexer, Progress, diary_from_record, read_jsonl
+
+def record(n, **fields):
+    return {"userId": "u1", "title": f"title {n}", "content": f"Entry number {n}.", "createdAt": f"2024-01-{n + 1:02d}T08:00:00", **fields}
+
+def write_jsonl(path, lines):
+    path.write_text("".join((line if isinstance(line, str) else json.dumps(line)) + "\n" for line in lines), encoding="utf-8")
+    return str(path)
+
+class FakeService:
+    """RAG service stand-in: local vector store and a deterministic embedder"""
+    def __init__(self, store):
+        self.vector_store = store
+        self.embedder = SimpleNamespace(name="stub", model="bulk")
+        self.weaviate_class = store.ensure_collection("stub", "bulk")
+        self.requests = []
+
+    async def _embed_batch(self, texts):
+        self.requests.append(len(texts))
+        return [[1.0, float(len(text))] for text in texts]
+
+@pytest.fixture
+def store(monkeypatch):
+    store = LocalVectorStore()
+    monkeypatch.setattr(bulk, "get_vector_store", lambda: store)
+    monkeypatch.setattr(bulk, "RAGService", lambda: FakeService(store))
+    return store
+
+@pytest.fixture
+def repository():
+    return DiaryRepository(db=MockFirestore())
+
+def progress():
+    return Progress("test", interval=3600)
+
+async def stored(repository):
+    return dict(await repository.scan_page(1000))
+
+def test_record_validation_and_defaults():
+    diary_id, data = diary_from_record(record(0, id="given", updatedAt="2024-02-01T00:00:00Z"))
+    assert diary_id == "given"
+    assert data["createdAt"] == datetime(2024, 1, 1, 8)
+    assert data["updatedAt"].year == 2024 and data["updatedAt"].month == 2
+    assert data["snippet"] == "Entry number 0."
+
+    # Without an ID the same record always maps to the same document
+    assert diary_from_record(record(1))[0] == diary_from_record(record(1))[0]
+    assert diary_from_record(record(1))[0] != diary_from_record(record(2))[0]
+    assert diary_from_record(record(1, userId=None), user_id="u9")[1]["userId"] == "u9"
+
+    with pytest.raises(ValueError):
+        diary_from_record(record(0, userId=None))
+    with pytest.raises(ValueError):
+        diary_from_record(record(0, title=""))
+
+def test_jsonl_reader_reports_bad_lines(tmp_path):
+    path = write_jsonl(tmp_path / "in.jsonl", [record(0), "{broken", "[1, 2]", "", record(1)])
+    rows = list(read_jsonl(path))
+    assert [(number, error is None) for number, _, error in rows] == [(1, True), (2, False), (3, False), (5, True)]
+    assert [number for number, _, _ in read_jsonl(path, skip=2)] == [3, 5]
+
+async def test_import_writes_diaries_and_skips_invalid_lines(tmp_path, repository):
+    path = write_jsonl(tmp_path / "in.jsonl", [record(n) for n in range(5)] + ["{broken", record(9, content="")])
+    run_progress = progress()
+    await bulk.run_import(path, repository, [], Checkpoint(None, {}), run_progress, batch_size=2)
+    assert run_progress.counts == {"diaries": 5, "invalid": 2}
+    assert len(await stored(repository)) == 5
+
+    # Replaying the file overwrites instead of duplicating
+    await bulk.run_import(path, repository, [], Checkpoint(None, {}), progress(), batch_size=2)
+    assert len(await stored(repository)) == 5
+
+async def test_import_resumes_after_the_last_checkpoint(tmp_path, repository):
+    path = write_jsonl(tmp_path / "in.jsonl", [record(n) for n in range(6)])
+    checkpoint = Checkpoint(str(tmp_path / "import.ck"), {"command": "import"})
+    checkpoint.save({"lines": 4})
+
+    run_progress = progress()
+    await bulk.run_import(path, repository, [], checkpoint, run_progress, batch_size=10, resume=True)
+    assert run_progress.counts == {"diaries": 2}
+    assert sorted(data["title"] for data in (await stored(repository)).values()) == ["title 4", "title 5"]
+    assert checkpoint.load() == {"lines": 6}
+
+    with pytest.raises(ValueError):
+        Checkpoint(checkpoint.path, {"command": "reindex"}).load()
+
+async def test_export_round_trips_and_resumes(tmp_path, repository):
+    await bulk.run_import(write_jsonl(tmp_path / "in.jsonl", [record(n) for n in range(5)]),
+                          repository, [], Checkpoint(None, {}), progress(), batch_size=10)
+    output = tmp_path / "out.jsonl"
+    checkpoint = Checkpoint(str(tmp_path / "export.ck"), {"command": "export"})
+    await bulk.run_export(str(output), repository, checkpoint, progress(), batch_size=2)
+    lines = output.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 5
+    assert {json.loads(line)["id"] for line in lines} == set(await stored(repository))
+
+    # A crash after the second page left a partial line behind
+    offset = sum(len(line.encode("utf-8")) + 1 for line in lines[:2])
+    checkpoint.save({"after": json.loads(lines[1])["id"], "offset": offset})
+    with open(output, "ab") as f:
+        f.write(b'{"id": "partial')
+    await bulk.run_export(str(output), repository, checkpoint, progress(), batch_size=2, resume=True)
+    assert output.read_text(encoding="utf-8").splitlines() == lines
+
+    copy = DiaryRepository(db=MockFirestore())
+    await bulk.run_import(str(output), copy, [], Checkpoint(None, {}), progress(), batch_size=10)
+    assert await stored(copy) == await stored(repository)
+
+async def test_reindex_embeds_in_batches_and_skips_unchanged_passages(tmp_path, repository, store):
+    await bulk.run_import(write_jsonl(tmp_path / "in.jsonl", [record(n) for n in range(5)]),
+                          repository, [], Checkpoint(None, {}), progress(), batch_size=10)
+    indexer = PassageIndexer("openai", embed_batch_size=2, concurrency=2)
+    run_progress = progress()
+    await bulk.run_reindex(repository, [indexer], Checkpoint(None, {}), run_progress, batch_size=10)
+    assert run_progress.counts == {"diaries": 5, "openai_passages_embedded": 5, "openai_passages_unchanged": 0}
+    assert sorted(indexer.service.requests) == [1, 2, 2]
+    assert store.stats()["collections"][indexer.service.weaviate_class]["objects"] == 5
+
+    run_progress = progress()
+    await bulk.run_reindex(repository, [indexer], Checkpoint(None, {}), run_progress, batch_size=10)
+    assert run_progress.counts["openai_passages_unchanged"] == 5
+    assert run_progress.counts["openai_passages_embedded"] == 0
+
+    forced = PassageIndexer("openai", force=True)
+    run_progress = progress()
+    await bulk.run_reindex(repository, [forced], Checkpoint(None, {}), run_progress, batch_size=10, user_id="u1")
+    assert run_progress.counts["openai_passages_embedded"] == 5
@@ -0,0 +1,56 @@
+from app.core.chunking import index_passages, split_passages
+
+def sentences(count):
+    return " ".join(f"Sentence number {i} is here." for i in range(count))
+
+def test_short_text_is_one_passage():
+    assert split_passages("  Bought milk and eggs.  ", size=400, overlap=80) == ["Bought milk and eggs."]
+    assert split_passages("", size=400, overlap=80) == [""]
+
+def test_passages_respect_size_and_end_at_sentences():
+    text = sentences(60)
+    passages = split_passages(text, size=200, overlap=40)
+    assert len(passages) > 1
+    assert all(len(passage) <= 200 for passage in passages)
+    # Every passage but the last ends where a sentence ends
+    assert all(passage.endswith(".") for passage in passages[:-1])
+    assert passages[-1].endswith(text[-20:])
+
+def test_consecutive_passages_overlap_and_cover_the_text():
+    text = sentences(60)
+    passages = split_passages(text, size=200, overlap=40)
+    for previous, current in zip(passages, passages[1:]):
+        # The next passage starts inside the previous one
+        assert current.split(" ", 1)[0] in previous
+    for i in range(60):
+        assert any(f"number {i} is" in passage for passage in passages)
+
+def test_text_without_spaces_is_split():
+    text = "今天天气很好。" * 100
+    passages = split_passages(text, size=120, overlap=20)
+    assert len(passages) > 1
+    assert all(len(passage) <= 120 for passage in passages)
+    assert all(passage.endswith("。") for passage in passages[:-1])
+
+def test_text_without_boundaries_is_cut_at_the_window():
+    text = "a" * 1000
+    passages = split_passages(text, size=300, overlap=50)
+    assert [len(passage) for passage in passages[:-1]] == [300] * (len(passages) - 1)
+    assert sum(len(passage) for passage in passages) - 50 * (len(passages) - 1) == 1000
+
+def test_fingerprints_change_only_for_edited_passages():
+    content = sentences(80)
+    before = index_passages("Title", content)
+    after = index_passages("Title", content + " One more sentence.")
+    assert len(before) > 2
+    stored = {p.index: p.fingerprint for p in before}
+    changed = [p.index for p in after if stored.get(p.index) != p.fingerprint]
+    # Only the tail is re-embedded after appending to an entry
+    assert changed
+    assert min(changed) >= len(before) - 1
+
+def test_title_is_part_of_every_embedded_text():
+    passages = index_passages("Morning run", sentences(80))
+    assert all(p.text.startswith("Morning run\n\n") for p in passages)
+    renamed = index_passages("Evening run", sentences(80))
+    assert all(a.fingerprint != b.fingerprint for a, b in zip(passages, renamed))
@@ -0,0 +1,156 @@
+import asyncio
+import pytest
+from app.core.coalescer import RequestCoalescer, RequestSuperseded
+
+class Work:
+    """Controllable unit of work that records how it ended"""
+
+    def __init__(self, result):
+        self.result = result
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+        self.calls = 0
+        self.cancelled = False
+
+    async def __call__(self):
+        self.calls += 1
+        self.started.set()
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return self.result
+
+async def test_identical_requests_share_one_flight():
+    coalescer = RequestCoalescer("test")
+    work = Work("answer")
+    first = asyncio.create_task(coalescer.run("u1", "draft", work))
+    second = asyncio.create_task(coalescer.run("u1", "draft", work))
+    await work.started.wait()
+    work.release.set()
+
+    assert await first == "answer"
+    assert await second == "answer"
+    assert work.calls == 1
+    assert coalescer.counts == {"started": 1, "deduplicated": 1}
+
+async def test_other_users_do_not_share_flights():
+    coalescer = RequestCoalescer("test")
+    work = Work("answer")
+    work.release.set()
+    assert await coalescer.run("u1", "draft", work) == "answer"
+    assert await coalescer.run("u2", "draft", work) == "answer"
+    assert work.calls == 2
+
+async def test_newer_draft_supersedes_and_older_caller_follows_it():
+    coalescer = RequestCoalescer("test")
+    old, new = Work("old"), Work("new")
+    older = asyncio.create_task(coalescer.run("u1", "draft-1", old))
+    await old.started.wait()
+    newer = asyncio.create_task(coalescer.run("u1", "draft-2", new))
+    await new.started.wait()
+    new.release.set()
+
+    # The older caller is handed the answer to the draft the user now has
+    assert await older == "new"
+    assert await newer == "new"
+    assert old.cancelled
+    assert coalescer.counts["superseded"] == 1
+
+async def test_superseded_without_newer_flight_raises():
+    coalescer = RequestCoalescer("test")
+    work = Work("answer")
+    caller = asyncio.create_task(coalescer.run("u1", "draft", work))
+    await work.started.wait()
+    assert coalescer.supersede("u1")
+
+    with pytest.raises(RequestSuperseded):
+        await caller
+    assert work.cancelled
+
+async def test_flight_is_cancelled_when_no_waiters_remain():
+    coalescer = RequestCoalescer("test")
+    work = Work("answer")
+    first = asyncio.create_task(coalescer.run("u1", "draft", work))
+    second = asyncio.create_task(coalescer.run("u1", "draft", work))
+    await work.started.wait()
+
+    first.cancel()
+    await asyncio.gather(first, return_exceptions=True)
+    await asyncio.sleep(0)
+    # One caller still waits, so the work keeps running
+    assert not work.cancelled
+
+    second.cancel()
+    await asyncio.gather(second, return_exceptions=True)
+    await asyncio.sleep(0)
+    assert work.cancelled
+    assert coalescer.stats()["in_flight"] == 0
+
+async def test_burst_is_debounced_to_the_last_draft():
+    coalescer = RequestCoalescer("test", debounce=0.05)
+    works = [Work(f"answer-{i}") for i in range(3)]
+    callers = []
+    for i, work in enumerate(works):
+        callers.append(asyncio.create_task(coalescer.run("u1", f"draft-{i}", work)))
+        await asyncio.sleep(0)
+    for work in works:
+        work.release.set()
+
+    assert await asyncio.gather(*callers) == ["answer-2"] * 3
+    # The first draft started at once; the second was replaced while waiting
+    assert [work.calls for work in works] == [1, 0, 1]
+    assert works[0].cancelled
+
+async def test_newer_stream_stops_older_stream():
+    coalescer = RequestCoalescer("test")
+    closed = asyncio.Event()
+
+    async def endless():
+        try:
+            while True:
+                yield "token"
+                await asyncio.sleep(0.01)
+        finally:
+            closed.set()
+
+    async def short():
+        yield "fresh"
+
+    older = coalescer.stream("u1", endless())
+    assert await older.__anext__() == "token"
+
+    newer = [token async for token in coalescer.stream("u1", short())]
+    assert newer == ["fresh"]
+
+    with pytest.raises(RequestSuperseded):
+        while True:
+            await older.__anext__()
+    await asyncio.wait_for(closed.wait(), timeout=1)
+
+async def test_stream_superseded_before_it_starts_closes_upstream():
+    coalescer = RequestCoalescer("test")
+    closed = asyncio.Event()
+
+    async def tokens():
+        try:
+            yield "never sent"
+        finally:
+            closed.set()
+
+    upstream = tokens()
+    # Prime the generator so closing it runs its finally
+    assert await upstream.__anext__() == "never sent"
+    stream = coalescer.stream("u1", upstream)
+    waiting = asyncio.create_task(stream.__anext__())
+    while coalescer.stats()["in_flight"] == 0:
+        await asyncio.sleep(0)
+    # Cancel the pump before it has taken its first step
+    coalescer._flights["u1"].task.cancel()
+
+    with pytest.raises(RequestSuperseded):
+        await asyncio.wait_for(waiting, timeout=1)
+    await stream.aclose()
+    assert closed.is_set()
+    assert coalescer.counts == {"started": 1}
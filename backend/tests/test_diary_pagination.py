@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta
+import pytest
+from app.core.mock_firestore import MockFirestore
+from app.models.diary import DiaryCreate, DiaryUpdate
+from app.repositories.diary_repository import DiaryRepository
+from app.services.diary_service import DiaryService, decode_cursor, diary_snippet, encode_cursor
+
+BASE = datetime(2024, 1, 1)
+
+class Jobs:
+    def __init__(self):
+        self.enqueued = []
+
+    async def enqueue(self, *job):
+        self.enqueued.append(job)
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr("app.services.diary_service.get_indexing_queue", Jobs)
+    service = DiaryService()
+    service.repository = DiaryRepository(db=MockFirestore())
+    return service
+
+async def add_diaries(service, count, user_id="u1"):
+    await service.repository.write_batch([
+        ("set", f"d{i:02d}", {
+            "userId": user_id,
+            "title": f"title {i}",
+            "content": f"content   {i}\n" * 50,
+            "snippet": diary_snippet(f"content   {i}\n" * 50),
+            # Pairs of diaries share a createdAt, so the cursor must carry the ID
+            "createdAt": BASE + timedelta(days=i // 2),
+            "updatedAt": BASE,
+            "aiInsight": None,
+        })
+        for i in range(count)
+    ])
+
+async def all_pages(service, limit, view="full"):
+    pages, cursor = [], None
+    while True:
+        items, next_cursor = await service.list_diaries("u1", limit, decode_cursor(cursor) if cursor else None, view)
+        pages.append([item.id for item in items])
+        if next_cursor is None:
+            return pages
+        cursor = next_cursor
+
+def test_cursor_round_trips():
+    created_at = datetime(2024, 5, 6, 7, 8, 9, 123456)
+    cursor = encode_cursor(created_at, "abc/def")
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (created_at, "abc/def")
+
+@pytest.mark.parametrize("cursor", ["", "not-base64!", encode_cursor(BASE, "x")[:-4], "e30"])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+@pytest.mark.parametrize("count,limit", [(6, 3), (7, 3), (5, 5), (4, 5), (1, 1)])
+async def test_pages_cover_every_diary_once(service, count, limit):
+    await add_diaries(service, count)
+    pages = await all_pages(service, limit)
+    ids = [diary_id for page in pages for diary_id in page]
+    assert sorted(ids) == sorted(f"d{i:02d}" for i in range(count))
+    assert len(set(ids)) == count
+    # A last page that is exactly full does not leave an empty page behind
+    assert all(pages)
+    assert all(len(page) == limit for page in pages[:-1])
+
+async def test_next_cursor_only_when_another_diary_exists(service):
+    await add_diaries(service, 4)
+    _, next_cursor = await service.list_diaries("u1", 4)
+    assert next_cursor is None
+    items, next_cursor = await service.list_diaries("u1", 3)
+    assert next_cursor == encode_cursor(items[-1].createdAt, items[-1].id)
+
+async def test_summary_view_returns_stored_snippets(service):
+    await add_diaries(service, 3)
+    items, _ = await service.list_diaries("u1", 10, view="summary")
+    assert [item.snippet for item in items] == [diary_snippet(f"content   {i}\n" * 50) for i in (2, 1, 0)]
+    assert all(len(item.snippet) <= 160 and "\n" not in item.snippet for item in items)
+
+async def test_summary_view_falls_back_to_content_without_a_snippet(service):
+    await service.repository.write_batch([("set", "old", {
+        "userId": "u1", "title": "old", "content": "written  before\nsnippets",
+        "createdAt": BASE, "updatedAt": BASE,
+    })])
+    items, _ = await service.list_diaries("u1", 10, view="summary")
+    assert items[0].snippet == "written before snippets"
+
+async def test_writes_keep_the_snippet_current(service):
+    created = await service.create_diary(DiaryCreate(title="t", content="first draft"), "u1")
+    await service.update_diary(created.id, DiaryUpdate(content="second draft"), "u1")
+    items, _ = await service.list_diaries("u1", 10, view="summary")
+    assert items[0].snippet == "second draft"
@@ -0,0 +1,62 @@
+import asyncio
+import pytest
+from app.core.embedding_batcher import EmbeddingBatcher
+
+class Backend:
+    """Records each batched request and embeds a text as [len(text)]"""
+    def __init__(self, fail=False, short=False):
+        self.calls = []
+        self.fail = fail
+        self.short = short
+
+    async def __call__(self, texts):
+        self.calls.append(list(texts))
+        await asyncio.sleep(0)
+        if self.fail:
+            raise RuntimeError("provider down")
+        vectors = [[float(len(text))] for text in texts]
+        return vectors[:-1] if self.short else vectors
+
+async def test_concurrent_callers_share_one_request():
+    backend = Backend()
+    batcher = EmbeddingBatcher("test", backend, max_batch_size=32, max_wait_ms=5)
+    vectors = await asyncio.gather(*(batcher.embed("x" * n) for n in range(1, 6)))
+    assert vectors == [[1.0], [2.0], [3.0], [4.0], [5.0]]
+    assert backend.calls == [["x", "xx", "xxx", "xxxx", "xxxxx"]]
+
+async def test_full_batch_flushes_without_waiting():
+    backend = Backend()
+    batcher = EmbeddingBatcher("test", backend, max_batch_size=3, max_wait_ms=10_000)
+    vectors = await asyncio.wait_for(
+        asyncio.gather(*(batcher.embed(text) for text in ["a", "bb", "ccc", "dddd", "eeeee", "ffffff"])),
+        timeout=1
+    )
+    assert vectors == [[1.0], [2.0], [3.0], [4.0], [5.0], [6.0]]
+    assert backend.calls == [["a", "bb", "ccc"], ["dddd", "eeeee", "ffffff"]]
+
+async def test_duplicate_texts_are_sent_once():
+    backend = Backend()
+    batcher = EmbeddingBatcher("test", backend)
+    vectors = await batcher.embed_many(["same", "other", "same"])
+    assert vectors == [[4.0], [5.0], [4.0]]
+    assert backend.calls == [["same", "other"]]
+    assert batcher.stats()["items"] == 2
+
+async def test_failure_reaches_every_caller_in_the_batch():
+    batcher = EmbeddingBatcher("test", Backend(fail=True))
+    results = await asyncio.gather(batcher.embed("a"), batcher.embed("b"), return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert batcher.stats()["failures"] == 1
+
+async def test_wrong_number_of_vectors_is_an_error():
+    batcher = EmbeddingBatcher("test", Backend(short=True))
+    with pytest.raises(ValueError):
+        await batcher.embed_many(["a", "b"])
+
+async def test_later_window_gets_its_own_batch():
+    backend = Backend()
+    batcher = EmbeddingBatcher("test", backend, max_wait_ms=1)
+    await batcher.embed("first")
+    await batcher.embed("second")
+    assert backend.calls == [["first"], ["second"]]
+    assert batcher.stats()["avg_batch_size"] == 1.0
@@ -0,0 +1,58 @@
+import pytest
+from app.core.embedding_cache import EmbeddingCache, text_fingerprint
+
+def test_fingerprint_ignores_whitespace_and_unicode_form():
+    assert text_fingerprint("  a  walk\n in the\tpark ") == text_fingerprint("a walk in the park")
+    assert text_fingerprint("café") == text_fingerprint("café")
+    assert text_fingerprint("a walk") != text_fingerprint("a talk")
+
+def test_hit_requires_same_model_and_text():
+    cache = EmbeddingCache()
+    cache.put("model-a", "hello  world", [1.0, 2.0])
+    assert cache.get("model-a", "hello world") == [1.0, 2.0]
+    assert cache.get("model-b", "hello world") is None
+    assert cache.get("model-a", "hello there") is None
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (1, 2)
+
+def test_least_recently_used_entry_is_evicted():
+    cache = EmbeddingCache(max_entries=2)
+    cache.put("m", "one", [1.0])
+    cache.put("m", "two", [2.0])
+    cache.get("m", "one")
+    cache.put("m", "three", [3.0])
+    assert cache.get("m", "two") is None
+    assert cache.get("m", "one") == [1.0]
+    assert cache.get("m", "three") == [3.0]
+    assert cache.stats()["evictions"] == 1
+
+def test_expired_entries_are_misses(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("app.core.embedding_cache.time.time", lambda: now[0])
+    cache = EmbeddingCache(ttl_seconds=60)
+    cache.put("m", "text", [1.0])
+    now[0] += 59
+    assert cache.get("m", "text") == [1.0]
+    now[0] += 2
+    assert cache.get("m", "text") is None
+    assert cache.stats()["entries"] == 0
+
+def test_empty_vectors_are_not_cached():
+    cache = EmbeddingCache()
+    cache.put("m", "text", [])
+    assert cache.get("m", "text") is None
+
+def test_disk_tier_survives_restart_and_refills_memory(tmp_path):
+    path = str(tmp_path / "embeddings.db")
+    cache = EmbeddingCache(max_entries=1, disk_path=path)
+    cache.put("m", "first", [0.5, -0.25])
+    cache.put("m", "second", [1.5])
+    # Evicted from memory but still on disk
+    assert cache.get("m", "first") == pytest.approx([0.5, -0.25])
+    assert cache.stats()["disk_hits"] == 1
+    cache.close()
+
+    reopened = EmbeddingCache(disk_path=path)
+    assert reopened.get("m", "second") == pytest.approx([1.5])
+    assert reopened.get("m", "second") == pytest.approx([1.5])
+    assert (reopened.stats()["disk_hits"], reopened.stats()["hits"]) == (1, 1)
+    reopened.close()
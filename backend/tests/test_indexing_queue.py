@@ -0,0 +1,140 @@
+import asyncio
+import time
+import pytest
+from app.services.indexing_queue import DEAD, DONE, PENDING, IndexingQueue
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = IndexingQueue(str(tmp_path / "queue.db"), workers=2, max_attempts=3, backoff_base=0.01, poll_interval=0.01)
+    yield queue
+    queue.close()
+
+def rows(queue):
+    return [dict(row) for row in queue._conn.execute("SELECT * FROM index_jobs ORDER BY id")]
+
+async def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        await asyncio.sleep(0.01)
+
+async def test_newer_job_supersedes_a_pending_one(queue):
+    await queue.enqueue("openai", "index", "d1", "u1", {"content": "first"})
+    await queue.enqueue("openai", "update", "d1", "u1", {"content": "second"})
+    await queue.enqueue("llama", "index", "d1", "u1", {"content": "first"})
+    jobs = rows(queue)
+    assert [(job["target"], job["payload"]) for job in jobs] == [
+        ("openai", '{"content": "second"}'),
+        ("llama", '{"content": "first"}'),
+    ]
+    # The object was never created, so the update must still create it
+    assert jobs[0]["op"] == "index"
+
+async def test_jobs_run_once_and_complete(queue):
+    handled = []
+
+    async def handler(job):
+        handled.append((job["target"], job["diary_id"], job["payload"]))
+
+    await queue.enqueue("openai", "index", "d1", "u1", {"content": "text"})
+    await queue.enqueue("openai", "delete", "d2", "u1")
+    await queue.start(handler)
+    await wait_until(lambda: queue.completed == 2)
+    await queue.stop()
+
+    assert sorted(handled) == [("openai", "d1", {"content": "text"}), ("openai", "d2", {})]
+    stats = await queue.stats()
+    assert (stats["pending"], stats["running"], stats["dead"]) == (0, 0, 0)
+    assert (await queue.diary_status("d1"))["openai"]["state"] == DONE
+
+async def test_failed_job_backs_off_then_dead_letters(queue):
+    attempts = []
+
+    async def handler(job):
+        attempts.append(time.time())
+        raise RuntimeError("vector store down")
+
+    await queue.enqueue("openai", "index", "d1", "u1")
+    await queue.start(handler)
+    await wait_until(lambda: rows(queue)[0]["status"] == DEAD)
+    await queue.stop()
+
+    assert len(attempts) == queue.max_attempts
+    assert queue.failed_attempts == queue.max_attempts
+    job = rows(queue)[0]
+    assert job["attempts"] == queue.max_attempts
+    assert job["last_error"] == "RuntimeError: vector store down"
+    # Each retry waited at least half of its exponential delay
+    gaps = [later - earlier for earlier, later in zip(attempts, attempts[1:])]
+    assert all(gap >= 0.5 * 0.01 * 2 ** n for n, gap in enumerate(gaps))
+
+    assert await queue.retry_dead() == 1
+    job = rows(queue)[0]
+    assert (job["status"], job["attempts"]) == (PENDING, 0)
+
+async def test_failure_schedules_the_next_attempt(queue):
+    queue.backoff_base = 60
+
+    async def handler(job):
+        raise RuntimeError("boom")
+
+    await queue.enqueue("openai", "index", "d1", "u1")
+    await queue.start(handler)
+    await wait_until(lambda: queue.failed_attempts == 1)
+    await queue.stop()
+
+    job = rows(queue)[0]
+    assert job["status"] == PENDING
+    assert 30 <= job["next_attempt_at"] - time.time() <= 60
+
+async def test_jobs_for_one_diary_never_run_concurrently(queue):
+    running, overlaps = set(), []
+
+    async def handler(job):
+        key = (job["target"], job["diary_id"])
+        if key in running:
+            overlaps.append(key)
+        running.add(key)
+        await asyncio.sleep(0.02)
+        running.discard(key)
+
+    await queue.start(handler)
+    for n in range(5):
+        await queue.enqueue("openai", "update", "d1", "u1", {"n": n})
+        await asyncio.sleep(0.005)
+    await wait_until(lambda: rows(queue)[-1]["status"] == DONE)
+    await queue.stop()
+    assert overlaps == []
+    assert rows(queue)[-1]["payload"] == '{"n": 4}'
+
+async def test_stopped_worker_returns_its_job_to_pending(queue):
+    started = asyncio.Event()
+
+    async def handler(job):
+        started.set()
+        await asyncio.sleep(10)
+
+    await queue.enqueue("openai", "index", "d1", "u1")
+    await queue.start(handler)
+    await started.wait()
+    await queue.stop()
+    assert rows(queue)[0]["status"] == PENDING
+
+async def test_replay_completed_reruns_recent_jobs(queue):
+    async def handler(job):
+        pass
+
+    await queue.enqueue("openai", "index", "old", "u1")
+    await queue.start(handler)
+    await wait_until(lambda: queue.completed == 1)
+    since = time.time()
+    await queue.enqueue("openai", "index", "new", "u1")
+    await wait_until(lambda: queue.completed == 2)
+    await queue.stop()
+
+    assert await queue.replay_completed(since) == 1
+    assert {job["diary_id"]: job["status"] for job in rows(queue)} == {"old": DONE, "new": PENDING}
+
+def test_enqueue_sync_works_without_an_event_loop(queue):
+    job_id = queue.enqueue_sync("openai", "delete", "d1", "u1")
+    assert rows(queue)[0]["id"] == job_id
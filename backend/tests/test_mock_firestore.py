@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+import pytest
+from app.core.mock_firestore import MockFirestore
+
+BASE = datetime(2024, 1, 1)
+
+@pytest.fixture
+def diaries():
+    collection = MockFirestore().collection("diaries")
+    # Several documents share a createdAt, so pages must break ties by ID
+    for i in range(25):
+        collection.document(f"d{i:02d}").set({
+            "userId": "u1" if i % 5 else "u2",
+            "title": f"title {i}",
+            "content": f"content {i}",
+            "createdAt": BASE + timedelta(days=i // 3),
+        })
+    return collection
+
+def newest_first(collection, user_id):
+    docs = [(doc.id, doc.to_dict()) for doc in collection.stream() if doc.to_dict()["userId"] == user_id]
+    return [doc_id for doc_id, data in sorted(docs, key=lambda d: (d[1]["createdAt"], d[0]), reverse=True)]
+
+def keyset_pages(collection, user_id, size):
+    """Page like DiaryRepository.list_page: (createdAt, id) descending"""
+    pages, cursor = [], None
+    while True:
+        query = (
+            collection
+            .where("userId", "==", user_id)
+            .order_by("createdAt", direction="DESCENDING")
+            .order_by("__name__", direction="DESCENDING")
+        )
+        if cursor is not None:
+            query = query.start_after(cursor)
+        page = list(query.limit(size).stream())
+        if not page:
+            return pages
+        pages.append([doc.id for doc in page])
+        last = page[-1]
+        cursor = {"createdAt": last.to_dict()["createdAt"], "__name__": last.id}
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 50])
+def test_keyset_pages_neither_skip_nor_repeat(diaries, size):
+    pages = keyset_pages(diaries, "u1", size)
+    assert [doc_id for page in pages for doc_id in page] == newest_first(diaries, "u1")
+    assert all(len(page) == size for page in pages[:-1])
+
+def test_index_follows_updates_and_deletes(diaries):
+    keyset_pages(diaries, "u1", 4)  # builds the composite index
+    diaries.document("d01").update({"createdAt": BASE + timedelta(days=100)})
+    diaries.document("d02").delete()
+    diaries.document("d99").set({"userId": "u1", "createdAt": BASE - timedelta(days=1)})
+
+    ids = [doc_id for page in keyset_pages(diaries, "u1", 4) for doc_id in page]
+    assert ids == newest_first(diaries, "u1")
+    assert ids[0] == "d01"
+    assert ids[-1] == "d99"
+    assert "d02" not in ids
+
+def test_documents_without_the_order_field_are_omitted(diaries):
+    diaries.document("undated").set({"userId": "u1", "title": "no date"})
+    ids = [doc_id for page in keyset_pages(diaries, "u1", 5) for doc_id in page]
+    assert "undated" not in ids
+
+def test_document_id_cursor_scans_in_id_order(diaries):
+    """Page like DiaryRepository.scan_page"""
+    seen, after = [], None
+    while True:
+        query = diaries.order_by("__name__")
+        if after is not None:
+            query = query.start_after({"__name__": after})
+        page = [doc.id for doc in query.limit(4).stream()]
+        if not page:
+            break
+        seen.extend(page)
+        after = page[-1]
+    assert seen == sorted(f"d{i:02d}" for i in range(25))
+
+def test_select_returns_only_requested_fields(diaries):
+    docs = list(
+        diaries
+        .where("userId", "==", "u2")
+        .order_by("createdAt", direction="DESCENDING")
+        .select(["title", "createdAt"])
+        .limit(2)
+        .stream()
+    )
+    assert [doc.id for doc in docs] == newest_first(diaries, "u2")[:2]
+    assert all(set(doc.to_dict()) == {"title", "createdAt"} for doc in docs)
@@ -0,0 +1,101 @@
+import httpx
+import pytest
+from app.core.config import settings
+from app.core.ollama_client import OllamaPool
+
+URLS = ["http://ollama-a:11434", "http://ollama-b:11434"]
+
+class Cluster:
+    """Fake Ollama nodes behind an httpx mock transport"""
+    def __init__(self, pool):
+        self.down = set()
+        self.models = {url: [settings.ollama_model] for url in URLS}
+        self.calls = []
+        for node in pool.nodes:
+            node.session._client = httpx.AsyncClient(base_url=node.base_url, transport=httpx.MockTransport(self.handle))
+
+    def handle(self, request):
+        url = f"{request.url.scheme}://{request.url.host}:{request.url.port}"
+        self.calls.append((url, request.url.path))
+        if url in self.down:
+            raise httpx.ConnectError("connection refused", request=request)
+        if request.url.path == "/api/tags":
+            return httpx.Response(200, json={"models": [{"name": name} for name in self.models[url]]})
+        return httpx.Response(200, json={"node": url})
+
+@pytest.fixture
+async def pool():
+    pool = OllamaPool(URLS)
+    yield pool
+    await pool.close()
+
+def nodes_called(cluster, path="/api/generate"):
+    return [url for url, called in cluster.calls if called == path]
+
+async def test_equally_loaded_nodes_take_turns(pool):
+    cluster = Cluster(pool)
+    for _ in range(4):
+        await pool.post("/api/generate", "generate")
+    assert nodes_called(cluster) == URLS * 2
+
+async def test_least_loaded_node_is_chosen(pool):
+    cluster = Cluster(pool)
+    pool.nodes[0].acquire()
+    for _ in range(3):
+        await pool.post("/api/generate", "generate")
+    assert nodes_called(cluster) == [URLS[1]] * 3
+    pool.nodes[0].release()
+
+async def test_refused_connection_fails_over_and_marks_the_node_down(pool):
+    cluster = Cluster(pool)
+    cluster.down.add(URLS[0])
+    response = await pool.post("/api/generate", "generate")
+    assert response.json() == {"node": URLS[1]}
+    assert not pool.nodes[0].healthy
+    assert pool.nodes[0].failures == 1
+
+    # Down nodes are skipped until a probe brings them back
+    cluster.calls.clear()
+    for _ in range(2):
+        await pool.post("/api/generate", "generate")
+    assert nodes_called(cluster) == [URLS[1]] * 2
+    assert all(node.in_flight == 0 for node in pool.nodes)
+
+async def test_probe_restores_a_recovered_node(pool):
+    cluster = Cluster(pool)
+    cluster.down.add(URLS[0])
+    await pool.probe_all()
+    assert [node.healthy for node in pool.nodes] == [False, True]
+
+    cluster.down.clear()
+    await pool.probe_all()
+    assert all(node.routable for node in pool.nodes)
+
+async def test_node_without_the_model_is_not_routed_to(pool):
+    cluster = Cluster(pool)
+    cluster.models[URLS[1]] = ["some-other-model"]
+    await pool.probe_all()
+    assert pool.nodes[1].healthy and not pool.nodes[1].routable
+    for _ in range(2):
+        await pool.post("/api/generate", "generate")
+    assert nodes_called(cluster) == [URLS[0]] * 2
+
+async def test_every_node_is_tried_when_none_is_healthy(pool):
+    cluster = Cluster(pool)
+    cluster.down.update(URLS)
+    with pytest.raises(httpx.ConnectError):
+        await pool.post("/api/generate", "generate")
+    assert sorted(nodes_called(cluster)) == URLS
+
+    # Unhealthy nodes are still tried, so the first to recover is used
+    cluster.down.clear()
+    assert (await pool.post("/api/generate", "generate")).status_code == 200
+
+async def test_stream_fails_over_before_the_response_starts(pool):
+    cluster = Cluster(pool)
+    cluster.down.add(URLS[0])
+    async with pool.stream("POST", "/api/generate", "generate") as response:
+        await response.aread()
+        assert response.json() == {"node": URLS[1]}
+    assert not pool.nodes[0].healthy
+    assert all(node.in_flight == 0 for node in pool.nodes)
@@ -0,0 +1,76 @@
+from types import SimpleNamespace
+import pytest
+from app.core.local_vector_store import LocalVectorStore
+from app.services.passage_index import index_diary_passages
+
+EMBEDDER = SimpleNamespace(name="stub", model="test")
+
+def sentences(count, word="Sentence"):
+    return " ".join(f"{word} number {i} is here." for i in range(count))
+
+class Embed:
+    """Records the texts it embeds and returns a fixed-size vector per text"""
+    def __init__(self):
+        self.texts = []
+
+    async def __call__(self, texts):
+        self.texts.extend(texts)
+        return [[1.0, float(len(text) % 7)] for text in texts]
+
+@pytest.fixture
+def store():
+    store = LocalVectorStore()
+    store.class_name = store.ensure_collection(EMBEDDER.name, EMBEDDER.model)
+    return store
+
+async def index(store, content, embed, diary_id="d1", **kwargs):
+    data = {"userId": "u1", "title": "Title", "content": content, "createdAt": "2024-01-01T00:00:00"}
+    return await index_diary_passages(store, EMBEDDER, store.class_name, "test", [(diary_id, data)], embed, **kwargs)
+
+async def test_only_changed_passages_are_embedded_again(store):
+    first = Embed()
+    embedded, unchanged = await index(store, sentences(80), first, reuse_stored=False)
+    assert (embedded, unchanged) == (len(first.texts), 0)
+    stored = store.passage_fingerprints(store.class_name, "d1")
+    assert sorted(stored) == list(range(embedded))
+
+    second = Embed()
+    embedded, unchanged = await index(store, sentences(80) + " One more sentence.", second)
+    assert 1 <= embedded <= 2
+    assert embedded + unchanged >= len(stored)
+    assert len(second.texts) == embedded
+
+    third = Embed()
+    assert await index(store, sentences(80) + " One more sentence.", third) == (0, embedded + unchanged)
+    assert third.texts == []
+
+async def test_shorter_diary_drops_trailing_passages(store):
+    await index(store, sentences(80), Embed(), reuse_stored=False)
+    await index(store, sentences(3), Embed())
+    assert list(store.passage_fingerprints(store.class_name, "d1")) == [0]
+
+async def test_trim_without_stored_fingerprints(store):
+    await index(store, sentences(80), Embed(), reuse_stored=False)
+    await index(store, sentences(3), Embed(), reuse_stored=False)
+    assert len(store.passage_fingerprints(store.class_name, "d1")) > 1
+    await index(store, sentences(3), Embed(), reuse_stored=False, trim=True)
+    assert list(store.passage_fingerprints(store.class_name, "d1")) == [0]
+
+async def test_missing_embedding_fails_before_writing(store):
+    async def embed(texts):
+        return [None for _ in texts]
+
+    with pytest.raises(RuntimeError):
+        await index(store, sentences(3), embed)
+    assert store.passage_fingerprints(store.class_name, "d1") == {}
+
+async def test_page_of_diaries_is_embedded_in_one_call(store):
+    calls = []
+
+    async def embed(texts):
+        calls.append(len(texts))
+        return [[1.0, 0.0] for _ in texts]
+
+    page = [(f"d{i}", {"userId": "u1", "title": f"t{i}", "content": sentences(2, f"w{i}")}) for i in range(4)]
+    assert await index_diary_passages(store, EMBEDDER, store.class_name, "test", page, embed) == (4, 0)
+    assert calls == [4]
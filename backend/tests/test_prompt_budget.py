@@ -0,0 +1,82 @@
+import pytest
+from app.core.prompt_budget import ELLIPSIS, PromptBudget
+from app.core.tokenizer import HeuristicTokenizer
+
+@pytest.fixture
+def tokenizer():
+    return HeuristicTokenizer()
+
+def words(count):
+    return " ".join(f"w{i}" for i in range(count))
+
+def test_heuristic_counts(tokenizer):
+    assert tokenizer.count("") == 0
+    assert tokenizer.count("hello world") == 2
+    # One token per five letters of a word, rounded up
+    assert tokenizer.count("wonderful") == 2
+    assert tokenizer.count("今天很好。") == 5
+    assert tokenizer.count("Hi, there!") == 4
+
+def test_truncate_keeps_whole_leading_tokens(tokenizer):
+    text = "one two three four"
+    assert tokenizer.truncate(text, 2) == "one two"
+    assert tokenizer.truncate(text, 10) == text
+    assert tokenizer.truncate(text, 0) == ""
+    assert tokenizer.truncate("今天很好", 2) == "今天"
+
+def test_encodings_are_cached(tokenizer):
+    tokenizer.count("same text")
+    tokenizer.count("same text")
+    assert (tokenizer.hits, tokenizer.misses) == (1, 1)
+
+def test_tiktoken_counts_and_truncates():
+    pytest.importorskip("tiktoken")
+    from app.core.tokenizer import TiktokenTokenizer
+    try:
+        tokenizer = TiktokenTokenizer()
+    except Exception as e:
+        pytest.skip(f"encoding unavailable: {e}")
+    assert tokenizer.count("hello world") == 2
+    assert tokenizer.truncate("hello world again", 2) == "hello world"
+
+def test_reserved_text_is_counted_in_full(tokenizer):
+    budget = PromptBudget(3, tokenizer)
+    assert budget.reserve(words(5)) == 5
+    assert budget.used == 5
+    assert budget.remaining == 0
+    assert budget.take("more") is None
+
+def test_text_that_fits_is_kept_whole(tokenizer):
+    budget = PromptBudget(10, tokenizer)
+    assert budget.take(words(4), overhead="Entry:") == words(4)
+    assert budget.used == 4 + 2
+
+def test_long_text_is_truncated_with_a_marker(tokenizer):
+    budget = PromptBudget(10, tokenizer)
+    text = budget.take(words(20))
+    assert text.endswith(ELLIPSIS)
+    assert text.startswith("w0 w1")
+    assert budget.used <= 10
+    assert budget.used == tokenizer.count(text)
+
+def test_limit_caps_a_section_below_the_remaining_budget(tokenizer):
+    budget = PromptBudget(100, tokenizer)
+    text = budget.take(words(50), limit=10)
+    assert tokenizer.count(text) <= 10
+    assert budget.remaining >= 90
+
+def test_sections_too_small_to_be_useful_are_dropped(tokenizer):
+    budget = PromptBudget(12, tokenizer)
+    budget.take(words(8))
+    used = budget.used
+    assert budget.take(words(20), min_tokens=5) is None
+    assert budget.used == used
+    # A smaller minimum still fits a stub
+    assert budget.take(words(20), min_tokens=1).endswith(ELLIPSIS)
+
+def test_earlier_sections_get_the_budget_first(tokenizer):
+    budget = PromptBudget(20, tokenizer)
+    sections = [budget.take(words(8), min_tokens=4) for _ in range(4)]
+    assert sections[:2] == [words(8), words(8)]
+    assert sections[2] is None
+    assert budget.used <= 20
@@ -0,0 +1,76 @@
+import json
+from datetime import datetime
+import pytest
+from app.core.local_vector_store import LocalVectorStore
+from app.core.mock_firestore import MockFirestore
+from app.core.weaviate_client import passage_object_uuid
+from app.services.indexing_queue import IndexingQueue
+from app.services.reconciliation import LEGACY_CLASS, IndexReconciler
+
+CLASS = "DiaryTest"
+
+@pytest.fixture
+def setup(tmp_path):
+    db = MockFirestore()
+    store = LocalVectorStore()
+    queue = IndexingQueue(str(tmp_path / "queue.db"))
+    for diary_id, user_id in (("keep", "u1"), ("moved", "u2"), ("shrunk", "u1"), ("dup", "u1")):
+        db.collection("diaries").document(diary_id).set({
+            "userId": user_id, "title": diary_id, "content": "short entry", "createdAt": datetime(2024, 1, 1)
+        })
+
+    def add(uuid, diary_id, chunk=0, user_id="u1"):
+        store.upsert(CLASS, uuid, {"diaryId": diary_id, "userId": user_id, "chunkIndex": chunk}, [1.0, 0.0])
+
+    add(passage_object_uuid(CLASS, "keep", 0), "keep")
+    add(passage_object_uuid(CLASS, "gone", 0), "gone")
+    add(passage_object_uuid(CLASS, "moved", 0), "moved")
+    add(passage_object_uuid(CLASS, "shrunk", 0), "shrunk")
+    add(passage_object_uuid(CLASS, "shrunk", 1), "shrunk", chunk=1)
+    # Written under a random UUID by an earlier version
+    add("00000000-0000-0000-0000-000000000001", "dup")
+    yield IndexReconciler(db=db, vector_store=store, queue=queue, batch_size=2), store, queue
+    queue.close()
+
+def remaining(store):
+    return sorted(
+        (obj["properties"]["diaryId"], obj["properties"]["chunkIndex"])
+        for batch in store.iter_objects(CLASS) for obj in batch
+    )
+
+def jobs(queue):
+    return [dict(row) for row in queue._conn.execute("SELECT target, op, diary_id, user_id, payload FROM index_jobs")]
+
+def test_stale_objects_are_deleted_and_strays_requeued(setup):
+    reconciler, store, queue = setup
+    report = reconciler.reconcile_class("openai", CLASS)
+    assert report == {"class": CLASS, "scanned": 6, "deleted": 4, "requeued": 1}
+    assert remaining(store) == [("keep", 0), ("shrunk", 0)]
+
+    [job] = jobs(queue)
+    assert (job["target"], job["op"], job["diary_id"], job["user_id"]) == ("openai", "update", "dup", "u1")
+    assert json.loads(job["payload"]) == {"title": "dup", "content": "short entry", "created_at": "2024-01-01T00:00:00"}
+
+def test_dry_run_changes_nothing(setup):
+    reconciler, store, queue = setup
+    report = reconciler.reconcile_class("openai", CLASS, dry_run=True)
+    assert (report["deleted"], report["requeued"]) == (4, 1)
+    assert len(remaining(store)) == 6
+    assert jobs(queue) == []
+
+def test_second_run_finds_nothing(setup):
+    reconciler, store, _ = setup
+    reconciler.reconcile_class("openai", CLASS)
+    assert reconciler.reconcile_class("openai", CLASS)["deleted"] == 0
+
+def test_missing_class_and_legacy_class(setup, monkeypatch):
+    reconciler, store, _ = setup
+    monkeypatch.setattr(IndexReconciler, "targets", staticmethod(lambda: {"llama": "DiaryMissing"}))
+    store.upsert(LEGACY_CLASS, "00000000-0000-0000-0000-000000000002", {"diaryId": "keep", "userId": "u1"}, [1.0, 0.0])
+
+    report = reconciler.reconcile()
+    assert report["classes"] == [{"class": "DiaryMissing", "scanned": 0, "deleted": 0, "requeued": 0}]
+    assert report["legacyClass"] == {"name": LEGACY_CLASS, "exists": True, "dropped": False}
+
+    assert reconciler.reconcile(drop_legacy=True)["legacyClass"]["dropped"] is True
+    assert not store.collection_exists(LEGACY_CLASS)
@@ -0,0 +1,84 @@
+import math
+from app.core.response_cache import ResponseCache
+
+def near(angle_degrees):
+    """Unit vector at ``angle_degrees`` from [1, 0]"""
+    angle = math.radians(angle_degrees)
+    return [math.cos(angle), math.sin(angle)]
+
+def test_similar_query_with_same_context_hits():
+    cache = ResponseCache(threshold=0.97)
+    cache.put(cache.key("recommendation", "u1", [2.0, 0.0], ["d1#0", "d2#0"]), "answer")
+    # cos(10°) ≈ 0.985 passes the threshold, cos(20°) ≈ 0.94 does not
+    assert cache.get(cache.key("recommendation", "u1", near(10), ["d2#0", "d1#0"])) == "answer"
+    assert cache.get(cache.key("recommendation", "u1", near(20), ["d1#0", "d2#0"])) is None
+    assert cache.stats()["pipelines"]["recommendation"] == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+
+def test_different_context_pipeline_or_user_misses():
+    cache = ResponseCache()
+    cache.put(cache.key("recommendation", "u1", [1.0, 0.0], ["d1#0"]), "answer")
+    assert cache.get(cache.key("recommendation", "u1", [1.0, 0.0], ["d1#0", "d2#0"])) is None
+    assert cache.get(cache.key("recommendation", "u1", [1.0, 0.0], ["d1#1"])) is None
+    assert cache.get(cache.key("insight", "u1", [1.0, 0.0], ["d1#0"])) is None
+    assert cache.get(cache.key("recommendation", "u2", [1.0, 0.0], ["d1#0"])) is None
+
+def test_most_similar_entry_wins():
+    cache = ResponseCache(threshold=0.9)
+    cache.put(cache.key("p", "u1", near(0), []), "zero")
+    cache.put(cache.key("p", "u1", near(20), []), "twenty")
+    assert cache.get(cache.key("p", "u1", near(15), [])) == "twenty"
+    assert cache.get(cache.key("p", "u1", near(2), [])) == "zero"
+
+def test_invalidation_drops_entries_and_bumps_the_generation():
+    cache = ResponseCache()
+    cache.put(cache.key("p", "u1", [1.0, 0.0], []), "old")
+    cache.put(cache.key("p", "u2", [1.0, 0.0], []), "other user")
+    cache.invalidate_user("u1")
+    assert cache.get(cache.key("p", "u1", [1.0, 0.0], [])) is None
+    assert cache.get(cache.key("p", "u2", [1.0, 0.0], [])) == "other user"
+    assert cache.stats()["entries"] == 1
+
+def test_response_generated_across_an_invalidation_is_not_stored():
+    cache = ResponseCache()
+    key = cache.key("p", "u1", [1.0, 0.0], [])
+    # A diary changes while the response is being generated
+    cache.invalidate_user("u1")
+    cache.put(key, "stale")
+    assert cache.get(cache.key("p", "u1", [1.0, 0.0], [])) is None
+
+    fresh = cache.key("p", "u1", [1.0, 0.0], [])
+    cache.put(fresh, "fresh")
+    assert cache.get(fresh) == "fresh"
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("app.core.response_cache.time.time", lambda: now[0])
+    cache = ResponseCache(ttl_seconds=60)
+    cache.put(cache.key("p", "u1", [1.0, 0.0], []), "answer")
+    now[0] += 61
+    assert cache.get(cache.key("p", "u1", [1.0, 0.0], [])) is None
+    assert cache.stats()["entries"] == 0
+
+def test_bounded_per_user_and_overall():
+    cache = ResponseCache(max_entries=3, per_user=2)
+    for angle in (0, 30, 60):
+        cache.put(cache.key("p", "u1", near(angle), []), f"u1 {angle}")
+    # Each user keeps only their newest entries
+    assert cache.get(cache.key("p", "u1", near(0), [])) is None
+    assert cache.get(cache.key("p", "u1", near(60), [])) == "u1 60"
+
+    cache.put(cache.key("p", "u2", near(0), []), "u2 0")
+    cache.put(cache.key("p", "u3", near(0), []), "u3 0")
+    # u1 was used least recently, so it loses its oldest entry
+    assert cache.stats()["entries"] == 3
+    assert cache.stats()["evictions"] == 1
+    assert cache.get(cache.key("p", "u1", near(30), [])) is None
+    assert cache.get(cache.key("p", "u3", near(0), [])) == "u3 0"
+
+def test_uncacheable_queries():
+    cache = ResponseCache()
+    assert cache.key("p", "u1", [], []) is None
+    assert cache.key("p", "u1", [0.0, 0.0], []) is None
+    assert ResponseCache(max_entries=0).key("p", "u1", [1.0], []) is None
+    cache.put(None, "ignored")
+    assert cache.get(None) is None
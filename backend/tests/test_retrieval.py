@@ -0,0 +1,117 @@
+import threading
+import pytest
+from app.services.retrieval import HybridRetriever, OverlapReranker, context_ids
+
+def passage(diary_id, chunk=0, content="", **additional):
+    return {"diaryId": diary_id, "chunkIndex": chunk, "title": diary_id, "content": content, "_additional": additional}
+
+class FakeStore:
+    """Returns fixed vector and keyword results; a search can be held open"""
+    def __init__(self, vector, keyword, in_process=True):
+        self.vector = vector
+        self.keyword = keyword
+        self.in_process = in_process
+        self.hold = None
+        self.keyword_calls = 0
+
+    def search(self, collection, vector, user_id, limit, properties):
+        return self.vector[:limit]
+
+    def keyword_search(self, collection, query, user_id, limit, properties):
+        self.keyword_calls += 1
+        if self.hold is not None:
+            self.hold.wait(5)
+        return self.keyword[:limit]
+
+@pytest.fixture
+def use_store(monkeypatch):
+    def use(store):
+        monkeypatch.setattr("app.services.retrieval.get_vector_store", lambda: store)
+        return store
+    return use
+
+async def search(retriever, limit=3, query="morning run"):
+    return await retriever.search("Diary", query, [1.0, 0.0], "u1", limit, ["title", "content"], "test")
+
+def ids(entries):
+    return [entry["diaryId"] for entry in entries]
+
+async def test_rrf_ranks_diaries_found_by_both_searches_first(use_store):
+    use_store(FakeStore(
+        vector=[passage("a", distance=0.1), passage("b", distance=0.2), passage("c", distance=0.3)],
+        keyword=[passage("c", score=9.0), passage("d", score=5.0), passage("a", score=1.0)],
+    ))
+    entries = await search(HybridRetriever(rrf_k=60), limit=4)
+    assert ids(entries) == ["a", "c", "b", "d"]
+    a, c = entries[0]["_additional"], entries[1]["_additional"]
+    assert a["score"] == pytest.approx(1 / 61 + 1 / 63)
+    assert c["score"] == pytest.approx(1 / 63 + 1 / 61)
+    # Both searches' fields are kept on the fused entry
+    assert a["distance"] == 0.1
+
+async def test_weighted_fusion_follows_alpha(use_store):
+    use_store(FakeStore(
+        vector=[passage("a", distance=0.1), passage("b", distance=0.5)],
+        keyword=[passage("b", score=10.0), passage("a", score=1.0)],
+    ))
+    assert ids(await search(HybridRetriever(fusion="weighted", alpha=0.9))) == ["a", "b"]
+    assert ids(await search(HybridRetriever(fusion="weighted", alpha=0.1))) == ["b", "a"]
+
+async def test_vector_mode_skips_keyword_search(use_store):
+    store = use_store(FakeStore(vector=[passage("a", distance=0.1)], keyword=[passage("b", score=1.0)]))
+    assert ids(await search(HybridRetriever(mode="vector"))) == ["a"]
+    assert store.keyword_calls == 0
+
+async def test_passages_are_grouped_by_diary(use_store):
+    use_store(FakeStore(
+        vector=[
+            passage("a", 3, "third", distance=0.1),
+            passage("a", 1, "first", distance=0.2),
+            passage("b", 0, "only", distance=0.3),
+            passage("a", 2, "second", distance=0.4),
+        ],
+        keyword=[],
+    ))
+    entries = await search(HybridRetriever(mode="vector", passages_per_diary=2))
+    assert ids(entries) == ["a", "b"]
+    assert entries[0]["content"] == "first\n...\nthird"
+    assert entries[0]["_additional"]["passages"] == [1, 3]
+    assert context_ids(entries) == ["a#1,3", "b#0"]
+
+async def test_limit_counts_diaries_not_passages(use_store):
+    use_store(FakeStore(
+        vector=[passage("a", i, distance=0.1 * i) for i in range(4)] + [passage("b", distance=0.9)],
+        keyword=[],
+    ))
+    assert ids(await search(HybridRetriever(mode="vector"), limit=2)) == ["a", "b"]
+
+def test_overlap_reranker_prefers_entries_covering_more_terms():
+    entries = [
+        passage("rare", content="marathon", score=1.0),
+        passage("broad", content="a slow morning run before work", score=0.7),
+    ]
+    reranked = OverlapReranker(weight=0.5).rerank("morning run marathon", entries)
+    assert ids(reranked) == ["broad", "rare"]
+    assert ids(OverlapReranker(weight=0.5).rerank("", entries)) == ["rare", "broad"]
+
+async def test_slow_search_is_dropped_and_counted_as_abandoned(use_store):
+    store = use_store(FakeStore(
+        vector=[passage("a", distance=0.1)],
+        keyword=[passage("b", score=1.0)],
+        in_process=False,
+    ))
+    store.hold = threading.Event()
+    retriever = HybridRetriever(keyword_budget=0.05, search_threads=2)
+    try:
+        # The keyword search misses its budget; vector results are used alone
+        for abandoned in (1, 2):
+            assert ids(await search(retriever)) == ["a"]
+            assert retriever.stats()["abandoned_in_flight"] == abandoned
+
+        # Every search thread is held by an abandoned call: nothing is started
+        assert await search(retriever) == []
+        assert store.keyword_calls == 2
+    finally:
+        store.hold.set()
+        retriever._pool().shutdown(wait=True)
+    assert retriever.stats()["abandoned_in_flight"] == 0
@@ -1,9 +1,11 @@
 import apiClient from "./client";
 
 export const diaryApi = {
-  // Get all diaries for the current user
-  getAll: async () => {
-    const response = await apiClient.get("/diaries");
+  // Get one page of diaries ({ items, nextCursor }), newest first
+  getPage: async ({ limit = 20, cursor = null, view = "full" } = {}) => {
+    const params = { limit, view };
+    if (cursor) params.cursor = cursor;
+    const response = await apiClient.get("/diaries", { params });
     return response.data;
   },
 
@@ -18,20 +18,28 @@ import { format } from "date-fns";
 export default function Dashboard() {
   const navigate = useNavigate();
   const [diaries, setDiaries] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     loadDiaries();
   }, []);
 
-  const loadDiaries = async () => {
+  // Summaries (title + snippet) one page at a time; more pages on demand
+  const loadDiaries = async (cursor = null) => {
+    if (cursor) setLoadingMore(true);
     try {
-      const data = await diaryApi.getAll();
-      setDiaries(data);
+      const page = await diaryApi.getPage({ cursor, view: "summary" });
+      setDiaries((current) =>
+        cursor ? [...current, ...page.items] : page.items
+      );
+      setNextCursor(page.nextCursor);
     } catch (error) {
       toast.error("Failed to load diaries");
     } finally {
       setLoading(false);
+      setLoadingMore(false);
     }
   };
 
@@ -146,7 +154,7 @@ export default function Dashboard() {
                 </div>
 
                 <p className="text-gray-600 line-clamp-3 mb-4">
-                  {diary.content}
+                  {diary.snippet}
                 </p>
 
                 <div className="flex items-center gap-2 text-sm text-gray-500">
@@ -168,6 +176,18 @@ export default function Dashboard() {
             ))}
           </div>
         )}
+
+        {nextCursor && (
+          <div className="text-center mt-8">
+            <button
+              onClick={() => loadDiaries(nextCursor)}
+              disabled={loadingMore}
+              className="px-6 py-3 text-sm text-gray-700 bg-white rounded-lg shadow hover:bg-gray-50 transition disabled:opacity-50"
+            >
+              {loadingMore ? "Loading..." : "Load more"}
+            </button>
+          </div>
+        )}
       </main>
     </div>
   );